@@ -58,11 +58,44 @@ async def run_migrations():
     """Run any necessary migrations"""
     # For now, we'll handle migrations manually
     # In production, you'd use Alembic here
-    pass
+    from services import counters, fts, prop_filters, props, render, tags
+    
+    # Whether props are rows or documents decides the queries and indexes below
+    await run_raw(props.load_storage)
+    # Counter cache of entry, shelf item and hobby counts
+    await run_raw(counters.ensure_schema)
+    # And entry_tags, backfilled from entries.tags the first time
+    await run_raw(tags.ensure_schema)
+    # Search index lives outside the ORM metadata
+    await run_raw(fts.ensure_fts_schema)
+    # So does the rendered markdown cache
+    await run_raw(render.ensure_schema)
+    # And the indexes of the props hobby types declare
+    await run_raw(prop_filters.ensure_indexes)
+
+async def run_raw(fn, *args):
+    """Run fn(dbapi_connection, *args) in its own transaction
+    
+    Lets the plain-sqlite3 helpers in services/ run on the async engine.
+    """
+    async with engine.begin() as conn:
+        return await conn.run_sync(lambda sync_conn: fn(sync_conn.connection, *args))
 
 # Import text for SQL queries
 from sqlalchemy import text
 
+async def observe_writes(db):
+    """Bump every write generation if another connection committed since last time"""
+    version = await db.execute(text("PRAGMA data_version"))
+    cache.write_generations.observe_data_version(version.scalar())
+
+from services import cache, maintenance, views
+
+# Merges and optimizes the search index while the API is idle
+index_maintenance = maintenance.IndexMaintenance(run_raw)
+# Entry views, counted in memory and written in batches
+view_counter = views.ViewCounter(run_raw)
+
 async def get_session():
     """Get database session"""
     async with AsyncSessionLocal() as session:
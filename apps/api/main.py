@@ -1,7 +1,8 @@
 from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, ORJSONResponse
 from contextlib import asynccontextmanager
+import asyncio
 import time
 import uuid
 import os
@@ -11,24 +12,37 @@ from dotenv import load_dotenv
 load_dotenv()
 
 # Import database and routers
-from database import init_db, close_db, run_migrations
-from routers import auth, entries, hobbies, search, admin, media
+from database import init_db, close_db, run_migrations, run_raw, index_maintenance, view_counter
+from routers import auth, entries, hobbies, search, admin, media, tags
+from middleware.compression import CompressionMiddleware
 from middleware.error_handler import AppException
+from services import etag, pagination, related, suggest
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Startup
     await init_db()
     await run_migrations()
+    await run_raw(suggest.index.load)
+    await index_maintenance.start()
+    await view_counter.start()
+    # Takes a while on a big database, requests are served meanwhile
+    related_build = asyncio.create_task(related.index.build(run_raw))
     yield
     # Shutdown
+    related_build.cancel()
+    await index_maintenance.stop()
+    # Before the engine goes, it writes the views still pending
+    await view_counter.stop()
     await close_db()
 
 app = FastAPI(
     title="Hobby Manager",
     version="1.0.0",
     description="Personal hobby management application",
-    lifespan=lifespan
+    lifespan=lifespan,
+    # Routes that return plain data are encoded with orjson too
+    default_response_class=ORJSONResponse
 )
 
 # CORS Middleware
@@ -38,8 +52,12 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[pagination.NEXT_CURSOR_HEADER, etag.ETAG_HEADER],
 )
 
+# gzip or brotli for bodies above encoding.COMPRESS_MIN_BYTES
+app.add_middleware(CompressionMiddleware)
+
 # Request ID middleware
 @app.middleware("http")
 async def add_request_id(request: Request, call_next):
@@ -57,6 +75,12 @@ async def add_process_time_header(request: Request, call_next):
     response.headers["X-Process-Time"] = str(process_time)
     return response
 
+# Idle tracking, search index maintenance waits for a quiet moment
+@app.middleware("http")
+async def track_activity(request: Request, call_next):
+    index_maintenance.touch()
+    return await call_next(request)
+
 # Global exception handler
 @app.exception_handler(AppException)
 async def app_exception_handler(request: Request, exc: AppException):
@@ -101,6 +125,7 @@ app.include_router(hobbies.router, prefix="/api/hobbies", tags=["hobbies"])
 app.include_router(search.router, prefix="/api/search", tags=["search"])
 app.include_router(admin.router, prefix="/api/admin", tags=["admin"])
 app.include_router(media.router, prefix="/api/media", tags=["media"])
+app.include_router(tags.router, prefix="/api/tags", tags=["tags"])
 
 if __name__ == "__main__":
     import uvicorn
@@ -0,0 +1,68 @@
+from starlette.datastructures import Headers, MutableHeaders
+
+from services import encoding, etag
+
+
+class CompressionMiddleware:
+    """Compresses response bodies per Accept-Encoding, see services/encoding.py
+
+    Only bodies sent in one piece are compressed, streamed ones such as NDJSON
+    search results go out as they are, chunk by chunk. A compressed body's
+    ETag gets the coding's suffix, see services/etag.py, and so does a 304
+    answering a request for that representation. Strong tags stay strong.
+    """
+
+    def __init__(self, app, min_size=encoding.COMPRESS_MIN_BYTES):
+        self.app = app
+        self.min_size = min_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        request_headers = Headers(scope=scope)
+        coding = encoding.negotiate(request_headers.get("accept-encoding"))
+        if coding is None:
+            await self.app(scope, receive, send)
+            return
+
+        # Routes compare If-None-Match with the tag they compute, uncompressed
+        if_none_match, coded = etag.strip_coding(request_headers.get("if-none-match"), coding)
+        if coded:
+            scope = dict(scope)
+            scope["headers"] = [
+                (name, value) for name, value in scope["headers"] if name != b"if-none-match"
+            ] + [(b"if-none-match", if_none_match.encode("latin-1"))]
+
+        start = None
+
+        async def send_compressed(message):
+            nonlocal start
+            if message["type"] == "http.response.start":
+                # Held back until the body shows whether it gets compressed
+                start = message
+                return
+            if message["type"] != "http.response.body" or start is None:
+                await send(message)
+                return
+            held, start = start, None
+            body = message.get("body", b"")
+            headers = MutableHeaders(raw=held["headers"])
+            if (message.get("more_body") or "content-encoding" in headers
+                    or not encoding.compressible(headers.get("content-type"), len(body), self.min_size)):
+                if held["status"] == 304 and coded and "etag" in headers:
+                    headers["ETag"] = etag.for_coding(headers["etag"], coding)
+                    headers.add_vary_header("Accept-Encoding")
+                await send(held)
+                await send(message)
+                return
+            body = encoding.compress(body, coding)
+            headers["Content-Encoding"] = coding
+            headers["Content-Length"] = str(len(body))
+            headers.add_vary_header("Accept-Encoding")
+            if "etag" in headers:
+                headers["ETag"] = etag.for_coding(headers["etag"], coding)
+            await send(held)
+            await send({**message, "body": body})
+
+        await self.app(scope, receive, send_compressed)
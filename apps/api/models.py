@@ -56,6 +56,8 @@ class Entry(Base):
     description = Column(Text)
     content_markdown = Column(Text)
     tags = Column(Text)  # Denormalized for FTS
+    props_text = Column(Text)  # Denormalized entry_props values for FTS, kept by triggers
+    props_json = Column(Text)  # All props as one object when stored as documents, see services/props.py
     is_favorite = Column(Boolean, default=False)
     is_archived = Column(Boolean, default=False)
     view_count = Column(Integer, default=0)
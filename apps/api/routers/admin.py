@@ -1,11 +1,12 @@
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import text, select, func
+from sqlalchemy import text, select
 from typing import List, Dict, Any
 from pydantic import BaseModel
 
-from database import get_session
-from models import Entry, Hobby, AppSetting
+from database import get_session, run_raw, index_maintenance
+from models import AppSetting
+from services import cache, counters, etag, maintenance
 
 router = APIRouter()
 
@@ -22,9 +23,8 @@ class TableInfo(BaseModel):
 
 @router.get("/stats", response_model=SystemStats)
 async def get_system_stats(db: AsyncSession = Depends(get_session)):
-    # Get counts
-    entry_count = await db.execute(select(func.count(Entry.id)))
-    hobby_count = await db.execute(select(func.count(Hobby.id)))
+    # Get counts from the counter cache
+    totals = await run_raw(counters.totals)
     
     # Get version
     version_result = await db.execute(
@@ -33,8 +33,8 @@ async def get_system_stats(db: AsyncSession = Depends(get_session)):
     version = version_result.scalar_one_or_none() or "1.0.0"
     
     return SystemStats(
-        total_entries=entry_count.scalar(),
-        total_hobbies=hobby_count.scalar(),
+        total_entries=totals["entries"],
+        total_hobbies=totals["hobbies"],
         database_size="TBD",  # We'll calculate this later
         version=version
     )
@@ -66,6 +66,52 @@ async def get_tables(db: AsyncSession = Depends(get_session)):
     
     return tables
 
+@router.get("/counters")
+async def get_counters():
+    """Totals and per-hobby entry counts from the counter cache"""
+    return {
+        "totals": await run_raw(counters.totals),
+        "hobbies": await run_raw(counters.hobby_counts)
+    }
+
+@router.post("/counters/repair")
+async def repair_counters():
+    """Recount everything from the tables, returns the drift that was corrected"""
+    return await run_raw(counters.repair)
+
+@router.get("/cache")
+async def get_cache_stats():
+    """Search result cache hit/miss counters, and 304s per route"""
+    return {"search": cache.search_cache.stats(), "conditional": etag.responses.stats()}
+
+@router.post("/cache/clear")
+async def clear_cache():
+    cache.search_cache.clear()
+    return {"message": "Cache cleared"}
+
+@router.get("/search-index")
+async def get_search_index_stats():
+    """Segment stats of the search index and the state of its maintenance"""
+    return {
+        "index": await run_raw(maintenance.segment_stats),
+        "maintenance": index_maintenance.status()
+    }
+
+@router.post("/search-index/optimize")
+async def optimize_search_index():
+    return {"index": await run_raw(maintenance.optimize)}
+
+@router.post("/search-index/rebuild")
+async def rebuild_search_index():
+    """Recreate the search index from entries, repairs a drifted index"""
+    result = await run_raw(maintenance.rebuild)
+    cache.write_generations.bump("entries")
+    return result
+
+@router.post("/search-index/integrity-check")
+async def check_search_index():
+    return await run_raw(maintenance.integrity_check)
+
 @router.post("/query")
 async def execute_query(
     query: str, 
@@ -1,12 +1,14 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from fastapi.responses import ORJSONResponse
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, func
+from sqlalchemy import String, select, or_, text, type_coerce
 from typing import List, Optional, Dict, Any
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from datetime import datetime
 
-from database import get_session
-from models import Entry, EntryProp, Hobby
+from database import get_session, observe_writes, run_raw, view_counter
+from models import Entry, Hobby
+from services import bulk, cache, encoding, etag, fields, pagination, prop_filters, props, related, render, suggest, tags
 
 router = APIRouter()
 
@@ -25,10 +27,37 @@ class EntryResponse(BaseModel):
     updated_at: datetime
     hobby_name: Optional[str] = None
     props: Dict[str, Any] = {}
+    content_html: Optional[str] = None
     
     class Config:
         orm_mode = True
 
+class EntryListItem(BaseModel):
+    """An entry in a list, with only the fields asked for, see services/fields.py"""
+    id: int
+    hobby_id: Optional[int] = None
+    type_key: Optional[str] = None
+    title: Optional[str] = None
+    description: Optional[str] = None
+    content_markdown: Optional[str] = Field(None, description="Only with fields=content_markdown or fields=*")
+    tags: Optional[str] = None
+    is_favorite: Optional[bool] = None
+    is_archived: Optional[bool] = None
+    view_count: Optional[int] = None
+    created_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None
+    hobby_name: Optional[str] = None
+    props: Optional[Dict[str, Any]] = None
+
+class RelatedEntry(BaseModel):
+    id: int
+    title: str
+    hobby_id: int
+    hobby_name: str
+    type_key: str
+    created_at: datetime
+    score: float
+
 class EntryCreate(BaseModel):
     hobby_id: int
     type_key: str
@@ -47,21 +76,131 @@ class EntryUpdate(BaseModel):
     is_archived: Optional[bool] = None
     props: Optional[Dict[str, Any]] = None
 
-@router.get("/", response_model=List[EntryResponse])
+async def load_props(db: AsyncSession, entry_ids: List[int]) -> Dict[int, Dict[str, Any]]:
+    """Props of the listed entries in one query, {} for those without any"""
+    if not entry_ids:
+        return {}
+    sql, params = props.build_props_query(entry_ids)
+    result = await db.execute(text(sql), params)
+    return props.group_props(result, entry_ids)
+
+async def write_props(db: AsyncSession, items: List[Any]):
+    """Replace the props of (entry_id, props) items in the session's transaction"""
+    await db.run_sync(lambda session: props.write_props(session.connection().connection, items))
+
+async def sync_tags(db: AsyncSession, items: List[Any]):
+    """Mirror the tags of (entry_id, tags) items into entry_tags in the session's transaction"""
+    await db.run_sync(lambda session: tags.sync(session.connection().connection, items))
+
+async def resolve_tags(db: AsyncSession, names: List[str]) -> List[Optional[int]]:
+    return await db.run_sync(lambda session: tags.resolve(session.connection().connection, names))
+
+def entry_columns(selected: List[str]):
+    """Labelled columns for the names of fields.columns()"""
+    return [(Hobby.name if name == "hobby_name" else getattr(Entry, name)).label(name) for name in selected]
+
+def entry_response(entry: Entry, hobby_name: Optional[str], entry_props: Dict[str, Any]) -> Dict[str, Any]:
+    """An EntryResponse built straight from the row, no model passes, orjson takes the datetimes"""
+    return {
+        "id": entry.id,
+        "hobby_id": entry.hobby_id,
+        "type_key": entry.type_key,
+        "title": entry.title,
+        "description": entry.description,
+        "content_markdown": entry.content_markdown,
+        "tags": entry.tags,
+        "is_favorite": bool(entry.is_favorite),
+        "is_archived": bool(entry.is_archived),
+        # Views not written yet are still counted
+        "view_count": (entry.view_count or 0) + view_counter.pending(entry.id),
+        "created_at": entry.created_at,
+        "updated_at": entry.updated_at,
+        "hobby_name": hobby_name,
+        "props": entry_props,
+    }
+
+class BulkEntryUpdate(EntryUpdate):
+    id: int
+
+class BulkEntriesRequest(BaseModel):
+    create: List[EntryCreate] = []
+    update: List[BulkEntryUpdate] = []
+    archive: List[int] = []
+    delete: List[int] = []
+
+class BulkItemResult(BaseModel):
+    op: str
+    index: int
+    id: int
+    ok: bool
+
+class BulkEntriesResponse(BaseModel):
+    results: List[BulkItemResult]
+    summary: Dict[str, int]
+
+# Tables entry responses are read from, for their ETags
+ENTRY_TABLES = ("entries", "hobbies")
+
+@router.get("/", response_model=List[EntryListItem])
 async def get_entries(
+    request: Request,
     hobby_id: Optional[int] = Query(None),
     type_key: Optional[str] = Query(None),
     is_favorite: Optional[bool] = Query(None),
     is_archived: Optional[bool] = Query(None, description="Default excludes archived"),
     limit: int = Query(50, le=100),
     offset: int = Query(0, ge=0),
+    cursor: Optional[str] = Query(None, description="next_cursor of the previous page, replaces offset"),
+    field_list: Optional[str] = Query(None, alias="fields", description="Comma separated, default all but content_markdown"),
+    sort: Optional[str] = Query(None, description="props.<key> or -props.<key>, filter with props.<key>__<op>=<value>"),
+    tag: Optional[List[str]] = Query(None, description="Entries with every tag, or any of them with tag_mode=any"),
+    tag_mode: str = Query("all", description="all or any"),
     db: AsyncSession = Depends(get_session)
 ):
+    if cursor and sort:
+        raise HTTPException(status_code=400, detail="Cursors follow the default order, use offset with sort")
+    try:
+        names = fields.parse_fields(field_list)
+        # props.<key>__<op>=<value> filters, each on its key's index
+        prop_filter_list, prop_sort, prop_kinds = prop_filters.parse_query(
+            request.query_params.multi_items(), sort, type_key
+        )
+        prop_conditions, prop_params = prop_filters.build_filters(prop_filter_list, prop_kinds, "entries")
+        tags.check_mode(tag_mode)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    await observe_writes(db)
+    check = etag.responses.check(
+        "entries.list", request.headers.get("if-none-match"), ENTRY_TABLES, request.url.query, weak=True
+    )
+    if check.not_modified:
+        return Response(status_code=304, headers=check.headers)
+    
+    # Only the columns asked for, plus what the cursor needs, no Entry objects
+    selected = fields.columns(names)
+    # created_at as stored, the cursor compares it as text
+    created_at = type_coerce(Entry.created_at, String)
     query = (
-        select(Entry, Hobby.name.label("hobby_name"))
+        select(*entry_columns(selected), created_at.label("created_at_raw"))
+        .select_from(Entry)
         .join(Hobby, Entry.hobby_id == Hobby.id)
-        .order_by(Entry.created_at.desc())
     )
+    if prop_sort:
+        query = query.order_by(text(prop_filters.build_sort(prop_sort[0], prop_kinds[prop_sort[0]], prop_sort[1], "entries")))
+    query = query.order_by(Entry.created_at.desc(), Entry.id.asc())
+    
+    if cursor:
+        if offset:
+            raise HTTPException(status_code=400, detail="Use either cursor or offset")
+        try:
+            cursor_created_at, cursor_id = pagination.decode_cursor(cursor)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        query = query.where(
+            created_at <= cursor_created_at,
+            or_(created_at < cursor_created_at, Entry.id > cursor_id)
+        )
     
     # Apply filters
     if hobby_id:
@@ -74,28 +213,41 @@ async def get_entries(
         query = query.where(Entry.is_archived == False)
     elif is_archived is not None:
         query = query.where(Entry.is_archived == is_archived)
+    for condition in prop_conditions:
+        query = query.where(text(condition))
+    filter_params = dict(prop_params)
+    if tag:
+        # Through entry_tags, the rarest tag's entries checked for the rest by primary key
+        tag_condition, tag_params = tags.build_filter(await resolve_tags(db, tag), tag_mode, "entries")
+        query = query.where(text(tag_condition))
+        filter_params.update(tag_params)
     
-    query = query.offset(offset).limit(limit)
-    result = await db.execute(query)
+    # One row past the page tells whether there's a next one
+    query = query.offset(offset).limit(limit + 1)
+    result = await db.execute(query, filter_params)
+    rows, next_cursor = pagination.paginate(result, limit, lambda row: (row.created_at_raw, row.id))
+    if prop_sort:
+        next_cursor = None
     
     entries = []
-    for entry, hobby_name in result:
-        entry_dict = EntryResponse.from_orm(entry).dict()
-        entry_dict["hobby_name"] = hobby_name
-        
-        # Get properties
-        props_result = await db.execute(
-            select(EntryProp).where(EntryProp.entry_id == entry.id)
-        )
-        props = {}
-        for prop in props_result.scalars():
-            import json
-            props[prop.key] = json.loads(prop.value_json)
-        entry_dict["props"] = props
-        
-        entries.append(EntryResponse(**entry_dict))
+    for row in rows:
+        entry = fields.row_dict(selected, row, names)
+        if "view_count" in entry:
+            # Views not written yet are still counted
+            entry["view_count"] = (entry["view_count"] or 0) + view_counter.pending(row.id)
+        entries.append(entry)
     
-    return entries
+    # One query for the props of the whole page
+    if "props" in names:
+        page_props = await load_props(db, [row.id for row in rows])
+        for entry, row in zip(entries, rows):
+            entry["props"] = page_props[row.id]
+    
+    headers = check.headers
+    if next_cursor:
+        headers[pagination.NEXT_CURSOR_HEADER] = next_cursor
+    body = etag.responses.body(check, entries)
+    return Response(body, media_type=encoding.JSON_MEDIA_TYPE, headers=headers)
 
 @router.post("/", response_model=EntryResponse)
 async def create_entry(entry_data: EntryCreate, db: AsyncSession = Depends(get_session)):
@@ -112,31 +264,66 @@ async def create_entry(entry_data: EntryCreate, db: AsyncSession = Depends(get_s
     db.add(entry)
     await db.flush()
     
-    # Add properties
-    import json
-    for key, value in entry_data.props.items():
-        prop = EntryProp(
-            entry_id=entry.id,
-            key=key,
-            value_json=json.dumps(value)
-        )
-        db.add(prop)
+    # Add properties and tags
+    await write_props(db, [(entry.id, entry_data.props)])
+    await sync_tags(db, [(entry.id, entry_data.tags)])
     
     await db.commit()
     await db.refresh(entry)
     
+    cache.write_generations.bump("entries")
+    suggest.index.add_entry(entry.id, entry.title, entry.view_count)
+    suggest.index.update_tags(None, entry_data.tags)
+    await run_raw(related.index.update_entry, entry.id)
+    
     # Return with hobby name
     hobby_result = await db.execute(select(Hobby.name).where(Hobby.id == entry.hobby_id))
-    hobby_name = hobby_result.scalar()
+    return ORJSONResponse(entry_response(entry, hobby_result.scalar(), entry_data.props))
+
+@router.post("/bulk", response_model=BulkEntriesResponse)
+async def bulk_entries(request: BulkEntriesRequest):
+    """Create, update, archive and delete many entries in one transaction
     
-    entry_dict = EntryResponse.from_orm(entry).dict()
-    entry_dict["hobby_name"] = hobby_name
-    entry_dict["props"] = entry_data.props
+    Every item is validated first; if any is invalid nothing is written and
+    the errors are returned per item.
+    """
+    operations = {
+        "create": [item.dict() for item in request.create],
+        "update": [item.dict(exclude_unset=True) for item in request.update],
+        "archive": request.archive,
+        "delete": request.delete,
+    }
+    try:
+        result = await run_raw(bulk.apply, operations)
+    except bulk.BulkError as e:
+        raise HTTPException(status_code=422, detail={"message": str(e), "errors": e.errors})
     
-    return EntryResponse(**entry_dict)
+    cache.write_generations.bump("entries")
+    await run_raw(bulk.refresh_indexes, result["changed"])
+    
+    return BulkEntriesResponse(results=result["results"], summary=result["summary"])
 
 @router.get("/{entry_id}", response_model=EntryResponse)
-async def get_entry(entry_id: int, db: AsyncSession = Depends(get_session)):
+async def get_entry(
+    entry_id: int,
+    request: Request,
+    render_format: Optional[str] = Query(None, alias="render", description="html adds content_html, rendered and sanitized"),
+    db: AsyncSession = Depends(get_session)
+):
+    if render_format is not None and render_format not in render.RENDER_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unknown render format '{render_format}', expected html")
+    
+    await observe_writes(db)
+    updated_at = await db.execute(select(Entry.updated_at).where(Entry.id == entry_id))
+    check = etag.responses.check(
+        "entries.detail", request.headers.get("if-none-match"), ENTRY_TABLES, entry_id, updated_at.scalar(),
+        render_format, weak=True
+    )
+    if check.not_modified:
+        # Still a view, the client just has the entry already
+        view_counter.record(entry_id)
+        return Response(status_code=304, headers=check.headers)
+    
     result = await db.execute(
         select(Entry, Hobby.name.label("hobby_name"))
         .join(Hobby, Entry.hobby_id == Hobby.id)
@@ -148,25 +335,51 @@ async def get_entry(entry_id: int, db: AsyncSession = Depends(get_session)):
     
     entry, hobby_name = entry_data
     
-    # Update view count
-    entry.view_count += 1
-    entry.last_viewed_at = func.now()
-    await db.commit()
+    # Counted in memory, a read doesn't wait on the write lock
+    pending_views = view_counter.record(entry.id)
+    if not entry.is_archived:
+        suggest.index.add_entry(entry.id, entry.title, (entry.view_count or 0) + pending_views)
     
-    # Get properties
-    props_result = await db.execute(
-        select(EntryProp).where(EntryProp.entry_id == entry.id)
-    )
-    props = {}
-    for prop in props_result.scalars():
-        import json
-        props[prop.key] = json.loads(prop.value_json)
+    entry_props = await load_props(db, [entry.id])
+    response = entry_response(entry, hobby_name, entry_props[entry.id])
+    if render_format == "html":
+        # Rendered once per content version, then read from entry_html
+        response["content_html"] = await run_raw(render.cached_html, entry.id)
+    body = etag.responses.body(check, response)
+    return Response(body, media_type=encoding.JSON_MEDIA_TYPE, headers=check.headers)
+
+@router.get("/{entry_id}/related", response_model=List[RelatedEntry])
+async def get_related_entries(
+    entry_id: int,
+    limit: int = Query(10, ge=1, le=50),
+    db: AsyncSession = Depends(get_session)
+):
+    """Entries with the most similar text, from the in-memory TF-IDF index"""
+    exists = await db.execute(select(Entry.id).where(Entry.id == entry_id))
+    if exists.scalar_one_or_none() is None:
+        raise HTTPException(status_code=404, detail="Entry not found")
+    
+    scores = dict(related.index.related(entry_id, limit))
+    if not scores:
+        return []
     
-    entry_dict = EntryResponse.from_orm(entry).dict()
-    entry_dict["hobby_name"] = hobby_name
-    entry_dict["props"] = props
+    sql, params = related.fetch_entries(list(scores))
+    result = await db.execute(text(sql), params)
     
-    return EntryResponse(**entry_dict)
+    entries = [
+        RelatedEntry(
+            id=row.id,
+            title=row.title,
+            hobby_id=row.hobby_id,
+            hobby_name=row.hobby_name,
+            type_key=row.type_key,
+            created_at=row.created_at,
+            score=round(scores[row.id], 4)
+        )
+        for row in result
+    ]
+    entries.sort(key=lambda entry: entry.score, reverse=True)
+    return entries
 
 @router.put("/{entry_id}", response_model=EntryResponse)
 async def update_entry(entry_id: int, entry_data: EntryUpdate, db: AsyncSession = Depends(get_session)):
@@ -175,39 +388,43 @@ async def update_entry(entry_id: int, entry_data: EntryUpdate, db: AsyncSession
     if not entry:
         raise HTTPException(status_code=404, detail="Entry not found")
     
+    old_tags = entry.tags
+    
     # Update fields
     update_data = entry_data.dict(exclude_unset=True)
-    props = update_data.pop("props", None)
-    tags = update_data.pop("tags", None)
+    new_props = update_data.pop("props", None)
+    new_tags = update_data.pop("tags", None)
     
-    if tags is not None:
-        update_data["tags"] = ",".join(tags) if tags else None
+    if new_tags is not None:
+        update_data["tags"] = ",".join(new_tags) if new_tags else None
     
     for field, value in update_data.items():
         setattr(entry, field, value)
     
-    # Update properties if provided
-    if props is not None:
-        # Delete existing props
-        from sqlalchemy import delete
-        await db.execute(
-            delete(EntryProp).where(EntryProp.entry_id == entry_id)
-        )
-        
-        # Add new props
-        import json
-        for key, value in props.items():
-            prop = EntryProp(
-                entry_id=entry.id,
-                key=key,
-                value_json=json.dumps(value)
-            )
-            db.add(prop)
+    # Replace properties if provided
+    if new_props is not None:
+        await db.flush()
+        await write_props(db, [(entry.id, new_props)])
+    if new_tags is not None:
+        await db.flush()
+        await sync_tags(db, [(entry.id, new_tags)])
     
     await db.commit()
     await db.refresh(entry)
     
-    return await get_entry(entry_id, db)
+    cache.write_generations.bump("entries")
+    if entry.is_archived:
+        suggest.index.remove_entry(entry.id)
+    else:
+        suggest.index.add_entry(entry.id, entry.title, (entry.view_count or 0) + view_counter.pending(entry.id))
+    if new_tags is not None:
+        suggest.index.update_tags(old_tags, new_tags)
+    await run_raw(related.index.update_entry, entry.id)
+    
+    # Built here rather than through get_entry(), an edit isn't a view
+    hobby_result = await db.execute(select(Hobby.name).where(Hobby.id == entry.hobby_id))
+    entry_props = await load_props(db, [entry.id])
+    return ORJSONResponse(entry_response(entry, hobby_result.scalar(), entry_props[entry.id]))
 
 @router.delete("/{entry_id}")
 async def delete_entry(entry_id: int, db: AsyncSession = Depends(get_session)):
@@ -220,4 +437,10 @@ async def delete_entry(entry_id: int, db: AsyncSession = Depends(get_session)):
     await db.execute(delete(Entry).where(Entry.id == entry_id))
     await db.commit()
     
+    cache.write_generations.bump("entries")
+    view_counter.forget(entry_id)
+    suggest.index.remove_entry(entry_id)
+    suggest.index.update_tags(entry.tags, None)
+    related.index.remove_entry(entry_id)
+    
     return {"message": "Entry deleted successfully"}
\ No newline at end of file
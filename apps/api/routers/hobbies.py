@@ -1,12 +1,14 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
+from fastapi.responses import ORJSONResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
-from typing import List
+from typing import Any, Dict, List
 from pydantic import BaseModel
 from typing import Optional
 
-from database import get_session
+from database import get_session, observe_writes
 from models import Hobby
+from services import cache, encoding, etag
 
 router = APIRouter()
 
@@ -23,6 +25,19 @@ class HobbyResponse(BaseModel):
     class Config:
         orm_mode = True
 
+def hobby_response(hobby: Hobby) -> Dict[str, Any]:
+    """A HobbyResponse built straight from the row, without a model pass"""
+    return {
+        "id": hobby.id,
+        "name": hobby.name,
+        "slug": hobby.slug,
+        "icon": hobby.icon,
+        "color": hobby.color,
+        "parent_id": hobby.parent_id,
+        "position": hobby.position,
+        "is_active": bool(hobby.is_active),
+    }
+
 class HobbyCreate(BaseModel):
     name: str
     slug: str
@@ -32,12 +47,18 @@ class HobbyCreate(BaseModel):
     position: int = 0
 
 @router.get("/", response_model=List[HobbyResponse])
-async def get_hobbies(db: AsyncSession = Depends(get_session)):
+async def get_hobbies(request: Request, db: AsyncSession = Depends(get_session)):
+    await observe_writes(db)
+    check = etag.responses.check("hobbies.list", request.headers.get("if-none-match"), ("hobbies",))
+    if check.not_modified:
+        return Response(status_code=304, headers=check.headers)
+    
     result = await db.execute(
         select(Hobby).where(Hobby.is_active == True).order_by(Hobby.position, Hobby.name)
     )
     hobbies = result.scalars().all()
-    return [HobbyResponse.from_orm(hobby) for hobby in hobbies]
+    body = etag.responses.body(check, [hobby_response(hobby) for hobby in hobbies])
+    return Response(body, media_type=encoding.JSON_MEDIA_TYPE, headers=check.headers)
 
 @router.post("/", response_model=HobbyResponse)
 async def create_hobby(hobby_data: HobbyCreate, db: AsyncSession = Depends(get_session)):
@@ -45,12 +66,22 @@ async def create_hobby(hobby_data: HobbyCreate, db: AsyncSession = Depends(get_s
     db.add(hobby)
     await db.commit()
     await db.refresh(hobby)
-    return HobbyResponse.from_orm(hobby)
+    cache.write_generations.bump("hobbies")
+    return ORJSONResponse(hobby_response(hobby))
 
 @router.get("/{hobby_id}", response_model=HobbyResponse)
-async def get_hobby(hobby_id: int, db: AsyncSession = Depends(get_session)):
+async def get_hobby(hobby_id: int, request: Request, db: AsyncSession = Depends(get_session)):
+    await observe_writes(db)
+    updated_at = await db.execute(select(Hobby.updated_at).where(Hobby.id == hobby_id))
+    check = etag.responses.check(
+        "hobbies.detail", request.headers.get("if-none-match"), ("hobbies",), hobby_id, updated_at.scalar()
+    )
+    if check.not_modified:
+        return Response(status_code=304, headers=check.headers)
+    
     result = await db.execute(select(Hobby).where(Hobby.id == hobby_id))
     hobby = result.scalar_one_or_none()
     if not hobby:
         raise HTTPException(status_code=404, detail="Hobby not found")
-    return HobbyResponse.from_orm(hobby)
\ No newline at end of file
+    body = etag.responses.body(check, hobby_response(hobby))
+    return Response(body, media_type=encoding.JSON_MEDIA_TYPE, headers=check.headers)
\ No newline at end of file
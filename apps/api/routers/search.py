@@ -1,19 +1,19 @@
-from fastapi import APIRouter, Depends, Query
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, text
-from typing import List, Optional
+from sqlalchemy import text
+from typing import Dict, List, Optional, Union
 from pydantic import BaseModel
 from datetime import datetime
 
-from database import get_session
-from models import Entry, Hobby
+from database import AsyncSessionLocal, get_session, observe_writes, run_raw
+from services import cache, facets, fts, fuzzy, ndjson, suggest
 
 router = APIRouter()
 
 class SearchResult(BaseModel):
     id: int
     title: str
-    description: str | None
     hobby_id: int
     hobby_name: str
     type_key: str
@@ -21,53 +21,209 @@ class SearchResult(BaseModel):
     snippet: str | None = None
     rank: float | None = None
 
-@router.get("/", response_model=List[SearchResult])
+class UnifiedSearchResult(BaseModel):
+    kind: str
+    id: int
+    title: str | None = None
+    subtitle: str | None = None
+    hobby_id: int
+    hobby_name: str
+    type_key: str | None = None
+    shelf_id: int | None = None
+    shelf_name: str | None = None
+    entry_id: int | None = None
+    created_at: datetime
+    snippet: str | None = None
+    rank: float | None = None
+
+class FacetValue(BaseModel):
+    value: int | str
+    label: str | None = None
+    count: int
+
+class FacetedSearchResponse(BaseModel):
+    results: List[SearchResult]
+    total: int
+    facets: Dict[str, List[FacetValue]]
+
+class Suggestion(BaseModel):
+    text: str
+    entry_id: int | None = None
+    score: int = 0
+
+class SuggestResponse(BaseModel):
+    titles: List[Suggestion]
+    tags: List[Suggestion]
+
+@router.get("/", response_model=Union[List[SearchResult], FacetedSearchResponse, List[UnifiedSearchResult]])
 async def search_entries(
     q: str = Query(..., description="Search query"),
     hobby_id: Optional[int] = Query(None, description="Filter by hobby"),
     type_key: Optional[str] = Query(None, description="Filter by entry type"),
     limit: int = Query(50, le=100),
     offset: int = Query(0, ge=0),
+    snippet_tokens: int = Query(fts.SNIPPET_TOKENS, ge=1, le=fts.SNIPPET_MAX_TOKENS, description="Snippet window in tokens"),
+    highlight_start: str = Query(fts.HIGHLIGHT_START, max_length=32),
+    highlight_end: str = Query(fts.HIGHLIGHT_END, max_length=32),
+    fuzzy_match: bool = Query(False, alias="fuzzy", description="Also match near misspellings"),
+    facet: Optional[str] = Query(None, alias="facets", description="Comma separated facets to count: hobby_id, type_key, tags"),
+    facet_limit: int = Query(facets.TOP_K, ge=1, le=facets.MAX_TOP_K, description="Values returned per facet"),
+    scope: str = Query("entries", description="entries, shelf_items, or all for both merged by rank"),
     db: AsyncSession = Depends(get_session)
 ):
-    if not q.strip():
-        return []
-    
-    # For now, use simple LIKE search until FTS5 is set up
-    search_term = f"%{q}%"
+    try:
+        facet_names = facets.parse_facets(facet)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if scope not in fts.SEARCH_SCOPES:
+        raise HTTPException(status_code=400, detail=f"Unknown scope '{scope}', expected one of {', '.join(fts.SEARCH_SCOPES)}")
+    if facet_names and scope != "entries":
+        raise HTTPException(status_code=400, detail="Facets are only counted for scope=entries")
     
-    query = (
-        select(Entry, Hobby.name.label("hobby_name"))
-        .join(Hobby, Entry.hobby_id == Hobby.id)
-        .where(
-            (Entry.title.ilike(search_term)) |
-            (Entry.description.ilike(search_term)) |
-            (Entry.content_markdown.ilike(search_term)) |
-            (Entry.tags.ilike(search_term))
-        )
-        .where(Entry.is_archived == False)
-        .order_by(Entry.created_at.desc())
+    key = fts.cache_key(
+        q, hobby_id, type_key, limit, offset, snippet_tokens, highlight_start, highlight_end, fuzzy_match,
+        facet_names, facet_limit, scope
     )
+    await observe_writes(db)
+    cached = cache.search_cache.get(key)
+    if cached is not None:
+        return cached
+    
+    match = await run_raw(fuzzy.expand_query, q) if fuzzy_match else None
+    if scope != "entries":
+        results = await _search_all(db, q, hobby_id, type_key, limit, offset, snippet_tokens,
+                                    highlight_start, highlight_end, match, scope)
+        cache.search_cache.put(key, results)
+        return results
     
-    if hobby_id:
-        query = query.where(Entry.hobby_id == hobby_id)
-    if type_key:
-        query = query.where(Entry.type_key == type_key)
+    search = fts.build_search_query(
+        q, hobby_id=hobby_id, type_key=type_key, limit=limit, offset=offset,
+        snippet_tokens=snippet_tokens, match=match
+    )
+    if search is None:
+        return FacetedSearchResponse(results=[], total=0, facets={}) if facet_names else []
     
-    query = query.offset(offset).limit(limit)
-    result = await db.execute(query)
+    sql, params = search
+    result = await db.execute(text(sql), params)
     
     results = []
-    for entry, hobby_name in result:
+    for row in result:
         results.append(SearchResult(
-            id=entry.id,
-            title=entry.title,
-            description=entry.description,
-            hobby_id=entry.hobby_id,
-            hobby_name=hobby_name,
-            type_key=entry.type_key,
-            created_at=entry.created_at,
-            snippet=entry.description[:200] + "..." if entry.description and len(entry.description) > 200 else entry.description
+            id=row.id,
+            title=row.title,
+            hobby_id=row.hobby_id,
+            hobby_name=row.hobby_name,
+            type_key=row.type_key,
+            created_at=row.created_at,
+            snippet=fts.render_snippet(row.snippet, highlight_start, highlight_end),
+            rank=row.rank
         ))
     
-    return results
\ No newline at end of file
+    if facet_names:
+        sql, params = fts.build_facet_query(q, hobby_id=hobby_id, type_key=type_key, match=match)
+        result = await db.execute(text(sql), params)
+        results = FacetedSearchResponse(results=results, **facets.count_facets(result, facet_names, facet_limit))
+    
+    cache.search_cache.put(key, results)
+    return results
+
+async def _search_all(db, q, hobby_id, type_key, limit, offset, snippet_tokens,
+                      highlight_start, highlight_end, match, scope):
+    """Entries and shelf items in one list, see fts.build_unified_search_query()"""
+    search = fts.build_unified_search_query(
+        q, hobby_id=hobby_id, type_key=type_key, limit=limit, offset=offset,
+        snippet_tokens=snippet_tokens, match=match, scope=scope
+    )
+    if search is None:
+        return []
+    
+    sql, params = search
+    result = await db.execute(text(sql), params)
+    return [
+        UnifiedSearchResult(
+            kind=row.kind,
+            id=row.id,
+            title=row.title,
+            subtitle=row.subtitle,
+            hobby_id=row.hobby_id,
+            hobby_name=row.hobby_name,
+            type_key=row.type_key,
+            shelf_id=row.shelf_id,
+            shelf_name=row.shelf_name,
+            entry_id=row.entry_id,
+            created_at=row.created_at,
+            snippet=fts.render_snippet(row.snippet, highlight_start, highlight_end),
+            rank=row.rank
+        )
+        for row in result
+    ]
+
+@router.get("/stream")
+async def stream_search(
+    q: str = Query(..., description="Search query"),
+    hobby_id: Optional[int] = Query(None, description="Filter by hobby"),
+    type_key: Optional[str] = Query(None, description="Filter by entry type"),
+    snippet_tokens: int = Query(fts.SNIPPET_TOKENS, ge=1, le=fts.SNIPPET_MAX_TOKENS, description="Snippet window in tokens"),
+    highlight_start: str = Query(fts.HIGHLIGHT_START, max_length=32),
+    highlight_end: str = Query(fts.HIGHLIGHT_END, max_length=32),
+    fuzzy_match: bool = Query(False, alias="fuzzy", description="Also match near misspellings"),
+    scope: str = Query("entries", description="entries, shelf_items, or all for both merged by rank"),
+):
+    """Every match, unpaged, as one JSON object per line
+    
+    Rows are sent as they're read from a single cursor, and reading stops
+    when the client goes away.
+    """
+    if scope not in fts.SEARCH_SCOPES:
+        raise HTTPException(status_code=400, detail=f"Unknown scope '{scope}', expected one of {', '.join(fts.SEARCH_SCOPES)}")
+    
+    match = await run_raw(fuzzy.expand_query, q) if fuzzy_match else None
+    # LIMIT -1 is no limit in SQLite
+    if scope == "entries":
+        search = fts.build_search_query(
+            q, hobby_id=hobby_id, type_key=type_key, limit=-1,
+            snippet_tokens=snippet_tokens, match=match
+        )
+    else:
+        search = fts.build_unified_search_query(
+            q, hobby_id=hobby_id, type_key=type_key, limit=-1,
+            snippet_tokens=snippet_tokens, match=match, scope=scope
+        )
+    
+    def transform(row):
+        row["snippet"] = fts.render_snippet(row["snippet"], highlight_start, highlight_end)
+        return row
+    
+    async def rows():
+        if search is None:
+            return
+        sql, params = search
+        # Its own session, so the stream doesn't depend on when the request's is closed
+        async with AsyncSessionLocal() as session:
+            result = await session.stream(text(sql), params)
+            async for chunk in ndjson.stream_result(result, transform):
+                yield chunk
+    
+    return StreamingResponse(rows(), media_type=ndjson.MEDIA_TYPE)
+
+@router.get("/suggest", response_model=SuggestResponse)
+async def suggest_completions(
+    q: str = Query(..., description="Typed prefix"),
+    limit: int = Query(8, ge=1, le=suggest.TOP_K),
+    db: AsyncSession = Depends(get_session)
+):
+    matches = suggest.index.suggest(q, limit)
+    titles = matches["titles"]
+    
+    # Title prefixes come from the trie, word prefixes inside titles from FTS
+    if len(titles) < limit:
+        search = fts.build_title_prefix_query(q, limit=limit)
+        if search is not None:
+            sql, params = search
+            result = await db.execute(text(sql), params)
+            titles = suggest.merge_titles(titles, result.all(), limit)
+    
+    return SuggestResponse(
+        titles=[Suggestion(text=title, entry_id=entry_id, score=score) for entry_id, title, score in titles],
+        tags=[Suggestion(text=name, score=score) for name, _, score in matches["tags"]]
+    )
@@ -0,0 +1,44 @@
+from fastapi import APIRouter, Depends, Query, Request, Response
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional
+from pydantic import BaseModel
+
+from database import get_session, observe_writes, run_raw
+from services import encoding, etag, tags
+
+router = APIRouter()
+
+# Tag usage only changes with entry writes
+TAG_TABLES = ("entries",)
+
+class TagUsage(BaseModel):
+    name: str
+    count: int
+
+def tag_usage(rows) -> List[dict]:
+    return [{"name": name, "count": count} for name, count in rows]
+
+@router.get("/top", response_model=List[TagUsage])
+async def get_top_tags(
+    request: Request,
+    hobby_id: Optional[int] = Query(None, description="Usage within one hobby's entries"),
+    limit: int = Query(tags.TOP_K, ge=1, le=100),
+    db: AsyncSession = Depends(get_session)
+):
+    """Most used tags, from the usage counts entry writes maintain"""
+    await observe_writes(db)
+    check = etag.responses.check("tags.top", request.headers.get("if-none-match"), TAG_TABLES, hobby_id, limit)
+    if check.not_modified:
+        return Response(status_code=304, headers=check.headers)
+
+    body = etag.responses.body(check, tag_usage(await run_raw(tags.top, hobby_id, limit)))
+    return Response(body, media_type=encoding.JSON_MEDIA_TYPE, headers=check.headers)
+
+@router.get("/autocomplete", response_model=List[TagUsage])
+async def autocomplete_tags(
+    q: str = Query(..., description="Start of a tag name"),
+    hobby_id: Optional[int] = Query(None, description="Only tags used in this hobby, ranked by that usage"),
+    limit: int = Query(tags.TOP_K, ge=1, le=50)
+):
+    """Most used tags starting with q, ranked over every tag in the prefix's range of the slug index"""
+    return tag_usage(await run_raw(tags.complete, q, hobby_id, limit))
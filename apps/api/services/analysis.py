@@ -0,0 +1,138 @@
+"""
+Text analysis profiles for the search index.
+
+A profile picks the FTS5 tokenizer, a character folding step applied to
+indexed text (in the sync triggers, as SQL) and to queries (in Python), and
+an optional query-side stemmer. It is chosen per deployment with the
+SEARCH_PROFILE and SEARCH_STEMMER environment variables. Changing either
+rebuilds the index on the next startup, or run scripts/search_index.py reindex.
+
+- english: porter stemming, the original behaviour
+- simple: no stemming, diacritics removed
+- turkish: like simple, plus dotted/dotless i folding, which unicode61 gets
+  wrong (it keeps "ı" apart from "i", so "IŞIK" and "ışık" never match)
+"""
+import os
+import unicodedata
+
+# Folding is one character to one character so token positions in the index
+# line up with the unfolded text snippet() highlights
+TURKISH_FOLD = {"ı": "i", "İ": "i"}
+
+# Inflectional suffixes in their folded form, longest first
+TURKISH_SUFFIXES = sorted({
+    "lar", "ler", "lari", "leri", "larin", "lerin", "lara", "lere",
+    "larda", "lerde", "lardan", "lerden",
+    "da", "de", "ta", "te", "dan", "den", "tan", "ten",
+    "nin", "nun", "in", "un",
+    "ya", "ye", "yi", "yu", "yla", "yle", "la", "le",
+    "si", "su", "mi", "mu", "miz", "muz", "niz", "nuz",
+    "ki", "dir", "tir", "dur", "tur",
+}, key=len, reverse=True)
+
+MIN_STEM_LENGTH = 3
+
+
+def strip_diacritics(text):
+    decomposed = unicodedata.normalize("NFD", text)
+    return "".join(char for char in decomposed if not unicodedata.combining(char))
+
+
+def turkish_stem(term):
+    """Light suffix stripping, good enough to turn a term into a prefix query"""
+    stem = term
+    for _ in range(3):
+        for suffix in TURKISH_SUFFIXES:
+            if stem.endswith(suffix) and len(stem) - len(suffix) >= MIN_STEM_LENGTH:
+                stem = stem[:-len(suffix)]
+                break
+        else:
+            break
+    return stem
+
+
+STEMMERS = {
+    "turkish": turkish_stem,
+}
+
+
+class Profile:
+    def __init__(self, name, tokenizer, fold_map=None, remove_diacritics=False, stemmer=None):
+        self.name = name
+        self.tokenizer = tokenizer
+        self.fold_map = fold_map or {}
+        self.remove_diacritics = remove_diacritics
+        self.stemmer = stemmer
+
+    @property
+    def signature(self):
+        """Everything that changes what ends up in the index"""
+        return f"{self.name}:{self.tokenizer}"
+
+    def fold_sql(self, expression):
+        """SQL applying fold_map to a column expression, used by the triggers"""
+        for source, target in self.fold_map.items():
+            expression = f"replace({expression}, '{source}', '{target}')"
+        return expression
+
+    def fold(self, text):
+        """Python side of fold_sql, the tokenizer does the rest"""
+        for source, target in self.fold_map.items():
+            text = text.replace(source, target)
+        return text
+
+    def normalize(self, text):
+        """Folded, case-insensitive form for in-memory indexes"""
+        text = self.fold(text).casefold()
+        if self.remove_diacritics:
+            text = strip_diacritics(text)
+        return text
+
+    def match_term(self, term, prefix=False):
+        """Quoted MATCH phrase for one query term"""
+        term = self.fold(term)
+        if self.stemmer:
+            stem = self.stemmer(self.normalize(term))
+            if stem != self.normalize(term):
+                return f'"{stem}"*'
+        return f'"{term}"*' if prefix else f'"{term}"'
+
+
+PROFILES = {
+    "english": dict(tokenizer="porter unicode61"),
+    "simple": dict(tokenizer="unicode61 remove_diacritics 2", remove_diacritics=True),
+    "turkish": dict(
+        tokenizer="unicode61 remove_diacritics 2",
+        fold_map=TURKISH_FOLD,
+        remove_diacritics=True,
+    ),
+}
+
+_profile = None
+
+
+def build_profile(name=None, stemmer=None):
+    name = (name or "english").lower()
+    if name not in PROFILES:
+        raise ValueError(f"Unknown search profile '{name}', expected one of {', '.join(PROFILES)}")
+
+    stemmer = (stemmer or "").lower() or None
+    if stemmer and stemmer not in STEMMERS:
+        raise ValueError(f"Unknown search stemmer '{stemmer}', expected one of {', '.join(STEMMERS)}")
+
+    return Profile(name, stemmer=STEMMERS.get(stemmer), **PROFILES[name])
+
+
+def get_profile():
+    """Profile configured for this deployment"""
+    global _profile
+    if _profile is None:
+        _profile = build_profile(os.getenv("SEARCH_PROFILE"), os.getenv("SEARCH_STEMMER"))
+    return _profile
+
+
+def set_profile(name=None, stemmer=None):
+    """Override the configured profile, for scripts and benchmarks"""
+    global _profile
+    _profile = build_profile(name, stemmer)
+    return _profile
@@ -0,0 +1,208 @@
+"""
+Bulk create, update, archive and delete of entries.
+
+Every item is checked before anything is written, so a batch either applies
+whole or not at all. Writes go in the caller's transaction: creates, one
+INSERT each to read back its id, then updates, archives and deletes, one
+executemany each, with props replaced alongside in the database's props
+storage and tags stored as the usual comma string, mirrored into entry_tags.
+"""
+import json
+
+from services import props, related, suggest, tags
+
+MAX_ITEMS = 5000
+OPERATIONS = ("create", "update", "archive", "delete")
+# Columns an update may set, props are handled separately
+UPDATE_FIELDS = ("title", "description", "content_markdown", "tags", "is_favorite", "is_archived")
+_CREATE_FIELDS = ("hobby_id", "type_key", "title", "description", "content_markdown", "tags", "is_favorite", "props")
+
+
+class BulkError(ValueError):
+    """Validation failed, errors lists {op, index, error} for each bad item"""
+
+    def __init__(self, errors):
+        super().__init__(f"{len(errors)} invalid item(s), nothing was written")
+        self.errors = errors
+
+
+def _tags(tags):
+    tags = suggest.split_tags(tags)
+    return ",".join(tags) if tags else None
+
+
+def _existing(cursor, table, ids):
+    cursor.execute(
+        f"SELECT id FROM {table} WHERE id IN (SELECT value FROM json_each(?))", [json.dumps(list(set(ids)))]
+    )
+    return {row[0] for row in cursor.fetchall()}
+
+
+def validate(conn, operations):
+    """Check a batch and return it normalized, raises BulkError
+
+    operations maps create to entry dicts, update to entry dicts with an id,
+    and archive and delete to entry ids, any of them may be left out.
+    """
+    unknown = [op for op in operations if op not in OPERATIONS]
+    if unknown:
+        raise BulkError([{"op": op, "index": None, "error": "Unknown operation"} for op in unknown])
+    batch = {op: list(operations.get(op) or []) for op in OPERATIONS}
+    if sum(len(items) for items in batch.values()) > MAX_ITEMS:
+        raise BulkError([{"op": None, "index": None, "error": f"At most {MAX_ITEMS} items per batch"}])
+
+    cursor = conn.cursor()
+    errors = []
+
+    def error(op, index, message):
+        errors.append({"op": op, "index": index, "error": message})
+
+    hobbies = _existing(cursor, "hobbies", [item.get("hobby_id") for item in batch["create"]])
+    creates = []
+    for index, item in enumerate(batch["create"]):
+        extra = set(item) - set(_CREATE_FIELDS)
+        if extra:
+            error("create", index, f"Unknown field '{sorted(extra)[0]}'")
+        elif item.get("hobby_id") not in hobbies:
+            error("create", index, "Hobby not found")
+        elif not item.get("title") or not item.get("type_key"):
+            error("create", index, "title and type_key are required")
+        elif not isinstance(item.get("props") or {}, dict):
+            error("create", index, "props must be an object")
+        else:
+            creates.append({
+                "hobby_id": item["hobby_id"],
+                "type_key": item["type_key"],
+                "title": item["title"],
+                "description": item.get("description"),
+                "content_markdown": item.get("content_markdown"),
+                "tags": _tags(item.get("tags")),
+                "is_favorite": bool(item.get("is_favorite", False)),
+                "props": item.get("props") or {},
+            })
+
+    entries = _existing(cursor, "entries", [item.get("id") for item in batch["update"]]
+                        + batch["archive"] + batch["delete"])
+    updates = []
+    for index, item in enumerate(batch["update"]):
+        fields = {key: value for key, value in item.items() if key not in ("id", "props")}
+        extra = set(fields) - set(UPDATE_FIELDS)
+        if item.get("id") not in entries:
+            error("update", index, "Entry not found")
+        elif extra:
+            error("update", index, f"Unknown field '{sorted(extra)[0]}'")
+        elif "title" in fields and not fields["title"]:
+            error("update", index, "title can't be empty")
+        elif item.get("props") is not None and not isinstance(item["props"], dict):
+            error("update", index, "props must be an object")
+        else:
+            if "tags" in fields:
+                fields["tags"] = _tags(fields["tags"])
+            updates.append({"id": item["id"], "fields": fields, "props": item.get("props")})
+
+    for op in ("archive", "delete"):
+        for index, entry_id in enumerate(batch[op]):
+            if entry_id not in entries:
+                error(op, index, "Entry not found")
+
+    if errors:
+        raise BulkError(errors)
+    return {"create": creates, "update": updates, "archive": batch["archive"], "delete": batch["delete"]}
+
+
+def apply(conn, operations):
+    """Validate and write a batch, returns per-item results and what changed
+
+    Runs in the caller's transaction. New ids are each insert's lastrowid.
+    """
+    batch = validate(conn, operations)
+    cursor = conn.cursor()
+    results = []
+
+    touched = [item["id"] for item in batch["update"]] + batch["archive"] + batch["delete"]
+    cursor.execute(
+        "SELECT id, tags FROM entries WHERE id IN (SELECT value FROM json_each(?))", [json.dumps(touched)]
+    )
+    old_tags = dict(cursor.fetchall())
+
+    created = []
+    if batch["create"]:
+        for item in batch["create"]:
+            cursor.execute(
+                """
+                INSERT INTO entries (hobby_id, type_key, title, description, content_markdown, tags,
+                                     is_favorite, is_archived, view_count)
+                VALUES (:hobby_id, :type_key, :title, :description, :content_markdown, :tags, :is_favorite, 0, 0)
+                """,
+                item,
+            )
+            created.append(cursor.lastrowid)
+        props.write_props(conn, [(entry_id, item["props"]) for entry_id, item in zip(created, batch["create"])])
+        results += [{"op": "create", "index": index, "id": entry_id, "ok": True}
+                    for index, entry_id in enumerate(created)]
+
+    # One executemany per distinct set of updated columns
+    groups = {}
+    for item in batch["update"]:
+        groups.setdefault(tuple(sorted(item["fields"])), []).append(item)
+    for columns, items in groups.items():
+        assignments = "".join(f"{column} = :{column}, " for column in columns)
+        cursor.executemany(
+            f"UPDATE entries SET {assignments}updated_at = CURRENT_TIMESTAMP WHERE id = :id",
+            [{"id": item["id"], **item["fields"]} for item in items],
+        )
+    props.write_props(conn, [(item["id"], item["props"]) for item in batch["update"] if item["props"] is not None])
+    results += [{"op": "update", "index": index, "id": item["id"], "ok": True}
+                for index, item in enumerate(batch["update"])]
+    tags.sync(conn, [(entry_id, item["tags"]) for entry_id, item in zip(created, batch["create"])]
+              + [(item["id"], item["fields"]["tags"]) for item in batch["update"] if "tags" in item["fields"]])
+
+    cursor.executemany(
+        "UPDATE entries SET is_archived = 1, updated_at = CURRENT_TIMESTAMP WHERE id = ?",
+        [(entry_id,) for entry_id in batch["archive"]],
+    )
+    results += [{"op": "archive", "index": index, "id": entry_id, "ok": True}
+                for index, entry_id in enumerate(batch["archive"])]
+
+    deleted = [(entry_id,) for entry_id in batch["delete"]]
+    props.delete_props(conn, batch["delete"])
+    cursor.executemany("DELETE FROM entries WHERE id = ?", deleted)
+    results += [{"op": "delete", "index": index, "id": entry_id, "ok": True}
+                for index, entry_id in enumerate(batch["delete"])]
+
+    # From each entry's tags before the batch to after it, so an entry updated
+    # twice, or updated and then deleted, counts once
+    final_tags = {item["id"]: item["fields"]["tags"] for item in batch["update"] if "tags" in item["fields"]}
+    final_tags.update((entry_id, None) for entry_id in batch["delete"])
+    tag_changes = [(None, item["tags"]) for item in batch["create"]]
+    tag_changes += [(old_tags[entry_id], new_tags) for entry_id, new_tags in final_tags.items()]
+    changed = {
+        "written": created + [item["id"] for item in batch["update"]] + batch["archive"],
+        "deleted": batch["delete"],
+        "tag_changes": tag_changes,
+    }
+    summary = {op: len(batch[op]) for op in OPERATIONS}
+    return {"results": results, "summary": summary, "changed": changed}
+
+
+def refresh_indexes(conn, changed):
+    """Bring the in-process suggest and related indexes up to date after apply() committed"""
+    cursor = conn.cursor()
+    deleted = set(changed["deleted"])
+    written = [entry_id for entry_id in dict.fromkeys(changed["written"]) if entry_id not in deleted]
+    cursor.execute(
+        "SELECT id, title, view_count, is_archived FROM entries WHERE id IN (SELECT value FROM json_each(?))",
+        [json.dumps(written)],
+    )
+    for entry_id, title, view_count, is_archived in cursor.fetchall():
+        if is_archived:
+            suggest.index.remove_entry(entry_id)
+        else:
+            suggest.index.add_entry(entry_id, title, view_count)
+    for entry_id in deleted:
+        suggest.index.remove_entry(entry_id)
+        related.index.remove_entry(entry_id)
+    for old, new in changed["tag_changes"]:
+        suggest.index.update_tags(old, new)
+    for entry_id in written:
+        related.index.update_entry(conn, entry_id)
@@ -0,0 +1,164 @@
+"""
+Write generations and the caches that are invalidated by them.
+
+Every write to a table bumps its generation, cached values remember the
+generations they were computed at and are dropped once those move on. Writes
+from other processes are picked up through SQLite's PRAGMA data_version,
+which changes when another connection commits; since the writer is unknown,
+every table's generation is bumped.
+"""
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+
+
+class WriteGenerations:
+    """Per-table write counters"""
+
+    def __init__(self):
+        self._counters = {}
+        # Bumped for writes we can't attribute to a table
+        self._epoch = 0
+        self._data_version = None
+        self._lock = threading.Lock()
+
+    def get(self, table):
+        return self._counters.get(table, 0) + self._epoch
+
+    def snapshot(self, tables):
+        return tuple(self.get(table) for table in tables)
+
+    def bump(self, *tables):
+        with self._lock:
+            for table in tables:
+                self._counters[table] = self._counters.get(table, 0) + 1
+
+    def bump_all(self):
+        with self._lock:
+            self._epoch += 1
+
+    def observe_data_version(self, version):
+        """Bump everything if some other connection committed since last time"""
+        if version is None:
+            return
+        with self._lock:
+            changed = self._data_version is not None and version != self._data_version
+            self._data_version = version
+        if changed:
+            self.bump_all()
+
+    def acknowledge_data_version(self, version):
+        """Record a data_version change caused by one of our own writes"""
+        if version is not None:
+            with self._lock:
+                self._data_version = version
+
+
+def read_data_version(conn):
+    cursor = conn.cursor()
+    cursor.execute("PRAGMA data_version")
+    return cursor.fetchone()[0]
+
+
+class DataVersionWatch:
+    """Long-lived connection for apps that open a new connection per request
+
+    data_version is per connection, so a dedicated one is kept open to compare
+    against. It moves on every other connection's commit, ours included, so
+    observe() runs before our own writes and record() after them to tell the
+    two apart; only a foreign commit landing in between goes unnoticed.
+    """
+
+    def __init__(self, generations=None):
+        self.generations = generations or write_generations
+        self.conn = None
+
+    def open(self, db_path):
+        self.conn = sqlite3.connect(str(db_path), check_same_thread=False)
+
+    def close(self):
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+
+    def observe(self):
+        """Invalidate everything if another process wrote, call before reading a cache"""
+        if self.conn is not None:
+            self.generations.observe_data_version(read_data_version(self.conn))
+
+    def record(self, *tables):
+        """Bump tables after one of our own commits, tables may be empty"""
+        self.generations.bump(*tables)
+        if self.conn is not None:
+            self.generations.acknowledge_data_version(read_data_version(self.conn))
+
+
+class VersionedCache:
+    """LRU cache whose entries are only valid for the generations they were stored at"""
+
+    def __init__(self, tables, max_size=256, generations=None):
+        self.tables = tuple(tables)
+        self.max_size = max_size
+        self.generations = generations or write_generations
+        self._entries = OrderedDict()
+        self._snapshot = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def _validate(self):
+        snapshot = self.generations.snapshot(self.tables)
+        if snapshot != self._snapshot:
+            if self._entries:
+                self.invalidations += 1
+            self._entries.clear()
+            self._snapshot = snapshot
+
+    def get(self, key):
+        with self._lock:
+            self._validate()
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+            self.misses += 1
+            return None
+
+    def put(self, key, value):
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            self._validate()
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+            "generations": dict(zip(self.tables, self.generations.snapshot(self.tables))),
+        }
+
+
+write_generations = WriteGenerations()
+
+search_cache = VersionedCache(
+    tables=["entries", "hobbies", "shelf_items"],
+    max_size=int(os.getenv("SEARCH_CACHE_SIZE", "256")),
+)
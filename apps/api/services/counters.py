@@ -0,0 +1,218 @@
+"""
+Counter cache for entry, shelf item and hobby counts.
+
+The counters table holds one integer per (name, scope_id): totals under
+scope 0, per-hobby and per-shelf counts under the hobby or shelf id. Triggers
+on entries, hobbies, shelves and shelf_items add the difference every write
+makes in the same transaction, so stats are a primary key lookup instead of
+a scan, and a rolled back write leaves them as they were.
+
+RECOUNT_SQL computes every counter from the tables; repair() compares the
+table against it and rewrites it, for a database changed with the triggers
+missing.
+"""
+import json
+
+COUNTERS_TABLE = "counters"
+TOTAL = 0
+
+# name -> SQL of (scope_id, value) rows as the tables stand
+RECOUNT_SQL = {
+    "entries": "SELECT 0, COUNT(*) FROM entries",
+    "entries.archived": "SELECT 0, COUNT(*) FROM entries WHERE COALESCE(is_archived, 0) != 0",
+    "entries.favorite": "SELECT 0, COUNT(*) FROM entries WHERE COALESCE(is_favorite, 0) != 0",
+    "entries.views": "SELECT 0, COALESCE(SUM(view_count), 0) FROM entries",
+    "hobbies": "SELECT 0, COUNT(*) FROM hobbies",
+    "hobbies.active": "SELECT 0, COUNT(*) FROM hobbies WHERE COALESCE(is_active, 0) != 0",
+    "shelves": "SELECT 0, COUNT(*) FROM shelves",
+    "hobby.active": "SELECT hobby_id, COUNT(*) FROM entries WHERE COALESCE(is_archived, 0) = 0 GROUP BY hobby_id",
+    "hobby.archived": "SELECT hobby_id, COUNT(*) FROM entries WHERE COALESCE(is_archived, 0) != 0 GROUP BY hobby_id",
+    "hobby.favorite": "SELECT hobby_id, COUNT(*) FROM entries WHERE COALESCE(is_favorite, 0) != 0 GROUP BY hobby_id",
+    "shelf.items": "SELECT shelf_id, COUNT(*) FROM shelf_items GROUP BY shelf_id",
+}
+TOTAL_COUNTERS = ("entries", "entries.archived", "entries.favorite", "entries.views", "hobbies", "hobbies.active", "shelves")
+HOBBY_COUNTERS = ("hobby.active", "hobby.archived", "hobby.favorite")
+
+
+def _flag(value):
+    return f"(COALESCE({value}, 0) != 0)"
+
+
+def _add(name, scope, delta):
+    """Trigger statement adding delta to a counter, creating it at delta"""
+    return (
+        f"INSERT INTO {COUNTERS_TABLE} (name, scope_id, value) VALUES ('{name}', {scope}, {delta}) "
+        f"ON CONFLICT(name, scope_id) DO UPDATE SET value = value + excluded.value;"
+    )
+
+
+def _entry_flags(row, sign):
+    """Changes to the archived and favorite counts of an entries row being counted (+) or not (-)"""
+    return [
+        _add("entries.archived", TOTAL, f"{sign}{_flag(row + '.is_archived')}"),
+        _add("entries.favorite", TOTAL, f"{sign}{_flag(row + '.is_favorite')}"),
+        _add("hobby.active", f"{row}.hobby_id", f"{sign}(NOT {_flag(row + '.is_archived')})"),
+        _add("hobby.archived", f"{row}.hobby_id", f"{sign}{_flag(row + '.is_archived')}"),
+        _add("hobby.favorite", f"{row}.hobby_id", f"{sign}{_flag(row + '.is_favorite')}"),
+    ]
+
+
+def _trigger(name, event, body, when=None):
+    condition = f" WHEN {when}" if when else ""
+    statements = "\n            ".join(body)
+    return f"""
+        CREATE TRIGGER IF NOT EXISTS {name} {event}{condition} BEGIN
+            {statements}
+        END
+        """
+
+
+def create_statements():
+    """DDL for the counters table and the triggers that keep it"""
+    entry_moves = "old.hobby_id IS NOT new.hobby_id OR old.is_archived IS NOT new.is_archived OR old.is_favorite IS NOT new.is_favorite"
+    return [
+        f"""
+        CREATE TABLE IF NOT EXISTS {COUNTERS_TABLE} (
+            name TEXT NOT NULL,
+            scope_id INTEGER NOT NULL,
+            value INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (name, scope_id)
+        ) WITHOUT ROWID
+        """,
+        _trigger("entry_counters_insert", "AFTER INSERT ON entries", [
+            _add("entries", TOTAL, "1"),
+            _add("entries.views", TOTAL, "COALESCE(new.view_count, 0)"),
+        ] + _entry_flags("new", "+")),
+        _trigger("entry_counters_delete", "AFTER DELETE ON entries", [
+            _add("entries", TOTAL, "-1"),
+            _add("entries.views", TOTAL, "-COALESCE(old.view_count, 0)"),
+        ] + _entry_flags("old", "-")),
+        # Only the counted columns, so editing a title or content leaves the counters alone
+        _trigger(
+            "entry_counters_update", "AFTER UPDATE OF hobby_id, is_archived, is_favorite ON entries",
+            _entry_flags("old", "-") + _entry_flags("new", "+"),
+            entry_moves,
+        ),
+        _trigger(
+            "entry_counters_views", "AFTER UPDATE OF view_count ON entries",
+            [_add("entries.views", TOTAL, "COALESCE(new.view_count, 0) - COALESCE(old.view_count, 0)")],
+            "old.view_count IS NOT new.view_count",
+        ),
+        _trigger("hobby_counters_insert", "AFTER INSERT ON hobbies", [
+            _add("hobbies", TOTAL, "1"),
+            _add("hobbies.active", TOTAL, _flag("new.is_active")),
+        ]),
+        _trigger("hobby_counters_delete", "AFTER DELETE ON hobbies", [
+            _add("hobbies", TOTAL, "-1"),
+            _add("hobbies.active", TOTAL, f"-{_flag('old.is_active')}"),
+        ]),
+        _trigger("hobby_counters_update", "AFTER UPDATE OF is_active ON hobbies", [
+            _add("hobbies.active", TOTAL, f"{_flag('new.is_active')} - {_flag('old.is_active')}"),
+        ], "old.is_active IS NOT new.is_active"),
+        _trigger("shelf_counters_insert", "AFTER INSERT ON shelves", [_add("shelves", TOTAL, "1")]),
+        _trigger("shelf_counters_delete", "AFTER DELETE ON shelves", [_add("shelves", TOTAL, "-1")]),
+        _trigger("shelf_item_counters_insert", "AFTER INSERT ON shelf_items", [_add("shelf.items", "new.shelf_id", "1")]),
+        _trigger("shelf_item_counters_delete", "AFTER DELETE ON shelf_items", [_add("shelf.items", "old.shelf_id", "-1")]),
+        _trigger("shelf_item_counters_update", "AFTER UPDATE OF shelf_id ON shelf_items", [
+            _add("shelf.items", "old.shelf_id", "-1"),
+            _add("shelf.items", "new.shelf_id", "1"),
+        ], "old.shelf_id IS NOT new.shelf_id"),
+    ]
+
+
+def ensure_schema(conn):
+    """Create the counters table and triggers if missing, caller commits
+
+    A new table is filled from the tables in the same transaction, so no
+    write can land between the count and the triggers.
+    """
+    cursor = conn.cursor()
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", [COUNTERS_TABLE])
+    created = cursor.fetchone() is None
+    for statement in create_statements():
+        cursor.execute(statement)
+    if created:
+        _rewrite(cursor, recount(conn))
+
+
+def recount(conn):
+    """{(name, scope_id): value} of every counter computed from the tables"""
+    cursor = conn.cursor()
+    counts = {}
+    for name, sql in RECOUNT_SQL.items():
+        cursor.execute(sql)
+        for scope_id, value in cursor.fetchall():
+            if scope_id is not None:
+                counts[(name, scope_id)] = value
+    return counts
+
+
+def stored(conn):
+    """{(name, scope_id): value} as the counters table has them"""
+    cursor = conn.cursor()
+    cursor.execute(f"SELECT name, scope_id, value FROM {COUNTERS_TABLE}")
+    return {(name, scope_id): value for name, scope_id, value in cursor.fetchall()}
+
+
+def drift(conn):
+    """Counters whose stored value differs from a recount, zero and missing are the same
+
+    Returns [{name, scope_id, stored, actual}] sorted by name and scope.
+    """
+    actual = recount(conn)
+    current = stored(conn)
+    return [
+        {"name": name, "scope_id": scope_id, "stored": current.get((name, scope_id), 0),
+         "actual": actual.get((name, scope_id), 0)}
+        for name, scope_id in sorted(set(actual) | set(current))
+        if current.get((name, scope_id), 0) != actual.get((name, scope_id), 0)
+    ]
+
+
+def _rewrite(cursor, counts):
+    cursor.execute(f"DELETE FROM {COUNTERS_TABLE}")
+    cursor.executemany(
+        f"INSERT INTO {COUNTERS_TABLE} (name, scope_id, value) VALUES (?, ?, ?)",
+        [(name, scope_id, value) for (name, scope_id), value in counts.items() if value],
+    )
+
+
+def repair(conn):
+    """Recompute every counter from scratch, returns the drift it corrected
+
+    Also recreates missing triggers. One transaction, which the caller commits.
+    """
+    ensure_schema(conn)
+    found = drift(conn)
+    _rewrite(conn.cursor(), recount(conn))
+    return {"drift": found, "counters": len(stored(conn))}
+
+
+def totals(conn):
+    """{name: value} of the TOTAL_COUNTERS, a primary key lookup each"""
+    cursor = conn.cursor()
+    cursor.execute(
+        f"SELECT name, value FROM {COUNTERS_TABLE} WHERE scope_id = {TOTAL} "
+        f"AND name IN (SELECT value FROM json_each(?))",
+        [json.dumps(TOTAL_COUNTERS)],
+    )
+    counts = dict.fromkeys(TOTAL_COUNTERS, 0)
+    counts.update(cursor.fetchall())
+    return counts
+
+
+def hobby_counts(conn, hobby_ids=None):
+    """{hobby_id: {active, archived, favorite}} for the listed hobbies, or every counted one"""
+    sql = f"SELECT name, scope_id, value FROM {COUNTERS_TABLE} WHERE name IN (SELECT value FROM json_each(:names))"
+    params = {"names": json.dumps(HOBBY_COUNTERS)}
+    if hobby_ids is not None:
+        hobby_ids = list(hobby_ids)
+        sql += " AND scope_id IN (SELECT value FROM json_each(:hobby_ids))"
+        params["hobby_ids"] = json.dumps(hobby_ids)
+    cursor = conn.cursor()
+    cursor.execute(sql, params)
+    empty = dict.fromkeys((name.split(".")[1] for name in HOBBY_COUNTERS), 0)
+    counts = {hobby_id: dict(empty) for hobby_id in hobby_ids or []}
+    for name, hobby_id, value in cursor.fetchall():
+        counts.setdefault(hobby_id, dict(empty))[name.split(".")[1]] = value
+    return counts
@@ -0,0 +1,76 @@
+"""
+Encoding and compression of response bodies.
+
+Bodies are encoded with orjson, which also takes datetimes as they come from
+the database, so routes hand over plain dicts built straight from their rows
+instead of running them through a model and jsonable_encoder first.
+
+A body of at least COMPRESS_MIN_BYTES is compressed when the client accepts
+it, with brotli if it's installed and preferred, else gzip. Smaller ones
+aren't worth the CPU, the headers alone are a few hundred bytes.
+"""
+import gzip
+import os
+
+import orjson
+
+try:
+    import brotli
+except ImportError:  # Optional, gzip does without it
+    brotli = None
+
+JSON_MEDIA_TYPE = "application/json"
+COMPRESS_MIN_BYTES = int(os.getenv("COMPRESS_MIN_BYTES", "1024"))
+GZIP_LEVEL = 6
+# Quality 4-5 is about gzip's speed at a better ratio, 11 is for static files
+BROTLI_QUALITY = 5
+# Images and media are compressed already
+COMPRESSIBLE_TYPES = ("application/json", "application/x-ndjson", "text/")
+
+_OPTIONS = orjson.OPT_NON_STR_KEYS
+
+
+def dumps(content):
+    """JSON bytes of content, anything orjson doesn't know is sent as str()"""
+    return orjson.dumps(content, default=str, option=_OPTIONS)
+
+
+def available():
+    """Content codings this process can produce, preferred first"""
+    return ("br", "gzip") if brotli is not None else ("gzip",)
+
+
+def negotiate(accept_encoding):
+    """The coding to use for an Accept-Encoding header, None for identity"""
+    if not accept_encoding:
+        return None
+    weights = {}
+    for part in accept_encoding.split(","):
+        coding, _, params = part.strip().partition(";")
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        weights[coding.strip().lower()] = quality
+    best = None
+    for coding in available():
+        quality = weights.get(coding, weights.get("*", 0.0))
+        if quality > 0 and (best is None or quality > best[1]):
+            best = (coding, quality)
+    return best[0] if best else None
+
+
+def compressible(content_type, size, min_size=COMPRESS_MIN_BYTES):
+    """Whether a body of this type and size is worth compressing"""
+    return size >= min_size and bool(content_type) and content_type.startswith(COMPRESSIBLE_TYPES)
+
+
+def compress(body, coding):
+    """body in a coding from negotiate()"""
+    if coding == "br":
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    # mtime=0 keeps the output the same for the same body
+    return gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
@@ -0,0 +1,152 @@
+"""
+ETags and If-None-Match for the read endpoints.
+
+An ETag hashes the request, i.e. route and query string, with the write
+generations of the tables the response is read from, and for a single row
+its updated_at. Nothing from the body goes into it, so a matching request is
+answered 304 before anything is loaded or serialized. Generations restart at
+zero with the process, so a per-process boot id is mixed in too.
+
+Entry responses carry view_count, which reads move on without a write, so
+their ETags are weak: equal content apart from the view count.
+
+A compressed body is a different representation, so CompressionMiddleware
+gives it its own tag, the coding's suffix inside the quotes ("abc-gz"),
+and turns the suffix back off If-None-Match before the route compares it.
+"""
+import hashlib
+import threading
+import time
+import uuid
+
+from services import cache, encoding
+
+BOOT_ID = uuid.uuid4().hex
+ETAG_HEADER = "ETag"
+# Clients keep the body but ask every time, the ETag makes asking cheap
+CACHE_CONTROL = "no-cache"
+# Appended inside the quotes of the ETag of a compressed representation
+CODING_SUFFIXES = {"br": "-br", "gzip": "-gz"}
+
+
+def matches(if_none_match, etag):
+    """Weak comparison of an If-None-Match header against an ETag, as GET uses"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    opaque = etag[2:] if etag.startswith("W/") else etag
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == opaque:
+            return True
+    return False
+
+
+def for_coding(etag, coding):
+    """ETag of the representation compressed with coding, weak or strong as etag is"""
+    suffix = CODING_SUFFIXES.get(coding)
+    if not suffix or not etag.endswith('"') or etag.endswith(f'{suffix}"'):
+        return etag
+    return f'{etag[:-1]}{suffix}"'
+
+
+def strip_coding(if_none_match, coding):
+    """If-None-Match with the tags of coding's representation turned into the ones check() computes
+
+    Returns (header, True if any tag had the suffix). Tags of other codings
+    are left as they are, so they don't match.
+    """
+    suffix = CODING_SUFFIXES.get(coding)
+    if not if_none_match or not suffix:
+        return if_none_match, False
+    candidates = []
+    coded = False
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate.endswith(f'{suffix}"'):
+            candidate = f'{candidate[:-len(suffix) - 1]}"'
+            coded = True
+        candidates.append(candidate)
+    return ", ".join(candidates), coded
+
+
+class Check:
+    """Outcome of ConditionalResponses.check() for one request"""
+
+    def __init__(self, route, etag, not_modified):
+        self.route = route
+        self.etag = etag
+        self.not_modified = not_modified
+        self.started = time.perf_counter()
+
+    @property
+    def headers(self):
+        return {ETAG_HEADER: self.etag, "Cache-Control": CACHE_CONTROL}
+
+
+class ConditionalResponses:
+    """ETag checks plus per-route statistics on what the 304s saved"""
+
+    def __init__(self, generations):
+        self.generations = generations
+        self._routes = {}
+        self._lock = threading.Lock()
+
+    def _route(self, route):
+        return self._routes.setdefault(route, {
+            "requests": 0,
+            "not_modified": 0,
+            "bytes_sent": 0,
+            "build_seconds": 0.0,
+            "built": 0,
+        })
+
+    def etag(self, route, tables, *parts, weak=False):
+        key = repr((BOOT_ID, route, self.generations.snapshot(tables)) + parts)
+        digest = hashlib.sha1(key.encode("utf-8")).hexdigest()[:20]
+        return f'W/"{digest}"' if weak else f'"{digest}"'
+
+    def check(self, route, if_none_match, tables, *parts, weak=False):
+        """ETag of a request and whether the client already has it"""
+        tag = self.etag(route, tables, *parts, weak=weak)
+        not_modified = matches(if_none_match, tag)
+        with self._lock:
+            stats = self._route(route)
+            stats["requests"] += 1
+            if not_modified:
+                stats["not_modified"] += 1
+        return Check(route, tag, not_modified)
+
+    def body(self, check, content):
+        """Encode a full response for check, recording its size and build time"""
+        body = encoding.dumps(content)
+        with self._lock:
+            stats = self._route(check.route)
+            stats["bytes_sent"] += len(body)
+            stats["build_seconds"] += time.perf_counter() - check.started
+            stats["built"] += 1
+        return body
+
+    def stats(self):
+        """Per-route counts, savings are estimated from the route's average full response"""
+        routes = {}
+        with self._lock:
+            for route, stats in sorted(self._routes.items()):
+                built = stats["built"]
+                average_bytes = stats["bytes_sent"] / built if built else 0
+                average_seconds = stats["build_seconds"] / built if built else 0
+                routes[route] = {
+                    "requests": stats["requests"],
+                    "not_modified": stats["not_modified"],
+                    "hit_rate": round(stats["not_modified"] / stats["requests"], 4) if stats["requests"] else 0.0,
+                    "bytes_sent": stats["bytes_sent"],
+                    "bytes_saved": round(average_bytes * stats["not_modified"]),
+                    "seconds_saved": round(average_seconds * stats["not_modified"], 4),
+                }
+        return routes
+
+
+responses = ConditionalResponses(cache.write_generations)
@@ -0,0 +1,56 @@
+"""
+Facet counts for search results.
+
+All facets are counted in one pass over the rows of fts.build_facet_query(),
+streamed from the cursor, and only the top-k values of each are returned so
+the response stays small however broad the query.
+"""
+import heapq
+from collections import Counter
+
+from services import suggest
+
+FACETS = ("hobby_id", "type_key", "tags")
+TOP_K = 10
+MAX_TOP_K = 50
+
+
+def parse_facets(value):
+    """Facet names from a comma separated query parameter, None if not asked for"""
+    if not value:
+        return None
+    names = [name.strip() for name in value.split(",") if name.strip()]
+    if names in (["true"], ["all"]):
+        return FACETS
+    unknown = [name for name in names if name not in FACETS]
+    if unknown:
+        raise ValueError(f"Unknown facet '{unknown[0]}', expected one of {', '.join(FACETS)}")
+    return tuple(name for name in FACETS if name in names)
+
+
+def count_facets(rows, names=FACETS, top_k=TOP_K):
+    """Top values per facet from (hobby_id, hobby_name, type_key, tags) rows"""
+    counters = {name: Counter() for name in names}
+    hobby_names = {}
+    total = 0
+
+    for hobby_id, hobby_name, type_key, tags in rows:
+        total += 1
+        if "hobby_id" in counters:
+            counters["hobby_id"][hobby_id] += 1
+            hobby_names[hobby_id] = hobby_name
+        if "type_key" in counters:
+            counters["type_key"][type_key] += 1
+        if "tags" in counters:
+            # A tag repeated on one entry still counts that entry once
+            counters["tags"].update(set(suggest.split_tags(tags)))
+
+    facets = {}
+    for name, counter in counters.items():
+        # Ties go to the smaller value so the output is stable
+        top = heapq.nsmallest(top_k, counter.items(), key=lambda item: (-item[1], item[0]))
+        facets[name] = [
+            {"value": value, "label": hobby_names.get(value) if name == "hobby_id" else value, "count": count}
+            for value, count in top
+        ]
+    return {"total": total, "facets": facets}
@@ -0,0 +1,73 @@
+"""
+Sparse fieldsets for entry listings.
+
+A list asks for the fields it shows with fields=title,tags,... and the SELECT
+reads only those columns, so a page of long notes doesn't drag every
+content_markdown through SQLite, the ORM and the JSON encoder. Without fields=
+a list gets ENTRY_LIST_FIELDS, everything but content_markdown, which only the
+single entry endpoints return by default. fields=* asks for all of them, and
+id is returned whatever is asked for.
+
+props isn't a column, it is loaded for the page in one extra query when asked
+for, see services/props.py.
+"""
+
+# Field name -> column on entries e joined to hobbies h, in response order
+ENTRY_FIELDS = {
+    "id": "e.id",
+    "hobby_id": "e.hobby_id",
+    "type_key": "e.type_key",
+    "title": "e.title",
+    "description": "e.description",
+    "content_markdown": "e.content_markdown",
+    "tags": "e.tags",
+    "is_favorite": "e.is_favorite",
+    "is_archived": "e.is_archived",
+    "view_count": "e.view_count",
+    "created_at": "e.created_at",
+    "updated_at": "e.updated_at",
+    "hobby_name": "h.name",
+    "props": None,
+}
+ENTRY_LIST_FIELDS = tuple(name for name in ENTRY_FIELDS if name != "content_markdown")
+BOOLEAN_FIELDS = ("is_favorite", "is_archived")
+# Always read, the cursor of the next page is built from them
+KEY_FIELDS = ("id", "created_at")
+
+
+def parse_fields(value, allowed=ENTRY_FIELDS, default=ENTRY_LIST_FIELDS, required=("id",)):
+    """Field names from a comma separated query parameter, in response order
+
+    default when not asked for, ValueError on a name that isn't in allowed.
+    """
+    if not value:
+        return tuple(default)
+    names = [name.strip() for name in value.split(",") if name.strip()]
+    if names == ["*"]:
+        return tuple(allowed)
+    unknown = [name for name in names if name not in allowed]
+    if unknown:
+        raise ValueError(f"Unknown field '{unknown[0]}', expected some of {', '.join(allowed)}")
+    return tuple(name for name in allowed if name in names or name in required)
+
+
+def columns(names, always=KEY_FIELDS):
+    """The columns to select for names plus always, props left out"""
+    return [name for name in ENTRY_FIELDS if (name in names or name in always) and ENTRY_FIELDS[name]]
+
+
+def select_sql(selected):
+    """SELECT list of the columns() in selected"""
+    return ", ".join(f"{ENTRY_FIELDS[name]} AS {name}" for name in selected)
+
+
+def row_dict(selected, row, names):
+    """Response dict of names from a row of the selected columns"""
+    values = dict(zip(selected, row))
+    entry = {}
+    for name in names:
+        if name == "props":
+            continue
+        value = values[name]
+        entry[name] = bool(value) if name in BOOLEAN_FIELDS else value
+    return entry
@@ -0,0 +1,581 @@
+"""
+Full-text search over entries using the entry_fts FTS5 index, and over shelf
+items using shelf_item_fts.
+
+Only depends on the standard library so it can be shared by the SQLAlchemy
+routers and simple_main.py. Functions take a DB-API connection (sqlite3 or
+the aiosqlite adapter behind an AsyncSession) and leave committing to the caller.
+"""
+import html
+import re
+
+from services import analysis, props
+
+FTS_TABLE = "entry_fts"
+# props_text is entries' denormalized copy of its prop values, kept up to date
+# by triggers on entry_props and props_json so entry_fts can index it like the rest
+FTS_COLUMNS = ("title", "description", "content_markdown", "tags", "props_text")
+PROPS_INDEX = "idx_entry_props_value"
+SHELF_FTS_TABLE = "shelf_item_fts"
+SHELF_FTS_COLUMNS = ("title", "subtitle", "metadata_json")
+# Every FTS5 index with its content table and indexed columns
+FTS_INDEXES = (
+    (FTS_TABLE, "entries", FTS_COLUMNS),
+    (SHELF_FTS_TABLE, "shelf_items", SHELF_FTS_COLUMNS),
+)
+# Vocabulary of entry_fts and a trigram index over it, for fuzzy matching
+VOCAB_TABLE = "entry_fts_vocab"
+TERMS_TABLE = "entry_terms"
+TRIGRAM_TABLE = "entry_term_trigrams"
+
+# Prefix lengths with their own index, so "ter"* doesn't scan every term
+FTS_PREFIX_LENGTHS = (2, 3, 4)
+
+# Bump when the index definition or its triggers change, the index is then
+# recreated and rebuilt on the next startup. The analysis profile signature
+# is stored alongside it, so switching profiles does the same.
+FTS_SCHEMA_VERSION = "8"
+
+# bm25() column weights: title > tags > description > content
+BM25_WEIGHTS = {
+    "title": 10.0,
+    "description": 2.0,
+    "content_markdown": 1.0,
+    "tags": 5.0,
+    "props_text": 3.0,
+}
+SHELF_BM25_WEIGHTS = {
+    "title": 10.0,
+    "subtitle": 5.0,
+    "metadata_json": 1.0,
+}
+
+# What /api/search/ searches: entries, shelf items, or both merged by rank
+SEARCH_SCOPES = ("entries", "shelf_items", "all")
+
+# Scalar value of a prop, the expression PROPS_INDEX is built on. Values that
+# aren't valid JSON are taken as they are instead of failing the write.
+PROP_VALUE_SQL = "CASE WHEN json_valid(value_json) THEN json_extract(value_json, '$') ELSE value_json END"
+
+# Snippet window in tokens, FTS5 caps it at 64
+SNIPPET_TOKENS = 16
+SNIPPET_MAX_TOKENS = 64
+HIGHLIGHT_START = "<mark>"
+HIGHLIGHT_END = "</mark>"
+SNIPPET_ELLIPSIS = "..."
+
+# snippet() marks matches with these control characters so the text can be
+# HTML-escaped before the real markers are put in
+_MARK_START = "\x02"
+_MARK_END = "\x03"
+
+_TERM_RE = re.compile(r"\w+", re.UNICODE)
+# props.<key>:<value>, the value optionally double quoted
+_PROP_FILTER_RE = re.compile(r'props\.([\w-]+):(?:"([^"]*)"|(\S+))', re.UNICODE)
+
+
+def props_text_sql(entry_id):
+    """Text, number and string-array values of an entry's props, space separated
+
+    Reads both entry_props and entries.props_json, only the one of the
+    database's props storage mode has anything in it.
+    """
+    return f"""(
+        SELECT group_concat(value, ' ') FROM (
+            SELECT j.value, p.id AS prop, j.id AS node FROM entry_props p,
+                json_tree(CASE WHEN json_valid(p.value_json) THEN p.value_json ELSE json_quote(p.value_json) END) j
+            WHERE p.entry_id = {entry_id} AND j.type IN ('text', 'integer', 'real')
+            UNION ALL
+            SELECT j.value, 0, j.id FROM entries pe, json_tree(pe.{props.PROPS_COLUMN}) j
+            WHERE pe.id = {entry_id} AND json_valid(pe.{props.PROPS_COLUMN}) AND j.type IN ('text', 'integer', 'real')
+            ORDER BY prop, node
+        )
+    )"""
+
+
+def create_statements():
+    """DDL for the FTS tables and the triggers that keep them in sync"""
+    profile = analysis.get_profile()
+    columns = ", ".join(FTS_COLUMNS)
+    new_values = ", ".join(profile.fold_sql(f"new.{column}") for column in FTS_COLUMNS)
+    old_values = ", ".join(profile.fold_sql(f"old.{column}") for column in FTS_COLUMNS)
+    shelf_columns = ", ".join(SHELF_FTS_COLUMNS)
+    shelf_new_values = ", ".join(profile.fold_sql(f"new.{column}") for column in SHELF_FTS_COLUMNS)
+    shelf_old_values = ", ".join(profile.fold_sql(f"old.{column}") for column in SHELF_FTS_COLUMNS)
+
+    return [
+        f"""
+        CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5(
+            {columns},
+            content=entries,
+            content_rowid=id,
+            tokenize='{profile.tokenizer}',
+            prefix='{" ".join(str(length) for length in FTS_PREFIX_LENGTHS)}'
+        )
+        """,
+        # External content tables must be told which values to remove, so
+        # deletes go through the special 'delete' command with the old row
+        f"""
+        CREATE TRIGGER entry_fts_insert AFTER INSERT ON entries BEGIN
+            INSERT INTO {FTS_TABLE}(rowid, {columns})
+            VALUES (new.id, {new_values});
+        END
+        """,
+        f"""
+        CREATE TRIGGER entry_fts_delete AFTER DELETE ON entries BEGIN
+            INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, {columns})
+            VALUES ('delete', old.id, {old_values});
+        END
+        """,
+        # Only indexed columns re-tokenize the row, view_count bumps don't
+        f"""
+        CREATE TRIGGER entry_fts_update AFTER UPDATE OF {columns} ON entries BEGIN
+            INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, {columns})
+            VALUES ('delete', old.id, {old_values});
+            INSERT INTO {FTS_TABLE}(rowid, {columns})
+            VALUES (new.id, {new_values});
+        END
+        """,
+        f"""
+        CREATE TRIGGER entry_props_fts_insert AFTER INSERT ON entry_props BEGIN
+            UPDATE entries SET props_text = {props_text_sql("new.entry_id")} WHERE id = new.entry_id;
+        END
+        """,
+        f"""
+        CREATE TRIGGER entry_props_fts_update AFTER UPDATE ON entry_props BEGIN
+            UPDATE entries SET props_text = {props_text_sql("entries.id")}
+            WHERE id IN (old.entry_id, new.entry_id);
+        END
+        """,
+        f"""
+        CREATE TRIGGER entry_props_fts_delete AFTER DELETE ON entry_props BEGIN
+            UPDATE entries SET props_text = {props_text_sql("old.entry_id")} WHERE id = old.entry_id;
+        END
+        """,
+        # props stored as one document, see services/props.py
+        f"""
+        CREATE TRIGGER entry_props_json_fts AFTER UPDATE OF {props.PROPS_COLUMN} ON entries BEGIN
+            UPDATE entries SET props_text = {props_text_sql("new.id")} WHERE id = new.id;
+        END
+        """,
+        f"CREATE INDEX {PROPS_INDEX} ON entry_props(key, ({PROP_VALUE_SQL}) COLLATE NOCASE)",
+        f"CREATE VIRTUAL TABLE {VOCAB_TABLE} USING fts5vocab({FTS_TABLE}, 'row')",
+        f"CREATE TABLE {TERMS_TABLE} (term TEXT PRIMARY KEY)",
+        f"""
+        CREATE VIRTUAL TABLE {TRIGRAM_TABLE} USING fts5(
+            term,
+            content={TERMS_TABLE},
+            tokenize='trigram'
+        )
+        """,
+        f"""
+        CREATE TRIGGER entry_terms_insert AFTER INSERT ON {TERMS_TABLE} BEGIN
+            INSERT INTO {TRIGRAM_TABLE}(rowid, term) VALUES (new.rowid, new.term);
+        END
+        """,
+        f"""
+        CREATE TRIGGER entry_terms_delete AFTER DELETE ON {TERMS_TABLE} BEGIN
+            INSERT INTO {TRIGRAM_TABLE}({TRIGRAM_TABLE}, rowid, term)
+            VALUES ('delete', old.rowid, old.term);
+        END
+        """,
+        # metadata_json is indexed as stored, its keys tokenize like any
+        # other word and only weigh as much as content_markdown does
+        f"""
+        CREATE VIRTUAL TABLE {SHELF_FTS_TABLE} USING fts5(
+            {shelf_columns},
+            content=shelf_items,
+            content_rowid=id,
+            tokenize='{profile.tokenizer}',
+            prefix='{" ".join(str(length) for length in FTS_PREFIX_LENGTHS)}'
+        )
+        """,
+        f"""
+        CREATE TRIGGER shelf_item_fts_insert AFTER INSERT ON shelf_items BEGIN
+            INSERT INTO {SHELF_FTS_TABLE}(rowid, {shelf_columns})
+            VALUES (new.id, {shelf_new_values});
+        END
+        """,
+        f"""
+        CREATE TRIGGER shelf_item_fts_delete AFTER DELETE ON shelf_items BEGIN
+            INSERT INTO {SHELF_FTS_TABLE}({SHELF_FTS_TABLE}, rowid, {shelf_columns})
+            VALUES ('delete', old.id, {shelf_old_values});
+        END
+        """,
+        f"""
+        CREATE TRIGGER shelf_item_fts_update AFTER UPDATE OF {shelf_columns} ON shelf_items BEGIN
+            INSERT INTO {SHELF_FTS_TABLE}({SHELF_FTS_TABLE}, rowid, {shelf_columns})
+            VALUES ('delete', old.id, {shelf_old_values});
+            INSERT INTO {SHELF_FTS_TABLE}(rowid, {shelf_columns})
+            VALUES (new.id, {shelf_new_values});
+        END
+        """,
+    ]
+
+
+def drop_statements():
+    return [
+        "DROP TRIGGER IF EXISTS entry_fts_insert",
+        "DROP TRIGGER IF EXISTS entry_fts_update",
+        "DROP TRIGGER IF EXISTS entry_fts_delete",
+        "DROP TRIGGER IF EXISTS entry_props_fts_insert",
+        "DROP TRIGGER IF EXISTS entry_props_fts_update",
+        "DROP TRIGGER IF EXISTS entry_props_fts_delete",
+        "DROP TRIGGER IF EXISTS entry_props_json_fts",
+        f"DROP INDEX IF EXISTS {PROPS_INDEX}",
+        "DROP TRIGGER IF EXISTS entry_terms_insert",
+        "DROP TRIGGER IF EXISTS entry_terms_delete",
+        f"DROP TABLE IF EXISTS {TRIGRAM_TABLE}",
+        f"DROP TABLE IF EXISTS {TERMS_TABLE}",
+        f"DROP TABLE IF EXISTS {VOCAB_TABLE}",
+        f"DROP TABLE IF EXISTS {FTS_TABLE}",
+        "DROP TRIGGER IF EXISTS shelf_item_fts_insert",
+        "DROP TRIGGER IF EXISTS shelf_item_fts_update",
+        "DROP TRIGGER IF EXISTS shelf_item_fts_delete",
+        f"DROP TABLE IF EXISTS {SHELF_FTS_TABLE}",
+    ]
+
+
+def schema_signature():
+    return f"{FTS_SCHEMA_VERSION}:{analysis.get_profile().signature}"
+
+
+def ensure_fts_schema(conn, force=False):
+    """Create or upgrade the FTS index, returns True if it was (re)built"""
+    cursor = conn.cursor()
+
+    cursor.execute("SELECT value FROM app_settings WHERE key = 'fts_schema'")
+    row = cursor.fetchone()
+    cursor.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", [FTS_TABLE]
+    )
+    exists = cursor.fetchone() is not None
+
+    signature = schema_signature()
+    if not force and exists and row and row[0] == signature:
+        return False
+
+    for statement in drop_statements():
+        cursor.execute(statement)
+    cursor.execute("PRAGMA table_info(entries)")
+    if "props_text" not in [column[1] for column in cursor.fetchall()]:
+        cursor.execute("ALTER TABLE entries ADD COLUMN props_text TEXT")
+    props.ensure_schema(conn)
+    # Refreshed while the triggers are gone, they'd try to remove rows the
+    # new index doesn't have yet
+    cursor.execute(f"UPDATE entries SET props_text = {props_text_sql('entries.id')}")
+    for statement in create_statements():
+        cursor.execute(statement)
+    reindex(conn)
+    cursor.execute(
+        "INSERT OR REPLACE INTO app_settings (key, value, updated_at) "
+        "VALUES ('fts_schema', ?, CURRENT_TIMESTAMP)",
+        [signature],
+    )
+    return True
+
+
+def reindex(conn):
+    """Repopulate the FTS indexes from their tables through the profile's folding
+
+    FTS5's own 'rebuild' reads the content table unfolded, so it can't be
+    used once a profile folds text. Returns the number of entries indexed.
+    """
+    profile = analysis.get_profile()
+    cursor = conn.cursor()
+    indexed = {}
+    for table, content, fts_columns in FTS_INDEXES:
+        columns = ", ".join(fts_columns)
+        values = ", ".join(profile.fold_sql(column) for column in fts_columns)
+        cursor.execute(f"INSERT INTO {table}({table}) VALUES ('delete-all')")
+        cursor.execute(f"""
+            INSERT INTO {table}(rowid, {columns})
+            SELECT id, {values} FROM {content}
+        """)
+        indexed[table] = cursor.rowcount
+    refresh_vocabulary(conn)
+    return indexed[FTS_TABLE]
+
+
+def refresh_vocabulary(conn):
+    """Sync entry_terms with the terms currently in entry_fts
+
+    The vocabulary only grows through this call, terms written since the last
+    refresh still match exactly, they just aren't fuzzy candidates yet.
+    """
+    cursor = conn.cursor()
+    cursor.execute(f"""
+        INSERT INTO {TERMS_TABLE}(term)
+        SELECT term FROM {VOCAB_TABLE}
+        WHERE term NOT IN (SELECT term FROM {TERMS_TABLE})
+    """)
+    added = cursor.rowcount
+    cursor.execute(f"""
+        DELETE FROM {TERMS_TABLE}
+        WHERE term NOT IN (SELECT term FROM {VOCAB_TABLE})
+    """)
+    return added, cursor.rowcount
+
+
+def query_terms(q):
+    """Free text terms of q, props filters left out"""
+    return _TERM_RE.findall(_PROP_FILTER_RE.sub(" ", q or ""))
+
+
+def prop_filters(q):
+    """(key, value) pairs of the props.<key>:<value> filters in q
+
+    Numbers and booleans are converted so they compare equal to JSON values.
+    """
+    filters = []
+    for key, quoted, bare in _PROP_FILTER_RE.findall(q or ""):
+        value = quoted if quoted else bare
+        if not quoted:
+            if value.lower() in ("true", "false"):
+                value = int(value.lower() == "true")
+            else:
+                for number in (int, float):
+                    try:
+                        value = number(value)
+                        break
+                    except ValueError:
+                        pass
+        filters.append((key, value))
+    return filters
+
+
+def build_match_expression(q):
+    """Turn free text into a safe FTS5 MATCH expression
+
+    Every term is quoted so user input can't inject FTS5 syntax, terms are
+    ANDed and the last one is a prefix match for search-as-you-type. Terms go
+    through the analysis profile, a stemmed term becomes a prefix match too.
+    """
+    terms = query_terms(q)
+    if not terms:
+        return None
+
+    profile = analysis.get_profile()
+    return " ".join(
+        profile.match_term(term, prefix=position == len(terms) - 1)
+        for position, term in enumerate(terms)
+    )
+
+
+def cache_key(q, *options):
+    """Result cache key, queries that analyse to the same terms share it"""
+    profile = analysis.get_profile()
+    terms = tuple(profile.normalize(term) for term in query_terms(q))
+    return (terms, tuple(prop_filters(q))) + options
+
+
+def bm25_expression(table=FTS_TABLE, columns=FTS_COLUMNS, weights=BM25_WEIGHTS):
+    weights = ", ".join(str(weights[column]) for column in columns)
+    return f"bm25({table}, {weights})"
+
+
+def snippet_expression(table=FTS_TABLE):
+    """snippet() over the best matching column (-1), sized by :snippet_tokens"""
+    return (
+        f"snippet({table}, -1, :mark_start, :mark_end, :ellipsis, :snippet_tokens)"
+    )
+
+
+def render_snippet(raw, start=HIGHLIGHT_START, end=HIGHLIGHT_END):
+    """Escape a raw snippet() result and swap in the highlight markers"""
+    if not raw:
+        return None
+    escaped = html.escape(raw, quote=False)
+    return escaped.replace(_MARK_START, start).replace(_MARK_END, end)
+
+
+def build_search_query(q, hobby_id=None, type_key=None, limit=50, offset=0,
+                       snippet_tokens=SNIPPET_TOKENS, match=None):
+    """Build the ranked search SQL and its named parameters
+
+    Returns None when the query has nothing searchable. `rank` is the negated
+    bm25 score, so higher means more relevant, and `snippet` still carries the
+    internal markers, pass it through render_snippet(). A prebuilt MATCH
+    expression, e.g. from fuzzy.expand_query(), replaces the one built from q.
+    A query made only of props filters skips the FTS index, newest first.
+    """
+    if match is None:
+        match = build_match_expression(q)
+    filters = prop_filters(q)
+    if match is None and not filters:
+        return None
+
+    where, params = _match_filters(match, hobby_id, type_key, filters)
+    params.update({"limit": limit, "offset": offset})
+    if match is None:
+        sql = f"""
+        SELECT e.id, e.title, e.hobby_id, e.type_key, e.created_at,
+               h.name AS hobby_name, 0.0 AS rank, NULL AS snippet
+        {where}
+        ORDER BY e.created_at DESC LIMIT :limit OFFSET :offset
+        """
+        return sql, params
+
+    sql = f"""
+    SELECT e.id, e.title, e.hobby_id, e.type_key, e.created_at,
+           h.name AS hobby_name, -{bm25_expression()} AS rank,
+           {snippet_expression()} AS snippet
+    {where}
+    ORDER BY rank DESC, e.created_at DESC LIMIT :limit OFFSET :offset
+    """
+    params.update(_snippet_params(snippet_tokens))
+    return sql, params
+
+
+def build_unified_search_query(q, hobby_id=None, type_key=None, limit=50, offset=0,
+                               snippet_tokens=SNIPPET_TOKENS, match=None, scope="all"):
+    """Ranked search SQL over entries and shelf items, merged into one list
+
+    Rows carry a `kind` of 'entry' or 'shelf_item' and the columns of both,
+    NULL where they don't apply. Both indexes score with bm25 on the same
+    folding and are merged on that rank as is. Type and props filters are
+    about entries, so they leave shelf items out, and a shelf item without a
+    title of its own shows its linked entry's. Returns None like
+    build_search_query() when there's nothing to search.
+    """
+    if match is None:
+        match = build_match_expression(q)
+    filters = prop_filters(q)
+    if match is None and not filters:
+        return None
+
+    arms = []
+    params = {"limit": limit, "offset": offset}
+    if scope in ("entries", "all"):
+        where, entry_params = _match_filters(match, hobby_id, type_key, filters)
+        params.update(entry_params)
+        rank = f"-{bm25_expression()}" if match is not None else "0.0"
+        snippet = snippet_expression() if match is not None else "NULL"
+        arms.append(f"""
+        SELECT 'entry' AS kind, e.id, e.title, NULL AS subtitle, e.hobby_id,
+               h.name AS hobby_name, e.type_key, NULL AS shelf_id, NULL AS shelf_name,
+               e.id AS entry_id, e.created_at, {rank} AS rank, {snippet} AS snippet
+        {where}
+        """)
+    if scope in ("shelf_items", "all") and match is not None and not type_key and not filters:
+        arms.append(f"""
+        SELECT 'shelf_item' AS kind, si.id, COALESCE(si.title, le.title) AS title, si.subtitle,
+               s.hobby_id, h.name AS hobby_name, NULL AS type_key, si.shelf_id, s.name AS shelf_name,
+               si.entry_id, si.added_at AS created_at,
+               -{bm25_expression(SHELF_FTS_TABLE, SHELF_FTS_COLUMNS, SHELF_BM25_WEIGHTS)} AS rank,
+               {snippet_expression(SHELF_FTS_TABLE)} AS snippet
+        FROM {SHELF_FTS_TABLE}
+        JOIN shelf_items si ON si.id = {SHELF_FTS_TABLE}.rowid
+        JOIN shelves s ON s.id = si.shelf_id
+        JOIN hobbies h ON h.id = s.hobby_id
+        LEFT JOIN entries le ON le.id = si.entry_id
+        WHERE {SHELF_FTS_TABLE} MATCH :match
+        {"AND s.hobby_id = :hobby_id" if hobby_id else ""}
+        """)
+        params["match"] = match
+        if hobby_id:
+            params["hobby_id"] = hobby_id
+    if not arms:
+        return None
+
+    if match is not None:
+        params.update(_snippet_params(snippet_tokens))
+    sql = f"""
+    SELECT * FROM ({" UNION ALL ".join(arms)})
+    ORDER BY rank DESC, created_at DESC LIMIT :limit OFFSET :offset
+    """
+    return sql, params
+
+
+def _snippet_params(snippet_tokens):
+    return {
+        "mark_start": _MARK_START,
+        "mark_end": _MARK_END,
+        "ellipsis": SNIPPET_ELLIPSIS,
+        "snippet_tokens": max(1, min(snippet_tokens, SNIPPET_MAX_TOKENS)),
+    }
+
+
+def build_facet_query(q, hobby_id=None, type_key=None, match=None):
+    """SQL returning hobby, type and tags of every entry in the match set
+
+    Same match and filters as build_search_query() without the ranking, so
+    the index is walked once and facets are counted while streaming the rows.
+    """
+    if match is None:
+        match = build_match_expression(q)
+    filters = prop_filters(q)
+    if match is None and not filters:
+        return None
+
+    where, params = _match_filters(match, hobby_id, type_key, filters)
+    return f"SELECT e.hobby_id, h.name AS hobby_name, e.type_key, e.tags {where}", params
+
+
+def _match_filters(match, hobby_id=None, type_key=None, filters=()):
+    """FROM/WHERE clause shared by the search and facet queries"""
+    if match is None:
+        sql = """
+        FROM entries e
+        JOIN hobbies h ON h.id = e.hobby_id
+        WHERE e.is_archived = 0
+        """
+        params = {}
+    else:
+        sql = f"""
+        FROM {FTS_TABLE}
+        JOIN entries e ON e.id = {FTS_TABLE}.rowid
+        JOIN hobbies h ON h.id = e.hobby_id
+        WHERE {FTS_TABLE} MATCH :match
+        AND e.is_archived = 0
+        """
+        params = {"match": match}
+
+    # Each filter is a lookup on PROPS_INDEX, the expression has to match it.
+    # Props stored as a document are checked on the rows the rest selected.
+    for position, (key, value) in enumerate(filters):
+        if props.storage == "json":
+            sql += f"""
+        AND json_extract(e.{props.PROPS_COLUMN}, :prop_key_{position}) = :prop_value_{position} COLLATE NOCASE"""
+            params[f"prop_key_{position}"] = f'$."{key}"'
+        else:
+            sql += f"""
+        AND e.id IN (
+            SELECT entry_id FROM entry_props
+            WHERE key = :prop_key_{position} AND ({PROP_VALUE_SQL}) = :prop_value_{position} COLLATE NOCASE
+        )"""
+            params[f"prop_key_{position}"] = key
+        params[f"prop_value_{position}"] = value
+
+    if hobby_id:
+        sql += " AND e.hobby_id = :hobby_id"
+        params["hobby_id"] = hobby_id
+    if type_key:
+        sql += " AND e.type_key = :type_key"
+        params["type_key"] = type_key
+    return sql, params
+
+
+def build_title_prefix_query(q, limit=10, scan_limit=200):
+    """Entries whose title has words starting with the typed terms
+
+    Only the first scan_limit matches are ranked by view_count so a short
+    prefix stays cheap on a large index.
+    """
+    match = build_match_expression(q)
+    if match is None:
+        return None
+
+    sql = f"""
+    SELECT e.id, e.title, e.view_count
+    FROM entries e
+    WHERE e.id IN (
+        SELECT rowid FROM {FTS_TABLE}
+        WHERE {FTS_TABLE} MATCH :match
+        LIMIT :scan_limit
+    )
+    AND e.is_archived = 0
+    ORDER BY e.view_count DESC
+    LIMIT :limit
+    """
+    return sql, {"match": f"title : ({match})", "limit": limit, "scan_limit": scan_limit}
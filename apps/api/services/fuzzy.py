@@ -0,0 +1,152 @@
+"""
+Typo-tolerant query expansion.
+
+Each query term is widened to the indexed terms that share trigrams with it,
+looked up in the trigram index over the entry_fts vocabulary, and those
+candidates are re-ranked by edit distance before they go into MATCH.
+"""
+from services import analysis, fts
+
+# Trigram candidates fetched per term before edit distance filtering
+CANDIDATE_LIMIT = 50
+# Alternatives kept per term after re-ranking
+EXPANSIONS_PER_TERM = 5
+
+
+def max_edits(term):
+    """Allowed edit distance, short terms get less slack"""
+    if len(term) <= 3:
+        return 0
+    if len(term) <= 5:
+        return 1
+    return 2
+
+
+def edit_distance(a, b, limit=None):
+    """Levenshtein distance counting adjacent transpositions as one edit
+
+    Stops early once every alignment exceeds limit.
+    """
+    if a == b:
+        return 0
+    if limit is not None and abs(len(a) - len(b)) > limit:
+        return limit + 1
+
+    before_previous = None
+    previous = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        current = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = a[i - 1] != b[j - 1]
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if (before_previous is not None and j > 1
+                    and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]):
+                current[j] = min(current[j], before_previous[j - 2] + 1)
+        if limit is not None and min(current) > limit:
+            return limit + 1
+        before_previous, previous = previous, current
+    return previous[-1]
+
+
+def trigrams(term):
+    return sorted({term[i:i + 3] for i in range(len(term) - 2)})
+
+
+def term_candidates(cursor, term, limit=CANDIDATE_LIMIT):
+    """Indexed terms that could be near misspellings of term, with doc counts
+
+    Terms sharing trigrams come from the trigram index. A typo in the middle
+    of a short word can break all of its trigrams, so terms sharing the first
+    two letters are added from a range scan of the entry_terms primary key.
+    """
+    candidates = {}
+
+    grams = trigrams(term)
+    if grams:
+        cursor.execute(f"""
+            SELECT t.term, v.doc
+            FROM {fts.TRIGRAM_TABLE} g
+            JOIN {fts.TERMS_TABLE} t ON t.rowid = g.rowid
+            JOIN {fts.VOCAB_TABLE} v ON v.term = t.term
+            WHERE {fts.TRIGRAM_TABLE} MATCH ?
+            ORDER BY g.rank
+            LIMIT ?
+        """, [" OR ".join(f'"{gram}"' for gram in grams), limit])
+        candidates.update(cursor.fetchall())
+
+    head = term[:2]
+    cursor.execute(f"""
+        SELECT t.term, v.doc
+        FROM {fts.TERMS_TABLE} t
+        JOIN {fts.VOCAB_TABLE} v ON v.term = t.term
+        WHERE t.term >= ? AND t.term < ?
+        AND length(t.term) BETWEEN ? AND ?
+        LIMIT ?
+    """, [head, head + "\uffff", len(term) - 2, len(term) + 2, limit])
+    candidates.update(cursor.fetchall())
+
+    return list(candidates.items())
+
+
+def stem_terms(conn, terms):
+    """Run terms through the index tokenizer, since the vocabulary holds stems
+
+    Uses a connection-local temp FTS table and reads the tokens back through
+    fts5vocab, terms the tokenizer splits keep their first token.
+    """
+    cursor = conn.cursor()
+    # Named after the tokenizer so a profile switch gets a fresh table
+    table = "fuzzy_terms_" + "".join(char for char in analysis.get_profile().tokenizer if char.isalnum())
+    cursor.execute(
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS temp.{table} "
+        f"USING fts5(term, tokenize='{analysis.get_profile().tokenizer}')"
+    )
+    cursor.execute(
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS temp.{table}_vocab "
+        f"USING fts5vocab(temp, {table}, 'instance')"
+    )
+    cursor.execute(f"DELETE FROM temp.{table}")
+    for position, term in enumerate(terms, 1):
+        cursor.execute(f"INSERT INTO temp.{table}(rowid, term) VALUES (?, ?)", [position, term])
+    cursor.execute(f"SELECT doc, term FROM temp.{table}_vocab ORDER BY doc, offset DESC")
+    stems = dict(cursor.fetchall())
+    cursor.execute(f"DELETE FROM temp.{table}")
+    return [stems.get(position, term) for position, term in enumerate(terms, 1)]
+
+
+def expand_term(cursor, term, stem=None):
+    """Closest indexed spellings of term, best first"""
+    allowed = max_edits(term)
+    if not allowed:
+        return []
+
+    ranked = []
+    for candidate, doc_count in term_candidates(cursor, stem or term):
+        distance = edit_distance(term, candidate, allowed)
+        if stem and stem != term:
+            distance = min(distance, edit_distance(stem, candidate, allowed))
+        if 0 < distance <= allowed:
+            ranked.append((distance, -doc_count, candidate))
+    ranked.sort()
+    return [candidate for _, _, candidate in ranked[:EXPANSIONS_PER_TERM]]
+
+
+def expand_query(conn, q):
+    """MATCH expression where every term also matches its near misspellings
+
+    Reads the vocabulary as IndexMaintenance last refreshed it, terms
+    written since then match exactly but aren't expanded yet.
+    """
+    profile = analysis.get_profile()
+    terms = [profile.fold(term).casefold() for term in fts.query_terms(q)]
+    if not terms:
+        return None
+
+    cursor = conn.cursor()
+    groups = []
+    for position, (term, stem) in enumerate(zip(terms, stem_terms(conn, terms))):
+        # Keep the typed term itself, as a prefix when it's the last one
+        alternatives = [f'"{term}"*' if position == len(terms) - 1 else f'"{term}"']
+        alternatives += [f'"{candidate}"' for candidate in expand_term(cursor, term, stem)]
+        groups.append("(" + " OR ".join(alternatives) + ")")
+    return " AND ".join(groups)
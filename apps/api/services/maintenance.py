@@ -0,0 +1,321 @@
+"""
+Maintenance of the entry_fts and shelf_item_fts indexes.
+
+The sync triggers write entry_fts one row at a time, and every write adds a
+small segment. FTS5 merges some of them as it goes (automerge), the rest is
+left to IndexMaintenance, which runs 'merge' in small steps and 'optimize'
+while the API is idle. It also keeps the fuzzy search vocabulary in step
+with entry_fts, so searches never scan fts5vocab themselves. Rebuild and
+integrity-check are here too, for the admin endpoints and
+scripts/search_index.py.
+"""
+import asyncio
+import sqlite3
+import time
+
+from services import analysis, cache, fts
+
+# Segments of one level FTS5 merges on its own while writing, and the count
+# at which it merges no matter what. Higher than the defaults (4 and 16) so
+# the write path does less and idle maintenance the rest.
+AUTOMERGE = 8
+CRISISMERGE = 24
+# Level size 'merge' works on
+USERMERGE = 4
+
+# Seconds without requests before merging starts, and before a full optimize
+IDLE_SECONDS = 30
+OPTIMIZE_IDLE_SECONDS = 300
+# Seconds between idle checks
+CHECK_INTERVAL = 10
+# Seconds a changed vocabulary waits for idle time before it's refreshed anyway
+VOCABULARY_MAX_AGE = 300
+# Leaf pages written per merge step, small so a returning request waits little
+MERGE_PAGES = 64
+
+_STRUCTURE_ROWID = 10
+_STRUCTURE_V2 = b"\xff\x00\x00\x01"
+
+
+def _command(cursor, command, rank=None, table=fts.FTS_TABLE):
+    if rank is None:
+        cursor.execute(f"INSERT INTO {table}({table}) VALUES (?)", [command])
+    else:
+        cursor.execute(
+            f"INSERT INTO {table}({table}, rank) VALUES (?, ?)", [command, rank]
+        )
+
+
+def configure(conn):
+    """Store the merge settings in each index's _config table, safe to repeat"""
+    cursor = conn.cursor()
+    for table, _, _ in fts.FTS_INDEXES:
+        _command(cursor, "automerge", AUTOMERGE, table)
+        _command(cursor, "crisismerge", CRISISMERGE, table)
+        _command(cursor, "usermerge", USERMERGE, table)
+
+
+def _varint(data, offset):
+    """SQLite varint at offset, returns (value, next offset)"""
+    value = 0
+    for i in range(8):
+        byte = data[offset + i]
+        value = (value << 7) | (byte & 0x7F)
+        if not byte & 0x80:
+            return value, offset + i + 1
+    return (value << 8) | data[offset + 8], offset + 9
+
+
+def parse_structure(data):
+    """Segment counts per level from the FTS5 structure record"""
+    offset = 0
+    v2 = data[:4] == _STRUCTURE_V2
+    if v2:
+        offset += 4
+    offset += 4  # configuration cookie
+    level_count, offset = _varint(data, offset)
+    segment_count, offset = _varint(data, offset)
+    write_counter, offset = _varint(data, offset)
+
+    levels = []
+    for _ in range(level_count):
+        merging, offset = _varint(data, offset)
+        total, offset = _varint(data, offset)
+        pages = 0
+        for _ in range(total):
+            _, offset = _varint(data, offset)  # segment id
+            first, offset = _varint(data, offset)
+            last, offset = _varint(data, offset)
+            pages += last - first + 1
+            if v2:
+                for _ in range(5):  # origins, tombstone and entry counts
+                    _, offset = _varint(data, offset)
+        levels.append({"segments": total, "merging": merging, "leaf_pages": pages})
+
+    return {"segments": segment_count, "write_counter": write_counter, "levels": levels}
+
+
+def segment_stats(conn, table=fts.FTS_TABLE):
+    cursor = conn.cursor()
+    cursor.execute(f"SELECT block FROM {table}_data WHERE id = ?", [_STRUCTURE_ROWID])
+    row = cursor.fetchone()
+    stats = parse_structure(bytes(row[0])) if row else {"segments": 0, "write_counter": 0, "levels": []}
+
+    cursor.execute(f"SELECT COUNT(*), COALESCE(SUM(length(block)), 0) FROM {table}_data")
+    stats["data_rows"], stats["data_bytes"] = cursor.fetchone()
+    cursor.execute(f"SELECT k, v FROM {table}_config WHERE k != 'version'")
+    stats["config"] = dict(cursor.fetchall())
+    if table == fts.FTS_TABLE:
+        stats["shelf_items"] = segment_stats(conn, fts.SHELF_FTS_TABLE)
+    return stats
+
+
+def merge_step(conn, pages=MERGE_PAGES):
+    """Run one incremental merge per index, returns False once there's nothing left to merge"""
+    cursor = conn.cursor()
+    more = False
+    for table, _, _ in fts.FTS_INDEXES:
+        cursor.execute("SELECT total_changes()")
+        before = cursor.fetchone()[0]
+        _command(cursor, "merge", pages, table)
+        cursor.execute("SELECT total_changes()")
+        # FTS5 documents a change count below 2 as "no work was done"
+        more = cursor.fetchone()[0] - before >= 2 or more
+    return more
+
+
+def optimize(conn):
+    cursor = conn.cursor()
+    for table, _, _ in fts.FTS_INDEXES:
+        _command(cursor, "optimize", table=table)
+    return segment_stats(conn)
+
+
+def rebuild(conn):
+    """Recreate the index, triggers and props_text from scratch"""
+    started = time.perf_counter()
+    fts.ensure_fts_schema(conn, force=True)
+    configure(conn)
+    cursor = conn.cursor()
+    cursor.execute(f"SELECT COUNT(*) FROM {fts.FTS_TABLE}_docsize")
+    entries = cursor.fetchone()[0]
+    cursor.execute(f"SELECT COUNT(*) FROM {fts.SHELF_FTS_TABLE}_docsize")
+    return {
+        "entries": entries,
+        "shelf_items": cursor.fetchone()[0],
+        "seconds": round(time.perf_counter() - started, 3),
+    }
+
+
+def integrity_check(conn):
+    """Check each index's structure, then that it matches its table
+
+    FTS5's own content check re-tokenizes rows as stored, which is wrong
+    once the profile folds text, so those profiles compare term statistics
+    against a temp index built from the folded text instead.
+    """
+    cursor = conn.cursor()
+    errors = []
+    profile = analysis.get_profile()
+
+    for table, content, fts_columns in fts.FTS_INDEXES:
+        try:
+            _command(cursor, "integrity-check", 0, table)
+        except sqlite3.DatabaseError as e:
+            errors.append(f"{table} structure: {e}")
+            continue
+
+        if not profile.fold_map:
+            try:
+                _command(cursor, "integrity-check", 1, table)
+            except sqlite3.DatabaseError as e:
+                errors.append(f"{table} content: {e}")
+            continue
+
+        errors += _compare_folded(cursor, profile, table, content, fts_columns)
+    return {"ok": not errors, "errors": errors}
+
+
+def _compare_folded(cursor, profile, table, content, fts_columns):
+    columns = ", ".join(fts_columns)
+    values = ", ".join(profile.fold_sql(column) for column in fts_columns)
+    cursor.execute("DROP TABLE IF EXISTS temp.fts_check_vocab")
+    cursor.execute("DROP TABLE IF EXISTS temp.fts_check_index_vocab")
+    cursor.execute("DROP TABLE IF EXISTS temp.fts_check")
+    cursor.execute(f"CREATE VIRTUAL TABLE temp.fts_check USING fts5({columns}, tokenize='{profile.tokenizer}')")
+    cursor.execute("CREATE VIRTUAL TABLE temp.fts_check_vocab USING fts5vocab(temp, fts_check, 'row')")
+    cursor.execute(f"CREATE VIRTUAL TABLE temp.fts_check_index_vocab USING fts5vocab(main, {table}, 'row')")
+    try:
+        cursor.execute(f"INSERT INTO temp.fts_check(rowid, {columns}) SELECT id, {values} FROM {content}")
+        cursor.execute("""
+            SELECT term FROM (
+                SELECT term, doc, cnt FROM temp.fts_check_index_vocab
+                EXCEPT SELECT term, doc, cnt FROM temp.fts_check_vocab
+            )
+            UNION
+            SELECT term FROM (
+                SELECT term, doc, cnt FROM temp.fts_check_vocab
+                EXCEPT SELECT term, doc, cnt FROM temp.fts_check_index_vocab
+            )
+            LIMIT 20
+        """)
+        return [f"{table} content: term '{term}' differs from {content}" for (term,) in cursor.fetchall()]
+    finally:
+        cursor.execute("DROP TABLE temp.fts_check_index_vocab")
+        cursor.execute("DROP TABLE temp.fts_check_vocab")
+        cursor.execute("DROP TABLE temp.fts_check")
+
+
+class IndexMaintenance:
+    """Merges and optimizes the FTS indexes while the API is idle
+
+    runner is an async callable running fn(conn) in a transaction, like
+    database.run_raw, and on_write is called after each write it commits.
+    Requests call touch() so work stops when traffic comes back, and nothing
+    runs unless entries or shelf items changed since the last pass.
+    """
+
+    def __init__(self, runner, on_write=None):
+        self.runner = runner
+        self.on_write = on_write
+        self.last_activity = time.monotonic()
+        self._task = None
+        self._merged_generation = None
+        self._optimized_generation = None
+        self._vocabulary_generation = None
+        self.merge_steps = 0
+        self.optimizations = 0
+        self.vocabulary_refreshes = 0
+        self.last_merge_at = None
+        self.last_optimize_at = None
+        self.last_vocabulary_at = None
+        self.last_error = None
+
+    def touch(self):
+        self.last_activity = time.monotonic()
+
+    def idle_for(self):
+        return time.monotonic() - self.last_activity
+
+    async def start(self):
+        await self.runner(configure)
+        self._written()
+        self._task = asyncio.create_task(self._loop())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def _written(self):
+        if self.on_write is not None:
+            self.on_write()
+
+    async def _loop(self):
+        while True:
+            await asyncio.sleep(CHECK_INTERVAL)
+            try:
+                await self.run_idle()
+            except Exception as e:
+                self.last_error = str(e)
+
+    async def refresh_vocabulary(self):
+        """Sync the fuzzy search vocabulary once entries changed
+
+        Waits for idle time, or VOCABULARY_MAX_AGE when traffic never stops,
+        so new terms become fuzzy candidates without a search paying the scan.
+        """
+        generation = cache.write_generations.get("entries")
+        if generation == self._vocabulary_generation:
+            return
+        due = self.last_vocabulary_at is None or time.time() - self.last_vocabulary_at >= VOCABULARY_MAX_AGE
+        if not due and self.idle_for() < IDLE_SECONDS:
+            return
+        await self.runner(fts.refresh_vocabulary)
+        self._vocabulary_generation = generation
+        self.vocabulary_refreshes += 1
+        self.last_vocabulary_at = time.time()
+        self._written()
+
+    async def run_idle(self):
+        """One maintenance pass, does nothing unless idle and the index changed"""
+        await self.refresh_vocabulary()
+        generation = (cache.write_generations.get("entries"), cache.write_generations.get("shelf_items"))
+
+        if self.idle_for() >= IDLE_SECONDS and generation != self._merged_generation:
+            while self.idle_for() >= IDLE_SECONDS:
+                more = await self.runner(merge_step)
+                self.merge_steps += 1
+                if not more:
+                    self._merged_generation = generation
+                    break
+                # Let waiting requests in between steps
+                await asyncio.sleep(0)
+            self.last_merge_at = time.time()
+            self._written()
+
+        if self.idle_for() >= OPTIMIZE_IDLE_SECONDS and generation != self._optimized_generation:
+            stats = await self.runner(segment_stats)
+            if stats["segments"] > 1 or stats["shelf_items"]["segments"] > 1:
+                await self.runner(optimize)
+                self.optimizations += 1
+                self.last_optimize_at = time.time()
+                self._written()
+            self._optimized_generation = generation
+
+    def status(self):
+        return {
+            "running": self._task is not None and not self._task.done(),
+            "idle_seconds": round(self.idle_for(), 1),
+            "merge_steps": self.merge_steps,
+            "optimizations": self.optimizations,
+            "vocabulary_refreshes": self.vocabulary_refreshes,
+            "last_merge_at": self.last_merge_at,
+            "last_optimize_at": self.last_optimize_at,
+            "last_vocabulary_at": self.last_vocabulary_at,
+            "last_error": self.last_error,
+        }
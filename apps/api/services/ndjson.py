@@ -0,0 +1,49 @@
+"""
+Newline delimited JSON streaming of query results.
+
+Rows are pulled from one open cursor a batch at a time and sent as they are
+encoded, so memory stays at one batch whatever the size of the result. The
+generators await between batches, which is where the server cancels them
+once the client has disconnected, and the cursor is closed either way.
+"""
+import asyncio
+
+from services import encoding
+
+MEDIA_TYPE = "application/x-ndjson"
+BATCH_SIZE = 200
+
+
+def encode(rows):
+    """One JSON document per row, each ending in a newline"""
+    return b"".join(encoding.dumps(row) + b"\n" for row in rows)
+
+
+async def stream_cursor(cursor, transform, batch_size=BATCH_SIZE, on_close=None):
+    """NDJSON chunks from an executed DB-API cursor
+
+    transform turns a row, given with the cursor's column names, into the
+    dict that is sent. on_close runs after the cursor is closed, e.g. to
+    close its connection.
+    """
+    columns = [column[0] for column in cursor.description]
+    try:
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            yield encode(transform(dict(zip(columns, row))) for row in rows)
+            await asyncio.sleep(0)
+    finally:
+        cursor.close()
+        if on_close is not None:
+            on_close()
+
+
+async def stream_result(result, transform, batch_size=BATCH_SIZE):
+    """NDJSON chunks from a SQLAlchemy AsyncResult, see stream_cursor()"""
+    try:
+        async for rows in result.partitions(batch_size):
+            yield encode(transform(dict(row._mapping)) for row in rows)
+    finally:
+        await result.close()
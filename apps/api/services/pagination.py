@@ -0,0 +1,54 @@
+"""
+Keyset pagination for entry listings.
+
+A cursor is the (created_at, id) of the last entry of a page, the next page
+is whatever sorts after it. Entries are listed by created_at DESC, id ASC,
+which is the order idx_entries_created and idx_entries_created_hobby keep
+(rowid ascending within a created_at), so a page is read straight off the
+index at any depth, and entries created meanwhile don't shift later pages.
+
+created_at is compared as the text SQLite stores, so the cursor carries it
+as read from the database rather than a parsed datetime.
+"""
+import base64
+import json
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+# Keyset condition on entries e, with keyset_params() bound
+KEYSET_SQL = "e.created_at <= :cursor_created_at AND (e.created_at < :cursor_created_at OR e.id > :cursor_id)"
+
+
+def encode_cursor(created_at, entry_id):
+    raw = json.dumps([created_at, entry_id], separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    """(created_at, entry_id) of a cursor, ValueError if it isn't one of ours"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        created_at, entry_id = json.loads(raw)
+    except (ValueError, TypeError) as e:
+        raise ValueError("Invalid cursor") from e
+    if not isinstance(created_at, str) or not isinstance(entry_id, int):
+        raise ValueError("Invalid cursor")
+    return created_at, entry_id
+
+
+def keyset_params(cursor):
+    """Parameters for KEYSET_SQL"""
+    created_at, entry_id = decode_cursor(cursor)
+    return {"cursor_created_at": created_at, "cursor_id": entry_id}
+
+
+def paginate(rows, limit, key):
+    """Page and next cursor from the limit + 1 rows fetched for it
+
+    key returns (created_at, id) of a row. The cursor is None on the last page.
+    """
+    rows = list(rows)
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, encode_cursor(*key(rows[-1]))
@@ -0,0 +1,231 @@
+"""
+Typed filters and sorting on entry props.
+
+Props are stored as JSON text, so comparing them needs a typed expression,
+and using an index needs one built on that same expression. The keys
+hobby_types declare in schema_json get an index each: with props stored as
+rows a partial one on entry_props(typed value, entry_id) WHERE key = '<key>',
+with props stored as a document one on entries(typed value of the key), see
+services/props.py. ensure_indexes() creates them for the declared keys and
+drops the rest. A filter is then a range scan of its key's index, and only
+declared keys can be filtered on.
+
+On /api/entries/ a filter is props.<key>__<op>=<value>, the op defaulting to
+eq, and sort=props.<key> or sort=-props.<key> orders by a prop, entries
+without it last.
+"""
+import json
+import re
+
+from services import props
+from services.fts import PROP_VALUE_SQL
+
+INDEX_PREFIX = "idx_prop_"
+DOCUMENT_INDEX_PREFIX = "idx_entries_prop_"
+PARAM_PREFIX = "props."
+# JSON schema type -> how values are compared, arrays and objects can't be
+KINDS = {"integer": "number", "number": "number", "boolean": "number", "string": "text"}
+OPERATORS = {"eq": "=", "ne": "!=", "gt": ">", "gte": ">=", "lt": "<", "lte": "<=", "in": "IN"}
+
+_KEY_RE = re.compile(r"^\w+$", re.ASCII)
+
+# What ensure_indexes() last built indexes for, filters resolve keys against it
+declared = {}
+
+
+def _quote(value):
+    """SQL string literal, partial indexes only match a literal key"""
+    return "'" + value.replace("'", "''") + "'"
+
+
+def index_name(key, kind):
+    prefix = DOCUMENT_INDEX_PREFIX if props.storage == "json" else INDEX_PREFIX
+    return f"{prefix}{kind}_{key}"
+
+
+def value_sql(key, kind, table=None):
+    """Typed value of a prop, written exactly as its index is built on
+
+    table qualifies props_json, in rows mode the value is entry_props' own.
+    """
+    if props.storage == "json":
+        column = f"{table}.{props.PROPS_COLUMN}" if table else props.PROPS_COLUMN
+        value = f"json_extract({column}, {_quote('$.' + key)})"
+    else:
+        value = f"({PROP_VALUE_SQL})"
+    return f"CAST({value} AS NUMERIC)" if kind == "number" else f"{value} COLLATE NOCASE"
+
+
+def declared_props(conn):
+    """{type_key: {prop key: kind}} from the active hobby_types' schema_json"""
+    cursor = conn.cursor()
+    cursor.execute("SELECT key, schema_json FROM hobby_types WHERE is_active = 1")
+    types = {}
+    for type_key, schema_json in cursor.fetchall():
+        try:
+            schema = json.loads(schema_json or "{}")
+        except ValueError:
+            continue
+        properties = schema.get("properties") or {}
+        types[type_key] = {
+            key: KINDS[spec.get("type")]
+            for key, spec in properties.items()
+            if isinstance(spec, dict) and spec.get("type") in KINDS and _KEY_RE.match(key)
+        }
+    return types
+
+
+def index_statements(types):
+    """{index name: CREATE INDEX} for every declared key and kind"""
+    statements = {}
+    for kinds in types.values():
+        for key, kind in kinds.items():
+            name = index_name(key, kind)
+            if props.storage == "json":
+                statements[name] = f"CREATE INDEX IF NOT EXISTS {name} ON entries({value_sql(key, kind)})"
+            else:
+                statements[name] = (
+                    f"CREATE INDEX IF NOT EXISTS {name} ON entry_props({value_sql(key, kind)}, entry_id) "
+                    f"WHERE key = {_quote(key)}"
+                )
+    return statements
+
+
+def ensure_indexes(conn):
+    """Create the indexes of declared keys, drop the rest, caller commits
+
+    Indexes are for the current props storage, those of the other mode go
+    too. Returns {created: [...], dropped: [...]} index names.
+    """
+    found = declared_props(conn)
+    wanted = index_statements(found)
+    cursor = conn.cursor()
+    cursor.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'index' AND (name LIKE ? OR name LIKE ?)",
+        [INDEX_PREFIX + "%", DOCUMENT_INDEX_PREFIX + "%"],
+    )
+    existing = {row[0] for row in cursor.fetchall()}
+    created = sorted(set(wanted) - existing)
+    dropped = sorted(existing - set(wanted))
+    for name in dropped:
+        cursor.execute(f"DROP INDEX IF EXISTS {name}")
+    for name in created:
+        cursor.execute(wanted[name])
+    declared.clear()
+    declared.update(found)
+    return {"created": created, "dropped": dropped}
+
+
+def parse_filters(items):
+    """(key, op, value) of the props.* items of a query string
+
+    items are (name, value) pairs, other parameters are skipped. ValueError
+    on an unknown operator.
+    """
+    filters = []
+    for name, value in items:
+        if not name.startswith(PARAM_PREFIX):
+            continue
+        key, _, op = name[len(PARAM_PREFIX):].partition("__")
+        op = op or "eq"
+        if op not in OPERATORS:
+            raise ValueError(f"Unknown operator '{op}' for props.{key}, expected one of {', '.join(OPERATORS)}")
+        filters.append((key, op, value))
+    return filters
+
+
+def parse_sort(value):
+    """(key, descending) of sort=props.<key> or sort=-props.<key>, None without sort"""
+    if not value:
+        return None
+    descending = value.startswith("-")
+    name = value.lstrip("-")
+    if not name.startswith(PARAM_PREFIX) or not name[len(PARAM_PREFIX):]:
+        raise ValueError(f"Unknown sort '{value}', expected props.<key> or -props.<key>")
+    return name[len(PARAM_PREFIX):], descending
+
+
+def resolve_kinds(keys, type_key=None):
+    """{key: kind} for the keys filtered or sorted on, ValueError if one can't be
+
+    With type_key only that type's declaration counts, without it a key
+    declared with two different kinds is ambiguous.
+    """
+    types = {type_key: declared.get(type_key, {})} if type_key else declared
+    kinds = {}
+    for key in keys:
+        found = {props[key] for props in types.values() if key in props}
+        if not found:
+            raise ValueError(f"props.{key} isn't declared filterable by a hobby type schema")
+        if len(found) > 1:
+            raise ValueError(f"props.{key} is declared as {' and '.join(sorted(found))}, filter by type_key too")
+        kinds[key] = found.pop()
+    return kinds
+
+
+def parse_query(items, sort=None, type_key=None):
+    """(filters, sort, kinds) of a query string's props.* items and sort
+
+    ValueError if a filter or the sort is invalid or its key isn't declared.
+    """
+    filters = parse_filters(items)
+    order = parse_sort(sort)
+    keys = [key for key, _, _ in filters] + ([order[0]] if order else [])
+    return filters, order, resolve_kinds(keys, type_key)
+
+
+def _coerce(kind, value):
+    if kind == "text":
+        return value
+    lowered = value.strip().lower()
+    if lowered in ("true", "false"):
+        return 1 if lowered == "true" else 0
+    try:
+        return int(lowered)
+    except ValueError:
+        try:
+            return float(lowered)
+        except ValueError:
+            raise ValueError(f"'{value}' isn't a number") from None
+
+
+def build_filters(filters, kinds, entries="e"):
+    """WHERE conditions on the entries table for parsed filters, and their params
+
+    Each condition is an IN over one prop index, written with the exact
+    expression and literal key the partial index was created with.
+    """
+    conditions = []
+    params = {}
+    for position, (key, op, value) in enumerate(filters):
+        kind = kinds[key]
+        if op == "in":
+            names = []
+            for item, part in enumerate(value.split(",")):
+                params[f"prop_{position}_{item}"] = _coerce(kind, part.strip())
+                names.append(f":prop_{position}_{item}")
+            comparison = f"IN ({', '.join(names)})"
+        else:
+            params[f"prop_{position}"] = _coerce(kind, value)
+            comparison = f"{OPERATORS[op]} :prop_{position}"
+        # INDEXED BY, left to itself the planner may prefer idx_entry_props_key and scan the key
+        if props.storage == "json":
+            conditions.append(
+                f"{entries}.id IN (SELECT id FROM entries INDEXED BY {index_name(key, kind)} "
+                f"WHERE {value_sql(key, kind)} {comparison})"
+            )
+        else:
+            conditions.append(
+                f"{entries}.id IN (SELECT entry_id FROM entry_props INDEXED BY {index_name(key, kind)} "
+                f"WHERE key = {_quote(key)} AND {value_sql(key, kind)} {comparison})"
+            )
+    return conditions, params
+
+
+def build_sort(key, kind, descending, entries="e"):
+    """ORDER BY term for a prop, entries without it sort last"""
+    if props.storage == "json":
+        value = value_sql(key, kind, entries)
+    else:
+        value = f"(SELECT {value_sql(key, kind)} FROM entry_props WHERE entry_id = {entries}.id AND key = {_quote(key)})"
+    return f"{value} {'DESC' if descending else 'ASC'} NULLS LAST"
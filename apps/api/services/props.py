@@ -0,0 +1,162 @@
+"""
+Storage and batched loading of entry props.
+
+Props are stored one of two ways, the database records which in app_settings
+and load_storage() reads it at startup:
+
+- rows: one entry_props row per key, with the value as JSON text
+- json: the whole object in entries.props_json, written with the entry in
+  one UPDATE and read with it, no join and no extra rows
+
+convert() moves a database from one to the other. Everything reading or
+writing props goes through this module, so the API is the same either way.
+
+Props of a whole page of entries come from one query, aggregated per entry
+into a JSON object by SQLite in rows mode, so a page costs one query and one
+json.loads per entry however many props each has.
+"""
+import json
+
+STORAGE_MODES = ("rows", "json")
+PROPS_COLUMN = "props_json"
+SETTING_KEY = "props_storage"
+
+# Mode of the database this process serves, see load_storage()
+storage = "rows"
+
+# A value that isn't valid JSON comes back as the string it is stored as
+_VALUE_SQL = "CASE WHEN json_valid(value_json) THEN json(value_json) ELSE json_quote(value_json) END"
+
+
+def ensure_schema(conn):
+    """Add the props_json column if missing, caller commits"""
+    cursor = conn.cursor()
+    cursor.execute("PRAGMA table_info(entries)")
+    if PROPS_COLUMN not in [column[1] for column in cursor.fetchall()]:
+        cursor.execute(f"ALTER TABLE entries ADD COLUMN {PROPS_COLUMN} TEXT")
+
+
+def read_storage(conn):
+    cursor = conn.cursor()
+    cursor.execute("SELECT value FROM app_settings WHERE key = ?", [SETTING_KEY])
+    row = cursor.fetchone()
+    return row[0] if row and row[0] in STORAGE_MODES else "rows"
+
+
+def load_storage(conn):
+    """Make this process use the database's storage mode, returns it"""
+    global storage
+    ensure_schema(conn)
+    storage = read_storage(conn)
+    return storage
+
+
+def build_props_query(entry_ids):
+    """SQL and params for (entry_id, props object) rows of the listed entries
+
+    The ids go in as one JSON array parameter, so the statement is the same
+    for any page size and never runs into SQLite's variable limit.
+    """
+    params = {"entry_ids": json.dumps(list(entry_ids))}
+    if storage == "json":
+        sql = f"""
+        SELECT id, {PROPS_COLUMN}
+        FROM entries
+        WHERE id IN (SELECT value FROM json_each(:entry_ids)) AND {PROPS_COLUMN} IS NOT NULL
+        """
+        return sql, params
+    sql = f"""
+    SELECT entry_id, json_group_object(key, {_VALUE_SQL}) AS props
+    FROM entry_props
+    WHERE entry_id IN (SELECT value FROM json_each(:entry_ids))
+    GROUP BY entry_id
+    """
+    return sql, params
+
+
+def group_props(rows, entry_ids=()):
+    """{entry_id: props dict} from build_props_query() rows, {} for entries without props"""
+    props = {entry_id: {} for entry_id in entry_ids}
+    for entry_id, value in rows:
+        props[entry_id] = json.loads(value)
+    return props
+
+
+def load_props(conn, entry_ids):
+    """Props of the listed entries from a DB-API connection, see group_props()"""
+    if not entry_ids:
+        return {}
+    sql, params = build_props_query(entry_ids)
+    cursor = conn.cursor()
+    cursor.execute(sql, params)
+    return group_props(cursor.fetchall(), entry_ids)
+
+
+def write_props(conn, items):
+    """Replace the props of entries, items are (entry_id, props dict) pairs
+
+    Runs in the caller's transaction. In rows mode that's a delete and an
+    insert per prop, in json mode one UPDATE per entry.
+    """
+    items = list(items)
+    if not items:
+        return
+    cursor = conn.cursor()
+    if storage == "json":
+        cursor.executemany(
+            f"UPDATE entries SET {PROPS_COLUMN} = ? WHERE id = ?",
+            [(json.dumps(props) if props else None, entry_id) for entry_id, props in items],
+        )
+        return
+    cursor.executemany("DELETE FROM entry_props WHERE entry_id = ?", [(entry_id,) for entry_id, _ in items])
+    cursor.executemany(
+        "INSERT INTO entry_props (entry_id, key, value_json) VALUES (?, ?, ?)",
+        [(entry_id, key, json.dumps(value)) for entry_id, props in items for key, value in props.items()],
+    )
+
+
+def delete_props(conn, entry_ids):
+    """Drop the props of entries about to be deleted, json mode has nothing to drop"""
+    if storage == "rows":
+        conn.cursor().executemany("DELETE FROM entry_props WHERE entry_id = ?", [(entry_id,) for entry_id in entry_ids])
+
+
+def convert(conn, mode):
+    """Move every entry's props to mode and record it, returns entries converted
+
+    One transaction, which the caller commits. Processes serving the
+    database keep their mode until restarted.
+    """
+    if mode not in STORAGE_MODES:
+        raise ValueError(f"Unknown props storage '{mode}', expected one of {', '.join(STORAGE_MODES)}")
+    ensure_schema(conn)
+    cursor = conn.cursor()
+    current = read_storage(conn)
+    if mode == "json" and current != "json":
+        cursor.execute(f"""
+            UPDATE entries SET {PROPS_COLUMN} = (
+                SELECT json_group_object(key, {_VALUE_SQL}) FROM entry_props WHERE entry_id = entries.id
+            )
+            WHERE id IN (SELECT DISTINCT entry_id FROM entry_props)
+        """)
+        converted = cursor.rowcount
+        cursor.execute("DELETE FROM entry_props")
+    elif mode == "rows" and current != "rows":
+        # Through json as write_props() writes them, SQLite's float to text
+        # conversion drops digits of some values
+        cursor.execute(f"SELECT id, {PROPS_COLUMN} FROM entries WHERE {PROPS_COLUMN} IS NOT NULL ORDER BY id")
+        documents = cursor.fetchall()
+        cursor.executemany(
+            "INSERT INTO entry_props (entry_id, key, value_json) VALUES (?, ?, ?)",
+            ((entry_id, key, json.dumps(value))
+             for entry_id, document in documents for key, value in json.loads(document).items()),
+        )
+        cursor.execute(f"UPDATE entries SET {PROPS_COLUMN} = NULL WHERE {PROPS_COLUMN} IS NOT NULL")
+        converted = cursor.rowcount
+    else:
+        converted = 0
+    cursor.execute(
+        "INSERT OR REPLACE INTO app_settings (key, value, updated_at) VALUES (?, ?, CURRENT_TIMESTAMP)",
+        [SETTING_KEY, mode],
+    )
+    return converted
@@ -0,0 +1,350 @@
+"""
+"More like this" for entries, cosine similarity over TF-IDF vectors.
+
+Term counts come straight from entry_fts (through an fts5vocab 'instance'
+table), so terms are stemmed and folded exactly like search, and each column
+counts with its bm25 weight. Vectors are kept as a CSR matrix (entry -> terms)
+and its transpose (term -> entries) in plain NumPy arrays. A query walks the
+postings of its strongest terms only, so it touches a small part of the
+matrix however many entries there are.
+
+Writes don't touch the arrays. Changed entries go to a small pending set that
+queries score directly, and the matrix is rebuilt from memory once that set
+grows past COMPACT_AFTER.
+"""
+import math
+import threading
+
+import numpy as np
+
+from services import analysis, fts
+
+# Terms of the query entry used for scoring, strongest first
+QUERY_TERMS = 64
+# Terms in more than this share of entries say little and have long postings
+MAX_DF_RATIO = 0.5
+# Pending writes before the matrix is rebuilt
+COMPACT_AFTER = 500
+# Terms whose postings are read per build step
+TERMS_PER_STEP = 500
+
+
+def _tf(weighted_count):
+    """Sublinear term frequency"""
+    return 1.0 + np.log(weighted_count)
+
+
+def vocabulary(conn):
+    cursor = conn.cursor()
+    cursor.execute(f"SELECT term FROM {fts.VOCAB_TABLE}")
+    return [term for (term,) in cursor.fetchall()]
+
+
+def postings(conn, terms, first_column=0):
+    """(entry ids, term columns, weighted counts) for terms, numbered from first_column
+
+    Each term's postings come back as two strings, which NumPy parses far
+    faster than one Python tuple per token.
+    """
+    cursor = conn.cursor()
+    cursor.execute(
+        "CREATE VIRTUAL TABLE IF NOT EXISTS temp.related_instances "
+        f"USING fts5vocab(main, {fts.FTS_TABLE}, 'instance')"
+    )
+    docs, columns, counts = [], [], []
+    for column, term in enumerate(terms, first_column):
+        cursor.execute(
+            "SELECT group_concat(doc, ' '), group_concat(col, ' ') FROM temp.related_instances WHERE term = ?",
+            [term],
+        )
+        doc_list, column_list = cursor.fetchone()
+        if not doc_list:
+            continue
+        term_docs, positions = np.unique(np.array(doc_list.split(), dtype=np.int64), return_inverse=True)
+        weights = np.array([fts.BM25_WEIGHTS.get(name, 1.0) for name in column_list.split()])
+        docs.append(term_docs)
+        columns.append(np.full(len(term_docs), column, dtype=np.int32))
+        counts.append(np.bincount(positions, weights=weights))
+    if not docs:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int32), np.zeros(0)
+    return np.concatenate(docs), np.concatenate(columns), np.concatenate(counts)
+
+
+def archived_ids(conn):
+    cursor = conn.cursor()
+    cursor.execute("SELECT id FROM entries WHERE is_archived = 1")
+    return np.array([entry_id for (entry_id,) in cursor.fetchall()], dtype=np.int64)
+
+
+def _column_weights():
+    cases = " ".join(
+        f"WHEN '{column}' THEN {fts.BM25_WEIGHTS[column]}" for column in fts.FTS_COLUMNS
+    )
+    return f"CASE col {cases} ELSE 1.0 END"
+
+
+class RelatedIndex:
+    """TF-IDF vectors of the non-archived entries"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # Entries written while build() runs, None when not building
+        self._dirty = None
+        self._reset()
+
+    def _reset(self):
+        self._terms = {}          # term -> column
+        self.ids = np.zeros(0, dtype=np.int64)
+        self._rows = {}           # entry id -> row
+        # entry -> terms, raw tf
+        self._indptr = np.zeros(1, dtype=np.int64)
+        self._indices = np.zeros(0, dtype=np.int32)
+        self._tf = np.zeros(0, dtype=np.float32)
+        # term -> entries, normalized tf-idf
+        self._col_indptr = np.zeros(1, dtype=np.int64)
+        self._col_rows = np.zeros(0, dtype=np.int32)
+        self._col_weights = np.zeros(0, dtype=np.float32)
+        self._norms = np.zeros(0, dtype=np.float32)
+        self._df = np.zeros(0, dtype=np.int32)
+        self._idf = np.zeros(0, dtype=np.float32)
+        # entry id -> (term columns, raw tf), None once removed
+        self._pending = {}
+
+    def stats(self):
+        return {
+            "entries": len(self._rows),
+            "terms": len(self._terms),
+            "nonzeros": len(self._indices),
+            "pending": len(self._pending),
+        }
+
+    def load(self, conn):
+        """Build the matrix from the whole entry_fts index in one go"""
+        terms = vocabulary(conn)
+        parts = [postings(conn, terms)]
+        self._swap(terms, parts, archived_ids(conn))
+        return len(self.ids)
+
+    async def build(self, runner, chunk=TERMS_PER_STEP):
+        """Build the matrix a chunk of terms at a time, serving requests in between
+
+        runner(fn, *args) runs fn(conn, *args), like database.run_raw. The
+        current matrix keeps answering until the new one is swapped in, and
+        writes made meanwhile are replayed on top of it.
+        """
+        self._dirty = set()
+        try:
+            terms = await runner(vocabulary)
+            parts = []
+            for start in range(0, len(terms), chunk):
+                parts.append(await runner(postings, terms[start:start + chunk], start))
+            self._swap(terms, parts, await runner(archived_ids))
+            dirty, self._dirty = self._dirty, None
+            for entry_id in dirty:
+                await runner(self.update_entry, entry_id)
+        finally:
+            self._dirty = None
+        return len(self.ids)
+
+    def _swap(self, terms, parts, archived):
+        docs = np.concatenate([part[0] for part in parts]) if parts else np.zeros(0, dtype=np.int64)
+        columns = np.concatenate([part[1] for part in parts]) if parts else np.zeros(0, dtype=np.int32)
+        counts = np.concatenate([part[2] for part in parts]) if parts else np.zeros(0)
+        keep = ~np.isin(docs, archived)
+        with self._lock:
+            self._reset()
+            self._terms = {term: column for column, term in enumerate(terms)}
+            self._build(docs[keep], columns[keep], _tf(counts[keep]).astype(np.float32))
+
+    def _build(self, docs, columns, tf):
+        """Replace the matrix with (entry id, term column, tf) triples"""
+        self.ids, rows = np.unique(docs, return_inverse=True)
+        self._rows = {int(entry_id): row for row, entry_id in enumerate(self.ids)}
+
+        order = np.lexsort((columns, rows))
+        self._indices = columns[order]
+        self._tf = tf[order]
+        self._indptr = np.zeros(len(self.ids) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(rows, minlength=len(self.ids)), out=self._indptr[1:])
+
+        term_count = len(self._terms)
+        self._df = np.bincount(columns, minlength=term_count).astype(np.int32)
+        self._idf = (np.log((1 + len(self.ids)) / (1 + self._df)) + 1).astype(np.float32)
+
+        weights = self._tf * self._idf[self._indices]
+        row_of = rows[order]
+        self._norms = np.sqrt(np.bincount(row_of, weights=weights * weights, minlength=len(self.ids))).astype(np.float32)
+        weights /= np.maximum(self._norms[row_of], 1e-12)
+
+        by_term = np.argsort(self._indices, kind="stable")
+        self._col_rows = row_of[by_term].astype(np.int32)
+        self._col_weights = weights[by_term].astype(np.float32)
+        self._col_indptr = np.zeros(term_count + 1, dtype=np.int64)
+        np.cumsum(np.bincount(self._indices, minlength=term_count), out=self._col_indptr[1:])
+        self._pending = {}
+
+    def _compact(self):
+        keep = [row for entry_id, row in self._rows.items() if entry_id not in self._pending]
+        lengths = np.diff(self._indptr)
+        docs = [np.repeat(self.ids[keep], lengths[keep])]
+        columns = [self._indices[self._indptr[row]:self._indptr[row + 1]] for row in keep]
+        tf = [self._tf[self._indptr[row]:self._indptr[row + 1]] for row in keep]
+        for entry_id, vector in self._pending.items():
+            if vector is not None:
+                docs.append(np.full(len(vector[0]), entry_id, dtype=np.int64))
+                columns.append(vector[0])
+                tf.append(vector[1])
+        self._build(
+            np.concatenate(docs) if docs else np.zeros(0, dtype=np.int64),
+            np.concatenate(columns) if columns else np.zeros(0, dtype=np.int32),
+            np.concatenate(tf) if tf else np.zeros(0, dtype=np.float32),
+        )
+
+    def _set_pending(self, entry_id, vector):
+        if self._dirty is not None:
+            self._dirty.add(entry_id)
+        self._pending[entry_id] = vector
+        if len(self._pending) >= COMPACT_AFTER:
+            self._compact()
+
+    def update_entry(self, conn, entry_id):
+        """Re-tokenize one entry after a write, drops it if archived or gone"""
+        profile = analysis.get_profile()
+        cursor = conn.cursor()
+        columns = ", ".join(fts.FTS_COLUMNS)
+        cursor.execute(f"SELECT {columns} FROM entries WHERE id = ? AND is_archived = 0", [entry_id])
+        row = cursor.fetchone()
+        if row is None:
+            self.remove_entry(entry_id)
+            return
+
+        # Same tokenizer as entry_fts, in a connection-local scratch table
+        table = "related_scratch_" + "".join(char for char in profile.tokenizer if char.isalnum())
+        cursor.execute(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS temp.{table} "
+            f"USING fts5({columns}, tokenize='{profile.tokenizer}')"
+        )
+        cursor.execute(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS temp.{table}_instances "
+            f"USING fts5vocab(temp, {table}, 'instance')"
+        )
+        cursor.execute(f"DELETE FROM temp.{table}")
+        cursor.execute(
+            f"INSERT INTO temp.{table}(rowid, {columns}) VALUES (1, {', '.join('?' * len(fts.FTS_COLUMNS))})",
+            [profile.fold(value) if value else value for value in row],
+        )
+        cursor.execute(f"SELECT term, SUM({_column_weights()}) FROM temp.{table}_instances GROUP BY term")
+        counts = cursor.fetchall()
+        cursor.execute(f"DELETE FROM temp.{table}")
+
+        with self._lock:
+            term_columns = []
+            for term, _ in counts:
+                column = self._terms.get(term)
+                if column is None:
+                    column = self._terms[term] = len(self._terms)
+                term_columns.append(column)
+            self._grow_terms()
+            self._set_pending(entry_id, (
+                np.asarray(term_columns, dtype=np.int32),
+                _tf(np.asarray([count for _, count in counts], dtype=np.float64)).astype(np.float32),
+            ))
+
+    def _grow_terms(self):
+        """Terms first seen in a pending entry get an idf as if in one entry"""
+        missing = len(self._terms) - len(self._idf)
+        if missing > 0:
+            rare = math.log((1 + len(self.ids)) / 2) + 1
+            self._idf = np.concatenate([self._idf, np.full(missing, rare, dtype=np.float32)])
+            self._df = np.concatenate([self._df, np.ones(missing, dtype=np.int32)])
+
+    def remove_entry(self, entry_id):
+        with self._lock:
+            if self._dirty is not None:
+                self._dirty.add(entry_id)
+            if entry_id in self._rows or self._pending.get(entry_id) is not None:
+                self._set_pending(entry_id, None)
+
+    def _vector(self, entry_id):
+        """(term columns, normalized tf-idf weights) of an entry"""
+        if entry_id in self._pending:
+            vector = self._pending[entry_id]
+            if vector is None:
+                return None
+            columns, tf = vector
+        elif entry_id in self._rows:
+            row = self._rows[entry_id]
+            columns = self._indices[self._indptr[row]:self._indptr[row + 1]]
+            tf = self._tf[self._indptr[row]:self._indptr[row + 1]]
+        else:
+            return None
+        weights = tf * self._idf[columns]
+        norm = np.sqrt(np.dot(weights, weights))
+        return columns, weights / max(norm, 1e-12)
+
+    def related(self, entry_id, limit=10):
+        """[(entry id, cosine similarity), ...] best first"""
+        with self._lock:
+            vector = self._vector(entry_id)
+            if vector is None:
+                return []
+            columns, weights = vector
+
+            # Strongest informative terms only, they carry most of the score
+            informative = self._df[columns] <= max(1, MAX_DF_RATIO * len(self.ids))
+            columns, weights = columns[informative], weights[informative]
+            if len(columns) > QUERY_TERMS:
+                strongest = np.argpartition(weights, -QUERY_TERMS)[-QUERY_TERMS:]
+                columns, weights = columns[strongest], weights[strongest]
+
+            # Base matrix, through the postings of the query terms
+            scores = np.zeros(len(self.ids), dtype=np.float32)
+            base = columns < len(self._col_indptr) - 1
+            if base.any():
+                starts = self._col_indptr[columns[base]]
+                ends = self._col_indptr[columns[base] + 1]
+                rows = np.concatenate([self._col_rows[s:e] for s, e in zip(starts, ends)])
+                contributions = np.concatenate([
+                    self._col_weights[s:e] * w for s, e, w in zip(starts, ends, weights[base])
+                ])
+                scores += np.bincount(rows, weights=contributions, minlength=len(self.ids)).astype(np.float32)
+
+            # Rows replaced by pending writes are stale
+            for stale in [entry_id, *self._pending]:
+                if stale in self._rows:
+                    scores[self._rows[stale]] = 0
+
+            candidates = []
+            if len(scores):
+                top = min(limit, len(scores))
+                best = np.argpartition(scores, -top)[-top:]
+                candidates = [(int(self.ids[row]), float(scores[row])) for row in best if scores[row] > 0]
+
+            query = dict(zip(columns.tolist(), weights.tolist()))
+            for other_id in self._pending:
+                if other_id == entry_id:
+                    continue
+                other = self._vector(other_id)
+                if other is None:
+                    continue
+                score = sum(query.get(column, 0.0) * weight for column, weight in zip(other[0].tolist(), other[1].tolist()))
+                if score > 0:
+                    candidates.append((other_id, score))
+
+        candidates.sort(key=lambda candidate: candidate[1], reverse=True)
+        return candidates[:limit]
+
+
+def fetch_entries(ids):
+    """SQL and params for the listed entries, for rendering related() results"""
+    placeholders = ", ".join(f":id_{position}" for position in range(len(ids)))
+    sql = f"""
+    SELECT e.id, e.title, e.hobby_id, e.type_key, e.created_at, h.name AS hobby_name
+    FROM entries e
+    JOIN hobbies h ON h.id = e.hobby_id
+    WHERE e.id IN ({placeholders})
+    """
+    return sql, {f"id_{position}": entry_id for position, entry_id in enumerate(ids)}
+
+
+index = RelatedIndex()
@@ -0,0 +1,156 @@
+"""
+Server-side rendering of entry markdown to sanitized HTML.
+
+Rendered HTML is kept in entry_html, keyed by entry id and stamped with the
+updated_at of the entry it was rendered from and the RENDERER version, so a
+row is only served while both still match. Triggers drop the row when an
+entry's content changes or the entry goes, and prerender() fills the table
+for existing entries in batches.
+
+Markdown output goes through bleach with an allowlist: no scripts, styles,
+event handlers or javascript: links survive, whatever a note contains.
+"""
+import bleach
+import markdown
+
+HTML_TABLE = "entry_html"
+RENDER_FORMATS = ("html",)
+# Bump when the markdown extensions or the allowlist change, older rows are rendered again
+RENDERER = "1"
+BATCH_SIZE = 500
+
+EXTENSIONS = ["extra", "sane_lists", "nl2br"]
+ALLOWED_TAGS = [
+    "a", "abbr", "b", "blockquote", "br", "code", "dd", "del", "div", "dl", "dt", "em",
+    "h1", "h2", "h3", "h4", "h5", "h6", "hr", "i", "img", "li", "ol", "p", "pre", "s",
+    "span", "strong", "sub", "sup", "table", "tbody", "td", "th", "thead", "tr", "ul",
+]
+ALLOWED_ATTRIBUTES = {
+    "a": ["href", "title"],
+    "abbr": ["title"],
+    "img": ["src", "alt", "title"],
+    "td": ["align"],
+    "th": ["align"],
+    "code": ["class"],
+    "div": ["class"],
+    "span": ["class"],
+}
+ALLOWED_PROTOCOLS = ["http", "https", "mailto"]
+
+
+def create_statements():
+    return [
+        f"""
+        CREATE TABLE IF NOT EXISTS {HTML_TABLE} (
+            entry_id INTEGER PRIMARY KEY REFERENCES entries(id) ON DELETE CASCADE,
+            updated_at TEXT,
+            renderer TEXT NOT NULL,
+            html TEXT NOT NULL,
+            rendered_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        """,
+        f"""
+        CREATE TRIGGER IF NOT EXISTS entry_html_update AFTER UPDATE OF content_markdown ON entries BEGIN
+            DELETE FROM {HTML_TABLE} WHERE entry_id = old.id;
+        END
+        """,
+        f"""
+        CREATE TRIGGER IF NOT EXISTS entry_html_delete AFTER DELETE ON entries BEGIN
+            DELETE FROM {HTML_TABLE} WHERE entry_id = old.id;
+        END
+        """,
+    ]
+
+
+def ensure_schema(conn):
+    """Create the HTML cache table and its triggers if missing, caller commits"""
+    cursor = conn.cursor()
+    for statement in create_statements():
+        cursor.execute(statement)
+
+
+def render_html(content):
+    """Sanitized HTML of markdown content, None for no content"""
+    if not content:
+        return None
+    html = markdown.markdown(content, extensions=EXTENSIONS, output_format="html")
+    return bleach.clean(html, tags=ALLOWED_TAGS, attributes=ALLOWED_ATTRIBUTES,
+                        protocols=ALLOWED_PROTOCOLS, strip=True)
+
+
+def cached_html(conn, entry_id):
+    """HTML of an entry's content, from the cache or rendered and stored
+
+    None for an entry without content or no such entry. A miss writes to
+    the cache, which the caller commits.
+    """
+    cursor = conn.cursor()
+    cursor.execute(
+        f"""
+        SELECT e.updated_at, e.content_markdown, h.html FROM entries e
+        LEFT JOIN {HTML_TABLE} h ON h.entry_id = e.id AND h.updated_at IS e.updated_at AND h.renderer = ?
+        WHERE e.id = ?
+        """,
+        [RENDERER, entry_id],
+    )
+    row = cursor.fetchone()
+    if not row or not row[1]:
+        return None
+    updated_at, content, html = row
+    if html is not None:
+        return html
+    html = render_html(content)
+    cursor.execute(
+        f"INSERT OR REPLACE INTO {HTML_TABLE} (entry_id, updated_at, renderer, html) VALUES (?, ?, ?, ?)",
+        [entry_id, updated_at, RENDERER, html],
+    )
+    return html
+
+
+def stale_count(conn):
+    """Entries with content whose HTML is missing or out of date"""
+    cursor = conn.cursor()
+    cursor.execute(
+        f"""
+        SELECT COUNT(*) FROM entries e
+        LEFT JOIN {HTML_TABLE} h ON h.entry_id = e.id
+        WHERE e.content_markdown IS NOT NULL AND e.content_markdown != ''
+          AND (h.entry_id IS NULL OR h.updated_at IS NOT e.updated_at OR h.renderer != ?)
+        """,
+        [RENDERER],
+    )
+    return cursor.fetchone()[0]
+
+
+def prerender(conn, batch_size=BATCH_SIZE, commit=None):
+    """Render every entry whose HTML is missing or stale, returns how many
+
+    Works through them in id order a batch at a time, commit is called after
+    each batch so a long run doesn't hold the write lock throughout.
+    """
+    cursor = conn.cursor()
+    rendered = 0
+    last_id = 0
+    while True:
+        cursor.execute(
+            f"""
+            SELECT e.id, e.updated_at, e.content_markdown FROM entries e
+            LEFT JOIN {HTML_TABLE} h ON h.entry_id = e.id
+            WHERE e.id > ? AND e.content_markdown IS NOT NULL AND e.content_markdown != ''
+              AND (h.entry_id IS NULL OR h.updated_at IS NOT e.updated_at OR h.renderer != ?)
+            ORDER BY e.id
+            LIMIT ?
+            """,
+            [last_id, RENDERER, batch_size],
+        )
+        rows = cursor.fetchall()
+        if not rows:
+            return rendered
+        cursor.executemany(
+            f"INSERT OR REPLACE INTO {HTML_TABLE} (entry_id, updated_at, renderer, html) VALUES (?, ?, ?, ?)",
+            [(entry_id, updated_at, RENDERER, render_html(content)) for entry_id, updated_at, content in rows],
+        )
+        if commit is not None:
+            commit()
+        rendered += len(rows)
+        last_id = rows[-1][0]
@@ -0,0 +1,222 @@
+"""
+In-process typeahead index for entry titles and tag names.
+
+Short prefixes, which match the most keys, are answered from a shallow trie
+whose nodes cache their top-k completions. Longer prefixes bisect a sorted
+key list, where the matching range is small. Mid-title word prefixes are
+left to the FTS5 prefix index (see fts.build_title_prefix_query).
+"""
+import bisect
+import heapq
+import threading
+
+from services import analysis
+
+# Prefix lengths answered straight from the cached top-k lists
+TRIE_DEPTH = 4
+TOP_K = 10
+# Upper bound on keys ranked for a deep prefix
+SCAN_LIMIT = 500
+MAX_KEY_LENGTH = 64
+
+
+def _by_score(scored):
+    return scored[0]
+
+
+def normalize(text):
+    text = analysis.get_profile().normalize(text or "")
+    return " ".join(text.split())[:MAX_KEY_LENGTH]
+
+
+class PrefixIndex:
+    """Keys ranked by score, completed by prefix"""
+
+    def __init__(self, top_k=TOP_K, depth=TRIE_DEPTH):
+        self.top_k = top_k
+        self.depth = depth
+        self._keys = []    # sorted (key, ident)
+        self._items = {}   # ident -> (key, text, score)
+        self._trie = {}    # prefix -> [ident, ...] best first
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._items)
+
+    def clear(self):
+        with self._lock:
+            self._keys.clear()
+            self._items.clear()
+            self._trie.clear()
+
+    def load(self, rows):
+        """Bulk load (ident, text, score) rows, replacing the current contents"""
+        with self._lock:
+            self._items = {}
+            for ident, text, score in rows:
+                key = normalize(text)
+                if key:
+                    self._items[ident] = (key, text, score or 0)
+            self._keys = sorted((key, ident) for ident, (key, _, _) in self._items.items())
+
+            candidates = {}
+            for ident, (key, _, score) in self._items.items():
+                for prefix in self._prefixes(key):
+                    candidates.setdefault(prefix, []).append((score, ident))
+            self._trie = {
+                prefix: [ident for _, ident in heapq.nlargest(self.top_k, scored, key=_by_score)]
+                for prefix, scored in candidates.items()
+            }
+
+    def upsert(self, ident, text, score=0):
+        key = normalize(text)
+        with self._lock:
+            current = self._items.get(ident)
+            if current and current[0] == key:
+                self._items[ident] = (key, text, score)
+                if score < current[2]:
+                    self._rebuild(self._cached_in(key, ident))
+                else:
+                    for prefix in self._prefixes(key):
+                        self._promote(prefix, ident)
+                return
+
+            if current:
+                self._remove(ident)
+            if not key:
+                return
+            self._items[ident] = (key, text, score)
+            bisect.insort(self._keys, (key, ident))
+            for prefix in self._prefixes(key):
+                self._promote(prefix, ident)
+
+    def add_score(self, ident, text, delta):
+        current = self._items.get(ident)
+        score = (current[2] if current else 0) + delta
+        if score <= 0:
+            self.remove(ident)
+        else:
+            self.upsert(ident, text, score)
+
+    def remove(self, ident):
+        with self._lock:
+            self._remove(ident)
+
+    def complete(self, prefix, limit=TOP_K):
+        """Best scored (ident, text, score) whose key starts with prefix"""
+        prefix = normalize(prefix)
+        if not prefix:
+            return []
+
+        items = self._items
+        if len(prefix) <= self.depth:
+            idents = self._trie.get(prefix, ())[:limit]
+            return [(ident, items[ident][1], items[ident][2]) for ident in idents]
+
+        keys = self._keys
+        lo = bisect.bisect_left(keys, (prefix,))
+        hi = bisect.bisect_left(keys, (prefix + "\uffff",), lo, min(len(keys), lo + SCAN_LIMIT))
+        scored = ((items[ident][2], ident) for _, ident in keys[lo:hi])
+        best = heapq.nlargest(limit, scored, key=_by_score)
+        return [(ident, items[ident][1], score) for score, ident in best]
+
+    def _prefixes(self, key):
+        return [key[:length] for length in range(1, min(len(key), self.depth) + 1)]
+
+    def _promote(self, prefix, ident):
+        idents = self._trie.setdefault(prefix, [])
+        if ident in idents:
+            idents.remove(ident)
+        score = self._items[ident][2]
+        position = 0
+        while position < len(idents) and self._items[idents[position]][2] >= score:
+            position += 1
+        if position < self.top_k:
+            idents.insert(position, ident)
+            del idents[self.top_k:]
+
+    def _remove(self, ident):
+        current = self._items.pop(ident, None)
+        if not current:
+            return
+        key = current[0]
+        position = bisect.bisect_left(self._keys, (key, ident))
+        if position < len(self._keys) and self._keys[position] == (key, ident):
+            del self._keys[position]
+        self._rebuild(self._cached_in(key, ident))
+
+    def _cached_in(self, key, ident):
+        return [prefix for prefix in self._prefixes(key) if ident in self._trie.get(prefix, ())]
+
+    def _rebuild(self, prefixes):
+        """Recompute cached lists from the sorted keys, for when a member left or dropped"""
+        for prefix in prefixes:
+            lo = bisect.bisect_left(self._keys, (prefix,))
+            hi = bisect.bisect_left(self._keys, (prefix + "\uffff",), lo)
+            if lo == hi:
+                self._trie.pop(prefix, None)
+                continue
+            scored = ((self._items[ident][2], ident) for _, ident in self._keys[lo:hi])
+            self._trie[prefix] = [
+                ident for _, ident in heapq.nlargest(self.top_k, scored, key=_by_score)
+            ]
+
+
+class Suggester:
+    """Title completions ranked by view_count, tag completions by usage_count"""
+
+    def __init__(self):
+        self.titles = PrefixIndex()
+        self.tags = PrefixIndex()
+
+    def load(self, conn):
+        cursor = conn.cursor()
+        cursor.execute("SELECT id, title, view_count FROM entries WHERE is_archived = 0")
+        self.titles.load(cursor.fetchall())
+        cursor.execute("SELECT name, name, usage_count FROM tags")
+        self.tags.load(cursor.fetchall())
+
+    def add_entry(self, entry_id, title, view_count=0):
+        self.titles.upsert(entry_id, title, view_count or 0)
+
+    def remove_entry(self, entry_id):
+        self.titles.remove(entry_id)
+
+    def update_tags(self, old_tags, new_tags):
+        """Adjust tag usage for an entry whose tags changed from old to new"""
+        old_tags, new_tags = set(split_tags(old_tags)), set(split_tags(new_tags))
+        for name in new_tags - old_tags:
+            self.tags.add_score(name, name, 1)
+        for name in old_tags - new_tags:
+            self.tags.add_score(name, name, -1)
+
+    def suggest(self, prefix, limit=TOP_K):
+        return {
+            "titles": self.titles.complete(prefix, limit),
+            "tags": self.tags.complete(prefix, limit),
+        }
+
+
+def merge_titles(matches, rows, limit):
+    """Top up trie title matches with (id, title, view_count) rows from the FTS prefix query"""
+    titles = list(matches)
+    seen = {entry_id for entry_id, _, _ in titles}
+    for entry_id, title, view_count in rows:
+        if len(titles) >= limit:
+            break
+        if entry_id not in seen:
+            seen.add(entry_id)
+            titles.append((entry_id, title, view_count or 0))
+    return titles
+
+
+def split_tags(tags):
+    """Tags arrive as a list from the API and as a comma string from the DB"""
+    if not tags:
+        return []
+    if isinstance(tags, str):
+        tags = tags.split(",")
+    return [tag.strip() for tag in tags if tag and tag.strip()]
+
+
+index = Suggester()
@@ -0,0 +1,307 @@
+"""
+Normalized entry tags in tags and entry_tags.
+
+entries.tags stays the comma string the FTS index and the API read; sync()
+mirrors it into entry_tags, one row per (entry, tag), in the caller's
+transaction. Triggers keep tags.usage_count equal to the entry_tags rows of
+each tag and drop an entry's rows when it's deleted, so the counts can't
+disagree with the rows whichever write path ran.
+
+Tags are matched by slug, so "Gitar" and "gitar " are one tag, named as it
+was first written, while symbols stay in the slug to keep "C++" and "C#"
+two. Filtering goes through entry_tags: a tag's entries come from
+idx_entry_tags_tag, an entry's check from the primary key.
+
+The same triggers keep hobby_tags, the usage of each tag within a hobby, so
+top() reads the most used tags overall or of one hobby straight off a usage
+index, and complete() ranks every tag in a prefix's range of the slug index,
+neither aggregating over entries.
+"""
+import json
+import re
+
+from services import suggest
+
+TAGS_SCHEMA_VERSION = "4"
+SETTING_KEY = "tags_schema"
+TAG_MODES = ("all", "any")
+BATCH_SIZE = 1000
+TOP_K = 10
+TRIGGERS = ("entry_tags_usage_insert", "entry_tags_usage_delete", "entry_tags_entry_delete", "entry_tags_entry_move")
+
+# Whitespace and punctuation that only separates words, anything else is part of the tag
+_SEPARATOR_RE = re.compile(r"[\s\-.,;:/\\|!?'\"()\[\]{}]+")
+
+
+def slugify(name):
+    """Casefolded name with separator runs turned into '-', symbols like + and # kept
+
+    The name itself casefolded if it's nothing but separators.
+    """
+    slug = _SEPARATOR_RE.sub("-", name.casefold()).strip("-")
+    return slug or name.strip().casefold()
+
+
+def _hobby_usage(hobby_id, tag_ids, delta):
+    """Trigger statement adding delta to the hobby_tags rows of a hobby, creating them at delta"""
+    return f"""
+            INSERT INTO hobby_tags (hobby_id, tag_id, usage_count)
+            SELECT {hobby_id}, tag_id, {delta} FROM ({tag_ids}) WHERE {hobby_id} IS NOT NULL
+            ON CONFLICT(hobby_id, tag_id) DO UPDATE SET usage_count = usage_count + excluded.usage_count;"""
+
+
+def create_statements():
+    return [
+        """
+        CREATE TABLE IF NOT EXISTS hobby_tags (
+            hobby_id INTEGER NOT NULL,
+            tag_id INTEGER NOT NULL,
+            usage_count INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (hobby_id, tag_id)
+        ) WITHOUT ROWID
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_entry_tags_tag ON entry_tags(tag_id, entry_id)",
+        "CREATE INDEX IF NOT EXISTS idx_tags_usage ON tags(usage_count DESC)",
+        "CREATE INDEX IF NOT EXISTS idx_hobby_tags_usage ON hobby_tags(hobby_id, usage_count DESC)",
+        f"""
+        CREATE TRIGGER IF NOT EXISTS entry_tags_usage_insert AFTER INSERT ON entry_tags BEGIN
+            UPDATE tags SET usage_count = COALESCE(usage_count, 0) + 1 WHERE id = new.tag_id;{
+            _hobby_usage("(SELECT hobby_id FROM entries WHERE id = new.entry_id)", "SELECT new.tag_id AS tag_id", 1)}
+        END
+        """,
+        # Runs while the entry still exists, entry_tags_entry_delete removes its rows before it goes
+        f"""
+        CREATE TRIGGER IF NOT EXISTS entry_tags_usage_delete AFTER DELETE ON entry_tags BEGIN
+            UPDATE tags SET usage_count = COALESCE(usage_count, 0) - 1 WHERE id = old.tag_id;{
+            _hobby_usage("(SELECT hobby_id FROM entries WHERE id = old.entry_id)", "SELECT old.tag_id AS tag_id", -1)}
+        END
+        """,
+        # Foreign keys aren't enforced on every connection, so no ON DELETE CASCADE to rely on.
+        # BEFORE, since where they are, the cascade empties entry_tags ahead of AFTER triggers
+        # and the entry's hobby is gone by then.
+        """
+        CREATE TRIGGER IF NOT EXISTS entry_tags_entry_delete BEFORE DELETE ON entries BEGIN
+            DELETE FROM entry_tags WHERE entry_id = old.id;
+        END
+        """,
+        f"""
+        CREATE TRIGGER IF NOT EXISTS entry_tags_entry_move AFTER UPDATE OF hobby_id ON entries
+        WHEN old.hobby_id IS NOT new.hobby_id BEGIN{
+            _hobby_usage("old.hobby_id", "SELECT tag_id FROM entry_tags WHERE entry_id = new.id", -1)}{
+            _hobby_usage("new.hobby_id", "SELECT tag_id FROM entry_tags WHERE entry_id = new.id", 1)}
+        END
+        """,
+    ]
+
+
+def ensure_schema(conn):
+    """Create the tables, indexes and triggers, backfilling on first run
+
+    A new schema version replaces the triggers, recomputes the slugs and
+    backfills again. Returns True if it backfilled. The caller commits.
+    """
+    cursor = conn.cursor()
+    cursor.execute("SELECT value FROM app_settings WHERE key = ?", [SETTING_KEY])
+    row = cursor.fetchone()
+    current = bool(row and row[0] == TAGS_SCHEMA_VERSION)
+    if not current:
+        for name in TRIGGERS:
+            cursor.execute(f"DROP TRIGGER IF EXISTS {name}")
+    for statement in create_statements():
+        cursor.execute(statement)
+    if current:
+        return False
+    _reslug(cursor)
+    backfill(conn)
+    cursor.execute(
+        "INSERT OR REPLACE INTO app_settings (key, value, updated_at) VALUES (?, ?, CURRENT_TIMESTAMP)",
+        [SETTING_KEY, TAGS_SCHEMA_VERSION],
+    )
+    return True
+
+
+def _reslug(cursor):
+    """Give every tag the slug slugify() makes of its name
+
+    Tags an older slugify() gave one slug keep their own now. Should two names
+    still share one, the later tag gets its id appended.
+    """
+    cursor.execute("SELECT id, name, slug FROM tags ORDER BY id")
+    taken = set()
+    changes = []
+    for tag_id, name, slug in cursor.fetchall():
+        new_slug = slugify(name)
+        if new_slug in taken:
+            new_slug = f"{new_slug}-{tag_id}"
+        taken.add(new_slug)
+        if new_slug != slug:
+            changes.append((new_slug, tag_id))
+    # Out of the way first, a new slug may be another tag's old one
+    cursor.executemany("UPDATE tags SET slug = ? WHERE id = ?", [(f"\x00{tag_id}", tag_id) for _, tag_id in changes])
+    cursor.executemany("UPDATE tags SET slug = ? WHERE id = ?", changes)
+
+
+def _tag_ids(cursor, names):
+    """{slug: tag id} for tag names, creating the missing tags"""
+    by_slug = {}
+    for name in names:
+        by_slug.setdefault(slugify(name), name)
+    if not by_slug:
+        return {}
+    cursor.executemany(
+        "INSERT OR IGNORE INTO tags (name, slug, usage_count) VALUES (?, ?, 0)",
+        [(name, slug) for slug, name in by_slug.items()],
+    )
+    cursor.execute(
+        "SELECT slug, id FROM tags WHERE slug IN (SELECT value FROM json_each(?))", [json.dumps(list(by_slug))]
+    )
+    ids = dict(cursor.fetchall())
+    # A tag made elsewhere may have the name under another slug
+    missing = {name: slug for slug, name in by_slug.items() if slug not in ids}
+    if missing:
+        cursor.execute("SELECT name, id FROM tags WHERE name IN (SELECT value FROM json_each(?))", [json.dumps(list(missing))])
+        ids.update((missing[name], tag_id) for name, tag_id in cursor.fetchall())
+    return ids
+
+
+def sync(conn, items):
+    """Make entry_tags match the tags of entries, items are (entry_id, tags) pairs
+
+    tags is a list or the comma string entries.tags holds, None for none.
+    Only rows that change are written. Runs in the caller's transaction.
+    """
+    items = [(entry_id, suggest.split_tags(tags)) for entry_id, tags in items]
+    if not items:
+        return
+    cursor = conn.cursor()
+    ids = _tag_ids(cursor, [name for _, names in items for name in names])
+    wanted = {entry_id: {ids[slugify(name)] for name in names} for entry_id, names in items}
+    cursor.execute(
+        "SELECT entry_id, tag_id FROM entry_tags WHERE entry_id IN (SELECT value FROM json_each(?))",
+        [json.dumps(list(wanted))],
+    )
+    current = {entry_id: set() for entry_id in wanted}
+    for entry_id, tag_id in cursor.fetchall():
+        current[entry_id].add(tag_id)
+    cursor.executemany(
+        "DELETE FROM entry_tags WHERE entry_id = ? AND tag_id = ?",
+        [(entry_id, tag_id) for entry_id in wanted for tag_id in current[entry_id] - wanted[entry_id]],
+    )
+    cursor.executemany(
+        "INSERT INTO entry_tags (entry_id, tag_id) VALUES (?, ?)",
+        [(entry_id, tag_id) for entry_id in wanted for tag_id in wanted[entry_id] - current[entry_id]],
+    )
+
+
+def backfill(conn, batch_size=BATCH_SIZE):
+    """Rebuild entry_tags and the usage counts from entries.tags, returns entries tagged
+
+    For existing databases and any that drifted. The caller commits.
+    """
+    cursor = conn.cursor()
+    cursor.execute("DELETE FROM entry_tags")
+    cursor.execute("DELETE FROM hobby_tags")
+    cursor.execute("UPDATE tags SET usage_count = 0")
+    tagged = 0
+    last_id = 0
+    while True:
+        cursor.execute(
+            "SELECT id, tags FROM entries WHERE id > ? AND tags IS NOT NULL AND tags != '' ORDER BY id LIMIT ?",
+            [last_id, batch_size],
+        )
+        rows = cursor.fetchall()
+        if not rows:
+            return tagged
+        sync(conn, rows)
+        tagged += len(rows)
+        last_id = rows[-1][0]
+
+
+def resolve(conn, names):
+    """Tag ids of names, least used first, None for a name no entry has ever had"""
+    slugs = list(dict.fromkeys(slugify(name) for name in names))
+    cursor = conn.cursor()
+    cursor.execute(
+        "SELECT slug, id, usage_count FROM tags WHERE slug IN (SELECT value FROM json_each(?))", [json.dumps(slugs)]
+    )
+    found = {slug: (tag_id, usage or 0) for slug, tag_id, usage in cursor.fetchall()}
+    return [found[slug][0] if slug in found else None
+            for slug in sorted(slugs, key=lambda slug: found.get(slug, (None, -1))[1])]
+
+
+def check_mode(mode):
+    if mode not in TAG_MODES:
+        raise ValueError(f"Unknown tag_mode '{mode}', expected one of {', '.join(TAG_MODES)}")
+
+
+def build_filter(tag_ids, mode="all", entries="e"):
+    """WHERE condition on the entries table for tag ids, and its params
+
+    all: the first tag's entries from idx_entry_tags_tag, each checked for
+    the others by primary key, so pass the rarest first as resolve() does.
+    any: the entries of every tag from idx_entry_tags_tag. None ids, tags
+    nobody used, match nothing. ValueError on an unknown mode.
+    """
+    check_mode(mode)
+    params = {f"tag_{position}": tag_id for position, tag_id in enumerate(tag_ids)}
+    names = [f":{name}" for name in params]
+    if mode == "any":
+        return f"{entries}.id IN (SELECT entry_id FROM entry_tags WHERE tag_id IN ({', '.join(names)}))", params
+    conditions = [f"{entries}.id IN (SELECT entry_id FROM entry_tags WHERE tag_id = {names[0]})"]
+    conditions += [
+        f"EXISTS (SELECT 1 FROM entry_tags WHERE entry_id = {entries}.id AND tag_id = {name})" for name in names[1:]
+    ]
+    return " AND ".join(conditions), params
+
+
+def top(conn, hobby_id=None, limit=TOP_K):
+    """[(name, usage)] of the most used tags, of one hobby's entries with hobby_id
+
+    Reads the first rows of idx_tags_usage or idx_hobby_tags_usage.
+    """
+    cursor = conn.cursor()
+    if hobby_id is None:
+        cursor.execute(
+            "SELECT name, usage_count FROM tags WHERE usage_count > 0 ORDER BY usage_count DESC, id LIMIT ?", [limit]
+        )
+    else:
+        cursor.execute(
+            """
+            SELECT t.name, ht.usage_count FROM hobby_tags ht JOIN tags t ON t.id = ht.tag_id
+            WHERE ht.hobby_id = ? AND ht.usage_count > 0
+            ORDER BY ht.usage_count DESC, ht.tag_id LIMIT ?
+            """,
+            [hobby_id, limit],
+        )
+    return cursor.fetchall()
+
+
+def complete(conn, prefix, hobby_id=None, limit=TOP_K):
+    """[(name, usage)] of the most used tags whose slug starts with prefix's
+
+    Every tag in the prefix's range of the slug index is ranked, so a short
+    prefix reads more rows but never misses a popular tag; SQLite keeps only
+    the top limit while sorting. With hobby_id, usage within that hobby, one
+    hobby_tags primary key lookup per tag in the range.
+    """
+    start = slugify(prefix) if prefix.strip() else ""
+    if not start:
+        return []
+    params = {"start": start, "end": start + "\U0010ffff", "limit": limit}
+    if hobby_id is None:
+        usage, join = "t.usage_count", ""
+    else:
+        # CROSS JOIN keeps tags the outer loop, walking the hobby's usage index
+        # instead reads all its tags when few of them match the prefix
+        usage, join = "ht.usage_count", "CROSS JOIN hobby_tags ht ON ht.hobby_id = :hobby_id AND ht.tag_id = t.id"
+        params["hobby_id"] = hobby_id
+    cursor = conn.cursor()
+    cursor.execute(
+        f"""
+        SELECT t.name, {usage} AS usage FROM tags t {join}
+        WHERE t.slug >= :start AND t.slug < :end AND {usage} > 0
+        ORDER BY usage DESC, t.slug LIMIT :limit
+        """,
+        params,
+    )
+    return cursor.fetchall()
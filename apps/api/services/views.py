@@ -0,0 +1,125 @@
+"""
+Write-behind entry view counts.
+
+Reading an entry used to UPDATE its view_count and commit, turning every read
+into a write that waits on SQLite's write lock. Views are now counted in
+memory and written every FLUSH_SECONDS in one executemany, and once more on
+shutdown. Reads add the views still pending to the stored count, so the
+count they return is live.
+"""
+import asyncio
+import os
+import threading
+import time
+from datetime import datetime, timezone
+
+FLUSH_SECONDS = int(os.getenv("VIEW_FLUSH_SECONDS", "10"))
+
+
+def write_views(conn, batch):
+    """Add {entry_id: (views, last viewed at)} to entries"""
+    conn.cursor().executemany(
+        "UPDATE entries SET view_count = COALESCE(view_count, 0) + ?, last_viewed_at = ? WHERE id = ?",
+        [(views, viewed_at, entry_id) for entry_id, (views, viewed_at) in batch.items()],
+    )
+
+
+class ViewCounter:
+    """Pending view counts, flushed in the background
+
+    runner is an async callable running fn(conn, *args) in a transaction,
+    like database.run_raw, and on_write is called after each flush commits.
+    """
+
+    def __init__(self, runner, on_write=None, interval=FLUSH_SECONDS):
+        self.runner = runner
+        self.on_write = on_write
+        self.interval = interval
+        self._pending = {}        # entry id -> (views, last viewed at)
+        self._flushing = {}       # the batch being written, still counted by reads
+        self._lock = threading.Lock()
+        self._task = None
+        self._stopping = None
+        self.flushes = 0
+        self.flushed_views = 0
+        self.last_flush_at = None
+        self.last_error = None
+
+    def record(self, entry_id):
+        """Count a view, returns the views of entry_id not yet written"""
+        # Same format as CURRENT_TIMESTAMP
+        viewed_at = datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+        with self._lock:
+            views = self._pending.get(entry_id, (0, None))[0] + 1
+            self._pending[entry_id] = (views, viewed_at)
+            return views + self._flushing.get(entry_id, (0, None))[0]
+
+    def pending(self, entry_id):
+        with self._lock:
+            return self._pending.get(entry_id, (0, None))[0] + self._flushing.get(entry_id, (0, None))[0]
+
+    def forget(self, entry_id):
+        """Drop the pending views of a deleted entry"""
+        with self._lock:
+            self._pending.pop(entry_id, None)
+
+    async def start(self):
+        self._stopping = asyncio.Event()
+        self._task = asyncio.create_task(self._loop())
+
+    async def stop(self):
+        """Write what's left and stop, a flush in progress is let finish"""
+        if self._task is not None:
+            self._stopping.set()
+            await self._task
+            self._task = None
+        else:
+            await self.flush()
+
+    async def _loop(self):
+        while not self._stopping.is_set():
+            try:
+                await asyncio.wait_for(self._stopping.wait(), self.interval)
+            except asyncio.TimeoutError:
+                pass
+            try:
+                await self.flush()
+            except Exception as e:
+                self.last_error = str(e)
+
+    async def flush(self):
+        """Write the pending views in one transaction, returns how many entries it touched"""
+        with self._lock:
+            if not self._pending or self._flushing:
+                return 0
+            batch, self._pending, self._flushing = self._pending, {}, self._pending
+        try:
+            await self.runner(write_views, batch)
+        except Exception:
+            # Put them back so the next flush retries
+            with self._lock:
+                for entry_id, (views, viewed_at) in batch.items():
+                    pending, last = self._pending.get(entry_id, (0, None))
+                    self._pending[entry_id] = (views + pending, last or viewed_at)
+                self._flushing = {}
+            raise
+        with self._lock:
+            self._flushing = {}
+        if self.on_write is not None:
+            self.on_write()
+        self.flushes += 1
+        self.flushed_views += sum(views for views, _ in batch.values())
+        self.last_flush_at = time.time()
+        return len(batch)
+
+    def status(self):
+        with self._lock:
+            pending = sum(views for views, _ in self._pending.values())
+        return {
+            "running": self._task is not None and not self._task.done(),
+            "pending_views": pending,
+            "flushes": self.flushes,
+            "flushed_views": self.flushed_views,
+            "last_flush_at": self.last_flush_at,
+            "last_error": self.last_error,
+        }
@@ -2,20 +2,27 @@
 """
 Simple FastAPI app without SQLAlchemy for basic testing
 """
-from fastapi import FastAPI, HTTPException, UploadFile, File, Form
+from fastapi import FastAPI, HTTPException, UploadFile, File, Form, Query, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, ORJSONResponse, StreamingResponse
+import asyncio
 import sqlite3
 import json
 import os
 import uuid
 from pathlib import Path
 from datetime import datetime
+from typing import List
+
+from middleware.compression import CompressionMiddleware
+from services import bulk, cache, counters, encoding, etag, facets, fields, fts, fuzzy, maintenance, ndjson, pagination, prop_filters, props, related, render, suggest, tags, views
 
 app = FastAPI(
     title="Hobby Manager",
     version="1.5.0",
-    description="Personal hobby management application"
+    description="Personal hobby management application",
+    # Routes that return plain data are encoded with orjson too
+    default_response_class=ORJSONResponse
 )
 
 # CORS Middleware
@@ -25,12 +32,69 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[pagination.NEXT_CURSOR_HEADER, etag.ETAG_HEADER],
 )
 
+# gzip or brotli for bodies above encoding.COMPRESS_MIN_BYTES
+app.add_middleware(CompressionMiddleware)
+
+DB_PATH = Path("../../data/app.db")
+
+# Tables entry responses are read from, for their ETags
+ENTRY_TABLES = ("entries", "hobbies")
+
+# Notices commits from other processes, see services/cache.py
+data_watch = cache.DataVersionWatch()
+
 # Simple database connection
 def get_db():
-    db_path = Path("../../data/app.db")
-    return sqlite3.connect(str(db_path))
+    data_watch.observe()
+    return sqlite3.connect(str(DB_PATH))
+
+async def run_db(fn, *args):
+    """Run fn(connection, *args) and commit, for the services/ helpers"""
+    db = get_db()
+    try:
+        result = fn(db, *args)
+        db.commit()
+        return result
+    finally:
+        db.close()
+
+# Merges and optimizes the search index while the API is idle
+index_maintenance = maintenance.IndexMaintenance(run_db, on_write=data_watch.record)
+# Entry views, counted in memory and written in batches
+view_counter = views.ViewCounter(run_db, on_write=data_watch.record)
+
+@app.middleware("http")
+async def track_activity(request, call_next):
+    index_maintenance.touch()
+    return await call_next(request)
+
+@app.on_event("startup")
+async def ensure_search_index():
+    db = get_db()
+    props.load_storage(db)
+    counters.ensure_schema(db)
+    tags.ensure_schema(db)
+    fts.ensure_fts_schema(db)
+    render.ensure_schema(db)
+    prop_filters.ensure_indexes(db)
+    db.commit()
+    suggest.index.load(db)
+    db.close()
+    data_watch.open(DB_PATH)
+    await index_maintenance.start()
+    await view_counter.start()
+    # Takes a while on a big database, requests are served meanwhile
+    app.state.related_build = asyncio.create_task(related.index.build(run_db))
+
+@app.on_event("shutdown")
+async def stop_background_work():
+    app.state.related_build.cancel()
+    await index_maintenance.stop()
+    await view_counter.stop()
+    data_watch.close()
 
 @app.get("/health")
 async def health_check():
@@ -41,7 +105,12 @@ async def get_version():
     return {"version": "1.5.0"}
 
 @app.get("/api/hobbies/")
-async def get_hobbies():
+async def get_hobbies(request: Request):
+    data_watch.observe()
+    check = etag.responses.check("hobbies.list", request.headers.get("if-none-match"), ("hobbies",))
+    if check.not_modified:
+        return Response(status_code=304, headers=check.headers)
+    
     db = get_db()
     cursor = db.cursor()
     cursor.execute("SELECT id, name, slug, icon, color, parent_id, position, is_active FROM hobbies WHERE is_active = 1 ORDER BY position, name")
@@ -58,102 +127,268 @@ async def get_hobbies():
             "is_active": bool(row[7])
         })
     db.close()
-    return hobbies
+    return Response(etag.responses.body(check, hobbies), media_type=encoding.JSON_MEDIA_TYPE, headers=check.headers)
 
 @app.get("/api/entries/")
-async def get_entries(hobby_id: int = None, limit: int = 50, offset: int = 0):
+async def get_entries(request: Request, hobby_id: int = None, type_key: str = None, limit: int = 50,
+                      offset: int = 0, cursor: str = None, field_list: str = Query(None, alias="fields"),
+                      sort: str = None, tag: List[str] = Query(None), tag_mode: str = "all"):
+    if cursor and offset:
+        raise HTTPException(status_code=400, detail="Use either cursor or offset")
+    if cursor and sort:
+        raise HTTPException(status_code=400, detail="Cursors follow the default order, use offset with sort")
+    try:
+        names = fields.parse_fields(field_list)
+        # props.<key>__<op>=<value> filters, each on its key's index
+        prop_filter_list, prop_sort, prop_kinds = prop_filters.parse_query(
+            request.query_params.multi_items(), sort, type_key
+        )
+        prop_conditions, prop_params = prop_filters.build_filters(prop_filter_list, prop_kinds)
+        tags.check_mode(tag_mode)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    data_watch.observe()
+    check = etag.responses.check(
+        "entries.list", request.headers.get("if-none-match"), ENTRY_TABLES, request.url.query, weak=True
+    )
+    if check.not_modified:
+        return Response(status_code=304, headers=check.headers)
+    
     db = get_db()
-    cursor = db.cursor()
     
-    sql = """
-    SELECT e.id, e.hobby_id, e.type_key, e.title, e.description, e.content_markdown,
-           e.tags, e.is_favorite, e.is_archived, e.view_count, e.created_at, e.updated_at,
-           h.name as hobby_name
+    # Only the columns asked for, plus what the cursor needs
+    selected = fields.columns(names)
+    sql = f"""
+    SELECT {fields.select_sql(selected)}
     FROM entries e
     JOIN hobbies h ON h.id = e.hobby_id
     WHERE e.is_archived = 0
     """
-    params = []
+    params = dict(prop_params)
     
     if hobby_id:
-        sql += " AND e.hobby_id = ?"
-        params.append(hobby_id)
+        sql += " AND e.hobby_id = :hobby_id"
+        params["hobby_id"] = hobby_id
+    if type_key:
+        sql += " AND e.type_key = :type_key"
+        params["type_key"] = type_key
+    for condition in prop_conditions:
+        sql += f" AND {condition}"
+    if tag:
+        # tag=a&tag=b through entry_tags, all of them or any with tag_mode=any
+        tag_condition, tag_params = tags.build_filter(tags.resolve(db, tag), tag_mode)
+        sql += f" AND {tag_condition}"
+        params.update(tag_params)
+    if cursor:
+        try:
+            params.update(pagination.keyset_params(cursor))
+        except ValueError as e:
+            db.close()
+            raise HTTPException(status_code=400, detail=str(e))
+        sql += f" AND {pagination.KEYSET_SQL}"
+    
+    order = "e.created_at DESC, e.id ASC"
+    if prop_sort:
+        order = f"{prop_filters.build_sort(prop_sort[0], prop_kinds[prop_sort[0]], prop_sort[1])}, {order}"
+    
+    # One row past the page tells whether there's a next one
+    sql += f" ORDER BY {order} LIMIT :limit OFFSET :offset"
+    params.update({"limit": limit + 1, "offset": offset})
+    
+    key = (selected.index("created_at"), selected.index("id"))
+    rows, next_cursor = pagination.paginate(db.execute(sql, params), limit, lambda row: (row[key[0]], row[key[1]]))
+    if prop_sort:
+        next_cursor = None
     
-    sql += " ORDER BY e.created_at DESC LIMIT ? OFFSET ?"
-    params.extend([limit, offset])
-    
-    cursor.execute(sql, params)
     entries = []
-    for row in cursor.fetchall():
-        entries.append({
-            "id": row[0],
-            "hobby_id": row[1],
-            "type_key": row[2],
-            "title": row[3],
-            "description": row[4],
-            "content_markdown": row[5],
-            "tags": row[6],
-            "is_favorite": bool(row[7]),
-            "is_archived": bool(row[8]),
-            "view_count": row[9],
-            "created_at": row[10],
-            "updated_at": row[11],
-            "hobby_name": row[12],
-            "props": {}
-        })
+    for row in rows:
+        entry = fields.row_dict(selected, row, names)
+        if "view_count" in entry:
+            entry["view_count"] = (entry["view_count"] or 0) + view_counter.pending(row[key[1]])
+        entries.append(entry)
+    
+    # One query for the props of the whole page
+    if "props" in names:
+        page_props = props.load_props(db, [row[key[1]] for row in rows])
+        for entry, row in zip(entries, rows):
+            entry["props"] = page_props[row[key[1]]]
     
     db.close()
-    return entries
+    headers = check.headers
+    if next_cursor:
+        headers[pagination.NEXT_CURSOR_HEADER] = next_cursor
+    return Response(etag.responses.body(check, entries), media_type=encoding.JSON_MEDIA_TYPE, headers=headers)
 
 @app.get("/api/search/")
-async def search_entries(q: str, limit: int = 50):
+async def search_entries(q: str, hobby_id: int = None, type_key: str = None, limit: int = 50, offset: int = 0,
+                         snippet_tokens: int = fts.SNIPPET_TOKENS,
+                         highlight_start: str = fts.HIGHLIGHT_START,
+                         highlight_end: str = fts.HIGHLIGHT_END,
+                         fuzzy_match: bool = Query(False, alias="fuzzy"),
+                         facet: str = Query(None, alias="facets"),
+                         facet_limit: int = facets.TOP_K,
+                         scope: str = "entries"):
+    try:
+        facet_names = facets.parse_facets(facet)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if scope not in fts.SEARCH_SCOPES:
+        raise HTTPException(status_code=400, detail=f"Unknown scope '{scope}', expected one of {', '.join(fts.SEARCH_SCOPES)}")
+    if facet_names and scope != "entries":
+        raise HTTPException(status_code=400, detail="Facets are only counted for scope=entries")
+    facet_limit = max(1, min(facet_limit, facets.MAX_TOP_K))
+    empty = {"results": [], "total": 0, "facets": {}} if facet_names else []
+    
     if not q or len(q) < 2:
-        return []
+        return empty
     
     db = get_db()
     cursor = db.cursor()
     
-    search_term = f"%{q}%"
-    sql = """
-    SELECT e.id, e.title, e.description, e.hobby_id, e.type_key, e.created_at, h.name as hobby_name
-    FROM entries e
-    JOIN hobbies h ON h.id = e.hobby_id
-    WHERE (e.title LIKE ? OR e.description LIKE ? OR e.content_markdown LIKE ? OR e.tags LIKE ?)
-    AND e.is_archived = 0
-    ORDER BY e.created_at DESC
-    LIMIT ?
-    """
+    key = fts.cache_key(q, hobby_id, type_key, limit, offset, snippet_tokens, highlight_start, highlight_end, fuzzy_match,
+                        facet_names, facet_limit, scope)
+    cached = cache.search_cache.get(key)
+    if cached is not None:
+        db.close()
+        return cached
     
-    cursor.execute(sql, [search_term, search_term, search_term, search_term, limit])
+    match = None
+    if fuzzy_match:
+        match = fuzzy.expand_query(db, q)
+    
+    if scope != "entries":
+        results = _search_all(cursor, q, hobby_id, type_key, limit, offset, snippet_tokens,
+                              highlight_start, highlight_end, match, scope)
+        db.close()
+        cache.search_cache.put(key, results)
+        return results
+    
+    search = fts.build_search_query(q, hobby_id=hobby_id, type_key=type_key, limit=limit, offset=offset,
+                                    snippet_tokens=snippet_tokens, match=match)
+    if search is None:
+        db.close()
+        return empty
+    
+    sql, params = search
+    cursor.execute(sql, params)
     results = []
     for row in cursor.fetchall():
-        snippet = row[2][:200] + "..." if row[2] and len(row[2]) > 200 else row[2]
         results.append({
             "id": row[0],
             "title": row[1],
-            "description": row[2],
-            "hobby_id": row[3],
-            "hobby_name": row[6],
-            "type_key": row[4],
-            "created_at": row[5],
-            "snippet": snippet
+            "hobby_id": row[2],
+            "hobby_name": row[5],
+            "type_key": row[3],
+            "created_at": row[4],
+            "snippet": fts.render_snippet(row[7], highlight_start, highlight_end),
+            "rank": row[6]
         })
     
+    if facet_names:
+        sql, params = fts.build_facet_query(q, hobby_id=hobby_id, type_key=type_key, match=match)
+        results = {"results": results, **facets.count_facets(cursor.execute(sql, params), facet_names, facet_limit)}
+    
     db.close()
+    cache.search_cache.put(key, results)
+    return results
+
+def _search_all(cursor, q, hobby_id, type_key, limit, offset, snippet_tokens,
+                highlight_start, highlight_end, match, scope):
+    """Entries and shelf items in one list, see fts.build_unified_search_query()"""
+    search = fts.build_unified_search_query(q, hobby_id=hobby_id, type_key=type_key, limit=limit, offset=offset,
+                                            snippet_tokens=snippet_tokens, match=match, scope=scope)
+    if search is None:
+        return []
+    
+    sql, params = search
+    cursor.execute(sql, params)
+    results = []
+    for row in cursor.fetchall():
+        results.append({
+            "kind": row[0],
+            "id": row[1],
+            "title": row[2],
+            "subtitle": row[3],
+            "hobby_id": row[4],
+            "hobby_name": row[5],
+            "type_key": row[6],
+            "shelf_id": row[7],
+            "shelf_name": row[8],
+            "entry_id": row[9],
+            "created_at": row[10],
+            "snippet": fts.render_snippet(row[12], highlight_start, highlight_end),
+            "rank": row[11]
+        })
     return results
 
+@app.get("/api/search/stream")
+async def stream_search(q: str, hobby_id: int = None, type_key: str = None,
+                        snippet_tokens: int = fts.SNIPPET_TOKENS,
+                        highlight_start: str = fts.HIGHLIGHT_START,
+                        highlight_end: str = fts.HIGHLIGHT_END,
+                        fuzzy_match: bool = Query(False, alias="fuzzy"),
+                        scope: str = "entries"):
+    """Every match, unpaged, as one JSON object per line
+    
+    Rows are sent as they're read from a single cursor, and reading stops
+    when the client goes away.
+    """
+    if scope not in fts.SEARCH_SCOPES:
+        raise HTTPException(status_code=400, detail=f"Unknown scope '{scope}', expected one of {', '.join(fts.SEARCH_SCOPES)}")
+    
+    db = get_db()
+    match = None
+    if fuzzy_match:
+        match = fuzzy.expand_query(db, q)
+    
+    # LIMIT -1 is no limit in SQLite
+    if scope == "entries":
+        search = fts.build_search_query(q, hobby_id=hobby_id, type_key=type_key, limit=-1,
+                                        snippet_tokens=snippet_tokens, match=match)
+    else:
+        search = fts.build_unified_search_query(q, hobby_id=hobby_id, type_key=type_key, limit=-1,
+                                                snippet_tokens=snippet_tokens, match=match, scope=scope)
+    if search is None:
+        db.close()
+        return StreamingResponse(iter(()), media_type=ndjson.MEDIA_TYPE)
+    
+    def transform(row):
+        row["snippet"] = fts.render_snippet(row["snippet"], highlight_start, highlight_end)
+        return row
+    
+    sql, params = search
+    cursor = db.execute(sql, params)
+    return StreamingResponse(ndjson.stream_cursor(cursor, transform, on_close=db.close),
+                             media_type=ndjson.MEDIA_TYPE)
+
+@app.get("/api/search/suggest")
+async def suggest_completions(q: str, limit: int = 8):
+    limit = max(1, min(limit, suggest.TOP_K))
+    matches = suggest.index.suggest(q, limit)
+    titles = matches["titles"]
+    
+    # Title prefixes come from the trie, word prefixes inside titles from FTS
+    if len(titles) < limit:
+        search = fts.build_title_prefix_query(q, limit=limit)
+        if search is not None:
+            db = get_db()
+            sql, params = search
+            titles = suggest.merge_titles(titles, db.execute(sql, params).fetchall(), limit)
+            db.close()
+    
+    return {
+        "titles": [{"text": title, "entry_id": entry_id, "score": score} for entry_id, title, score in titles],
+        "tags": [{"text": name, "entry_id": None, "score": score} for name, _, score in matches["tags"]]
+    }
+
 @app.get("/api/admin/stats")
 async def get_system_stats():
     db = get_db()
     cursor = db.cursor()
     
-    # Count entries
-    cursor.execute("SELECT COUNT(*) FROM entries")
-    total_entries = cursor.fetchone()[0]
-    
-    # Count hobbies
-    cursor.execute("SELECT COUNT(*) FROM hobbies WHERE is_active = 1")
-    total_hobbies = cursor.fetchone()[0]
+    # Counts come from the counter cache
+    totals = counters.totals(db)
     
     # Get version
     cursor.execute("SELECT value FROM app_settings WHERE key = 'version'")
@@ -163,14 +398,45 @@ async def get_system_stats():
     db.close()
     
     return {
-        "total_entries": total_entries,
-        "total_hobbies": total_hobbies,
+        "total_entries": totals["entries"],
+        "total_hobbies": totals["hobbies.active"],
         "database_size": "< 1MB",
         "version": version
     }
 
+@app.get("/api/tags/top")
+async def get_top_tags(request: Request, hobby_id: int = None, limit: int = tags.TOP_K):
+    """Most used tags, of one hobby's entries with hobby_id, from maintained usage counts"""
+    limit = max(1, min(limit, 100))
+    data_watch.observe()
+    # Tag usage only changes with entry writes
+    check = etag.responses.check("tags.top", request.headers.get("if-none-match"), ("entries",), hobby_id, limit)
+    if check.not_modified:
+        return Response(status_code=304, headers=check.headers)
+    
+    db = get_db()
+    top_tags = [{"name": name, "count": count} for name, count in tags.top(db, hobby_id, limit)]
+    db.close()
+    return Response(etag.responses.body(check, top_tags), media_type=encoding.JSON_MEDIA_TYPE, headers=check.headers)
+
+@app.get("/api/tags/autocomplete")
+async def autocomplete_tags(q: str, hobby_id: int = None, limit: int = tags.TOP_K):
+    """Most used tags starting with q, ranked over every tag in the prefix's range of the slug index"""
+    limit = max(1, min(limit, 50))
+    db = get_db()
+    matches = [{"name": name, "count": count} for name, count in tags.complete(db, q, hobby_id, limit)]
+    db.close()
+    return matches
+
 @app.get("/api/shelves/")
-async def get_shelves(hobby_id: int = None):
+async def get_shelves(request: Request, hobby_id: int = None):
+    data_watch.observe()
+    check = etag.responses.check(
+        "shelves.list", request.headers.get("if-none-match"), ("shelves", "shelf_items", "hobbies"), hobby_id
+    )
+    if check.not_modified:
+        return Response(status_code=304, headers=check.headers)
+    
     db = get_db()
     cursor = db.cursor()
     
@@ -178,10 +444,10 @@ async def get_shelves(hobby_id: int = None):
     SELECT s.id, s.hobby_id, s.name, s.description, s.type, s.view_mode, s.sort_by, 
            s.sort_order, s.config_json, s.position, s.created_at, s.updated_at,
            h.name as hobby_name,
-           COUNT(si.id) as item_count
+           COALESCE(c.value, 0) as item_count
     FROM shelves s
     LEFT JOIN hobbies h ON h.id = s.hobby_id
-    LEFT JOIN shelf_items si ON si.shelf_id = s.id
+    LEFT JOIN counters c ON c.name = 'shelf.items' AND c.scope_id = s.id
     WHERE 1=1
     """
     params = []
@@ -190,7 +456,7 @@ async def get_shelves(hobby_id: int = None):
         sql += " AND s.hobby_id = ?"
         params.append(hobby_id)
     
-    sql += " GROUP BY s.id ORDER BY s.position, s.name"
+    sql += " ORDER BY s.position, s.name"
     
     cursor.execute(sql, params)
     shelves = []
@@ -213,10 +479,17 @@ async def get_shelves(hobby_id: int = None):
         })
     
     db.close()
-    return shelves
+    return Response(etag.responses.body(check, shelves), media_type=encoding.JSON_MEDIA_TYPE, headers=check.headers)
 
 @app.get("/api/shelves/{shelf_id}/items")
-async def get_shelf_items(shelf_id: int, limit: int = 50, offset: int = 0):
+async def get_shelf_items(request: Request, shelf_id: int, limit: int = 50, offset: int = 0):
+    data_watch.observe()
+    check = etag.responses.check(
+        "shelves.items", request.headers.get("if-none-match"), ("shelf_items", "entries"), shelf_id, limit, offset
+    )
+    if check.not_modified:
+        return Response(status_code=304, headers=check.headers)
+    
     db = get_db()
     cursor = db.cursor()
     
@@ -253,7 +526,7 @@ async def get_shelf_items(shelf_id: int, limit: int = 50, offset: int = 0):
         })
     
     db.close()
-    return items
+    return Response(etag.responses.body(check, items), media_type=encoding.JSON_MEDIA_TYPE, headers=check.headers)
 
 @app.post("/api/shelves/")
 async def create_shelf(shelf_data: dict):
@@ -280,6 +553,7 @@ async def create_shelf(shelf_data: dict):
     shelf_id = cursor.lastrowid
     db.commit()
     db.close()
+    data_watch.record("shelves")
     
     return {"id": shelf_id, "message": "Shelf created successfully"}
 
@@ -307,6 +581,7 @@ async def add_shelf_item(shelf_id: int, item_data: dict):
     item_id = cursor.lastrowid
     db.commit()
     db.close()
+    data_watch.record("shelf_items")
     
     return {"id": item_id, "message": "Item added to shelf successfully"}
 
@@ -315,18 +590,8 @@ async def get_analytics():
     db = get_db()
     cursor = db.cursor()
     
-    # Get overview stats
-    cursor.execute("SELECT COUNT(*) FROM entries WHERE is_archived = 0")
-    total_entries = cursor.fetchone()[0]
-    
-    cursor.execute("SELECT COUNT(*) FROM hobbies WHERE is_active = 1")
-    total_hobbies = cursor.fetchone()[0]
-    
-    cursor.execute("SELECT COUNT(*) FROM shelves")
-    total_shelves = cursor.fetchone()[0]
-    
-    cursor.execute("SELECT SUM(view_count) FROM entries")
-    total_views = cursor.fetchone()[0] or 0
+    # Get overview stats from the counter cache
+    totals = counters.totals(db)
     
     # Get trends (mock data for now)
     # In a real app, you'd query based on date ranges
@@ -354,13 +619,16 @@ async def get_analytics():
             "hobby": row[3]
         })
     
-    # Get hobby activity
+    # Most used tags, kept current by entry writes
+    popular_tags = [{"name": name, "count": count} for name, count in tags.top(db)]
+    
+    # Get hobby activity, the latest entry is the first of each hobby's created_at index
     cursor.execute("""
-        SELECT h.name, COUNT(e.id) as entry_count, MAX(e.created_at) as last_activity
+        SELECT h.name, COALESCE(c.value, 0) as entry_count,
+               (SELECT MAX(e.created_at) FROM entries e WHERE e.hobby_id = h.id AND e.is_archived = 0) as last_activity
         FROM hobbies h
-        LEFT JOIN entries e ON e.hobby_id = h.id AND e.is_archived = 0
+        LEFT JOIN counters c ON c.name = 'hobby.active' AND c.scope_id = h.id
         WHERE h.is_active = 1
-        GROUP BY h.id, h.name
         ORDER BY entry_count DESC
     """)
     
@@ -376,10 +644,10 @@ async def get_analytics():
     
     return {
         "overview": {
-            "totalEntries": total_entries,
-            "totalHobbies": total_hobbies,
-            "totalShelves": total_shelves,
-            "totalViews": total_views,
+            "totalEntries": totals["entries"] - totals["entries.archived"],
+            "totalHobbies": totals["hobbies.active"],
+            "totalShelves": totals["shelves"],
+            "totalViews": totals["entries.views"],
             "storageUsed": "< 1MB",
             "activeUsers": 1
         },
@@ -391,11 +659,7 @@ async def get_analytics():
         },
         "topContent": {
             "mostViewedEntries": top_entries,
-            "popularTags": [
-                {"name": "tutorial", "count": 45},
-                {"name": "javascript", "count": 32},
-                {"name": "photography", "count": 28}
-            ],
+            "popularTags": popular_tags,
             "activeHobbies": active_hobbies
         },
         "performance": {
@@ -406,6 +670,55 @@ async def get_analytics():
         }
     }
 
+@app.get("/api/admin/cache")
+async def get_cache_stats():
+    data_watch.observe()
+    return {"search": cache.search_cache.stats(), "conditional": etag.responses.stats()}
+
+@app.post("/api/admin/cache/clear")
+async def clear_cache():
+    cache.search_cache.clear()
+    return {"message": "Cache cleared"}
+
+@app.get("/api/admin/search-index")
+async def get_search_index_stats():
+    return {
+        "index": await run_db(maintenance.segment_stats),
+        "maintenance": index_maintenance.status()
+    }
+
+@app.post("/api/admin/search-index/optimize")
+async def optimize_search_index():
+    index = await run_db(maintenance.optimize)
+    data_watch.record()
+    return {"index": index}
+
+@app.post("/api/admin/search-index/rebuild")
+async def rebuild_search_index():
+    result = await run_db(maintenance.rebuild)
+    data_watch.record("entries")
+    return result
+
+@app.post("/api/admin/search-index/integrity-check")
+async def check_search_index():
+    return await run_db(maintenance.integrity_check)
+
+@app.get("/api/admin/counters")
+async def get_counters():
+    """Totals and per-hobby entry counts from the counter cache"""
+    db = get_db()
+    result = {"totals": counters.totals(db), "hobbies": counters.hobby_counts(db)}
+    db.close()
+    return result
+
+@app.post("/api/admin/counters/repair")
+async def repair_counters():
+    """Recount everything from the tables, returns the drift that was corrected"""
+    result = await run_db(counters.repair)
+    # Shelf item counts are part of the shelves list
+    data_watch.record("shelves")
+    return result
+
 @app.get("/api/admin/tables")
 async def get_tables():
     db = get_db()
@@ -460,19 +773,66 @@ async def create_entry(entry_data: dict):
     ])
     
     entry_id = cursor.lastrowid
+    tags.sync(db, [(entry_id, entry_data.get("tags"))])
     db.commit()
+    related.index.update_entry(db, entry_id)
     db.close()
+    data_watch.record("entries")
+    
+    suggest.index.add_entry(entry_id, title)
+    suggest.index.update_tags(None, entry_data.get("tags"))
     
     return {"id": entry_id, "message": "Entry created successfully"}
 
+@app.post("/api/entries/bulk")
+async def bulk_entries(operations: dict):
+    """Create, update, archive and delete many entries in one transaction
+    
+    Every item is validated first; if any is invalid nothing is written and
+    the errors are returned per item.
+    """
+    db = get_db()
+    try:
+        result = bulk.apply(db, operations)
+        db.commit()
+    except bulk.BulkError as e:
+        db.rollback()
+        db.close()
+        raise HTTPException(status_code=422, detail={"message": str(e), "errors": e.errors})
+    except Exception:
+        db.rollback()
+        db.close()
+        raise
+    data_watch.record("entries")
+    
+    bulk.refresh_indexes(db, result["changed"])
+    db.close()
+    
+    return {"results": result["results"], "summary": result["summary"]}
+
 @app.get("/api/entries/{entry_id}")
-async def get_entry(entry_id: int):
+async def get_entry(request: Request, entry_id: int, render_format: str = Query(None, alias="render")):
+    if render_format is not None and render_format not in render.RENDER_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unknown render format '{render_format}', expected html")
+    
     db = get_db()
     cursor = db.cursor()
     
+    cursor.execute("SELECT updated_at FROM entries WHERE id = ?", [entry_id])
+    updated_at = cursor.fetchone()
+    check = etag.responses.check(
+        "entries.detail", request.headers.get("if-none-match"), ENTRY_TABLES, entry_id,
+        updated_at[0] if updated_at else None, render_format, weak=True
+    )
+    if check.not_modified:
+        db.close()
+        # Still a view, the client just has the entry already
+        view_counter.record(entry_id)
+        return Response(status_code=304, headers=check.headers)
+    
     sql = """
     SELECT e.id, e.hobby_id, e.type_key, e.title, e.description, e.content_markdown,
-           e.tags, e.slug, e.is_favorite, e.is_archived, e.view_count, e.created_at, e.updated_at,
+           e.tags, e.is_favorite, e.is_archived, e.view_count, e.created_at, e.updated_at,
            h.name as hobby_name, h.icon as hobby_icon, h.color as hobby_color
     FROM entries e
     JOIN hobbies h ON h.id = e.hobby_id
@@ -486,9 +846,11 @@ async def get_entry(entry_id: int):
         db.close()
         raise HTTPException(status_code=404, detail="Entry not found")
     
-    # Increment view count
-    cursor.execute("UPDATE entries SET view_count = view_count + 1 WHERE id = ?", [entry_id])
-    db.commit()
+    # Counted in memory and written in batches, a read doesn't wait on the write lock
+    view_count = (row[9] or 0) + view_counter.record(entry_id)
+    
+    if not row[8]:
+        suggest.index.add_entry(row[0], row[3], view_count)
     
     entry = {
         "id": row[0],
@@ -498,19 +860,60 @@ async def get_entry(entry_id: int):
         "description": row[4],
         "content_markdown": row[5],
         "tags": row[6],
-        "slug": row[7],
-        "is_favorite": bool(row[8]),
-        "is_archived": bool(row[9]),
-        "view_count": row[10] + 1,  # Include the increment
-        "created_at": row[11],
-        "updated_at": row[12],
-        "hobby_name": row[13],
-        "hobby_icon": row[14],
-        "hobby_color": row[15]
+        "is_favorite": bool(row[7]),
+        "is_archived": bool(row[8]),
+        "view_count": view_count,
+        "created_at": row[10],
+        "updated_at": row[11],
+        "hobby_name": row[12],
+        "hobby_icon": row[13],
+        "hobby_color": row[14],
+        "props": props.load_props(db, [entry_id])[entry_id]
     }
     
+    if render_format == "html":
+        # Rendered once per content version, then read from entry_html
+        entry["content_html"] = render.cached_html(db, entry_id)
+        if db.in_transaction:
+            db.commit()
+            data_watch.record()
+    
     db.close()
-    return entry
+    return Response(etag.responses.body(check, entry), media_type=encoding.JSON_MEDIA_TYPE, headers=check.headers)
+
+@app.get("/api/entries/{entry_id}/related")
+async def get_related_entries(entry_id: int, limit: int = 10):
+    limit = max(1, min(limit, 50))
+    db = get_db()
+    cursor = db.cursor()
+    
+    cursor.execute("SELECT id FROM entries WHERE id = ?", [entry_id])
+    if not cursor.fetchone():
+        db.close()
+        raise HTTPException(status_code=404, detail="Entry not found")
+    
+    scores = dict(related.index.related(entry_id, limit))
+    if not scores:
+        db.close()
+        return []
+    
+    sql, params = related.fetch_entries(list(scores))
+    cursor.execute(sql, params)
+    entries = []
+    for row in cursor.fetchall():
+        entries.append({
+            "id": row[0],
+            "title": row[1],
+            "hobby_id": row[2],
+            "type_key": row[3],
+            "created_at": row[4],
+            "hobby_name": row[5],
+            "score": round(scores[row[0]], 4)
+        })
+    
+    db.close()
+    entries.sort(key=lambda entry: entry["score"], reverse=True)
+    return entries
 
 @app.put("/api/entries/{entry_id}")
 async def update_entry(entry_id: int, entry_data: dict):
@@ -518,8 +921,9 @@ async def update_entry(entry_id: int, entry_data: dict):
     cursor = db.cursor()
     
     # Check if entry exists
-    cursor.execute("SELECT id FROM entries WHERE id = ?", [entry_id])
-    if not cursor.fetchone():
+    cursor.execute("SELECT id, tags, view_count FROM entries WHERE id = ?", [entry_id])
+    existing = cursor.fetchone()
+    if not existing:
         db.close()
         raise HTTPException(status_code=404, detail="Entry not found")
     
@@ -538,9 +942,15 @@ async def update_entry(entry_id: int, entry_data: dict):
         entry_data.get("is_favorite", False),
         entry_id
     ])
+    tags.sync(db, [(entry_id, entry_data.get("tags"))])
     
     db.commit()
+    related.index.update_entry(db, entry_id)
     db.close()
+    data_watch.record("entries")
+    
+    suggest.index.add_entry(entry_id, entry_data.get("title"), (existing[2] or 0) + view_counter.pending(entry_id))
+    suggest.index.update_tags(existing[1], entry_data.get("tags"))
     
     return {"message": "Entry updated successfully"}
 
@@ -558,6 +968,10 @@ async def delete_entry(entry_id: int):
     
     db.commit()
     db.close()
+    data_watch.record("entries")
+    
+    suggest.index.remove_entry(entry_id)
+    related.index.remove_entry(entry_id)
     
     return {"message": "Entry deleted successfully"}
 
@@ -584,6 +998,7 @@ async def create_hobby(hobby_data: dict):
     hobby_id = cursor.lastrowid
     db.commit()
     db.close()
+    data_watch.record("hobbies")
     
     return {"id": hobby_id, "message": "Hobby created successfully"}
 
@@ -613,6 +1028,7 @@ async def update_hobby(hobby_id: int, hobby_data: dict):
     
     db.commit()
     db.close()
+    data_watch.record("hobbies")
     
     return {"message": "Hobby updated successfully"}
 
@@ -622,8 +1038,9 @@ async def delete_entry(entry_id: int):
     cursor = db.cursor()
     
     # Check if entry exists
-    cursor.execute("SELECT id FROM entries WHERE id = ?", [entry_id])
-    if not cursor.fetchone():
+    cursor.execute("SELECT id, tags FROM entries WHERE id = ?", [entry_id])
+    existing = cursor.fetchone()
+    if not existing:
         db.close()
         raise HTTPException(status_code=404, detail="Entry not found")
     
@@ -632,6 +1049,11 @@ async def delete_entry(entry_id: int):
     
     db.commit()
     db.close()
+    data_watch.record("entries")
+    
+    suggest.index.remove_entry(entry_id)
+    related.index.remove_entry(entry_id)
+    suggest.index.update_tags(existing[1], None)
     
     return {"message": "Entry deleted successfully"}
 
@@ -654,6 +1076,7 @@ async def delete_shelf(shelf_id: int):
     
     db.commit()
     db.close()
+    data_watch.record("shelves", "shelf_items")
     
     return {"message": "Shelf deleted successfully"}
 
@@ -667,6 +1090,7 @@ async def clear_all_hobbies():
         cursor.execute("DELETE FROM sqlite_sequence WHERE name='hobbies'")  # Reset auto-increment
         db.commit()
         db.close()
+        data_watch.record("hobbies")
         return {"message": "All hobbies cleared successfully"}
     except Exception as e:
         db.close()
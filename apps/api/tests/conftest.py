@@ -0,0 +1,116 @@
+import json
+import sqlite3
+import sys
+from pathlib import Path
+
+import pytest
+from sqlalchemy import create_engine
+
+# Tests import the API modules the way the app does, from apps/api
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from models import Base
+from services import bulk, counters, fts, prop_filters, props, render, tags
+
+BOOK_TYPE = {
+    "properties": {
+        "author": {"type": "string"},
+        "rating": {"type": "integer"},
+        "finished": {"type": "boolean"},
+    }
+}
+
+
+def migrate(conn):
+    """What database.run_migrations does, on a DB-API connection"""
+    props.load_storage(conn)
+    counters.ensure_schema(conn)
+    tags.ensure_schema(conn)
+    fts.ensure_fts_schema(conn)
+    render.ensure_schema(conn)
+    prop_filters.ensure_indexes(conn)
+    conn.commit()
+
+
+@pytest.fixture
+def db_path(tmp_path, monkeypatch):
+    """A migrated database with the ORM schema, one hobby and one hobby type"""
+    # load_storage sets the process wide storage mode, put it back afterwards
+    monkeypatch.setattr(props, "storage", props.storage)
+    path = tmp_path / "app.db"
+    engine = create_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(engine)
+    engine.dispose()
+
+    conn = sqlite3.connect(str(path))
+    conn.execute("INSERT INTO hobbies (id, name, slug, is_active) VALUES (1, 'Reading', 'reading', 1)")
+    conn.execute("INSERT INTO hobbies (id, name, slug, is_active) VALUES (2, 'Music', 'music', 1)")
+    conn.execute(
+        "INSERT INTO hobby_types (key, name, schema_json) VALUES ('book', 'Book', ?)",
+        [json.dumps(BOOK_TYPE)],
+    )
+    conn.commit()
+    migrate(conn)
+    conn.close()
+    return path
+
+
+@pytest.fixture
+def conn(db_path):
+    """A connection configured like database.py's, foreign keys enforced"""
+    conn = sqlite3.connect(str(db_path))
+    conn.execute("PRAGMA foreign_keys = ON")
+    yield conn
+    conn.close()
+
+
+def write_mixed(conn):
+    """Inserts, edits, hobby moves, archives and deletes of entries, plus shelf and hobby writes
+
+    Entries go through services/bulk.py where it has the operation, the rest
+    is the SQL the routes run. Each step is its own transaction.
+    """
+    tag_sets = [["Gitar", "akor"], ["C++", "C#"], ["gitar", "pratik"], [], ["Fotoğraf", "c++"]]
+    bulk.apply(conn, {"create": [
+        {"hobby_id": 1 + i % 2, "type_key": "book", "title": f"Entry {i}", "tags": tag_sets[i % len(tag_sets)],
+         "is_favorite": i % 3 == 0, "props": {"rating": i % 5, "author": f"Author {i % 4}"}}
+        for i in range(30)
+    ]})
+    conn.commit()
+
+    ids = [row[0] for row in conn.execute("SELECT id FROM entries ORDER BY id")]
+    bulk.apply(conn, {"update": [
+        {"id": ids[0], "title": "Renamed"},
+        {"id": ids[1], "tags": ["akor", "yeni"], "is_favorite": True},
+        {"id": ids[2], "tags": [], "props": {"rating": 1}},
+        {"id": ids[3], "is_archived": True},
+    ]})
+    conn.commit()
+
+    # Hobby moves, favorites and views aren't bulk operations
+    conn.executemany("UPDATE entries SET hobby_id = ? WHERE id = ?", [(2, ids[4]), (1, ids[5]), (2, ids[6])])
+    conn.execute("UPDATE entries SET is_favorite = NOT is_favorite WHERE id IN (?, ?)", [ids[7], ids[8]])
+    conn.execute("UPDATE entries SET view_count = view_count + 5 WHERE id % 4 = 0")
+    conn.commit()
+
+    bulk.apply(conn, {"archive": ids[9:12], "delete": ids[12:16]})
+    conn.commit()
+    # Archived then moved, then deleted outright
+    conn.execute("UPDATE entries SET hobby_id = 1 WHERE id = ?", [ids[10]])
+    props.delete_props(conn, [ids[11]])
+    conn.execute("DELETE FROM entries WHERE id = ?", [ids[11]])
+    tags.sync(conn, [(ids[17], "Gitar,Gitar ,Yeni")])
+    conn.execute("UPDATE entries SET tags = 'Gitar,Gitar ,Yeni' WHERE id = ?", [ids[17]])
+    conn.commit()
+
+    conn.execute("INSERT INTO shelves (id, hobby_id, name) VALUES (1, 1, 'Okunacaklar'), (2, 2, 'Favoriler')")
+    conn.executemany(
+        "INSERT INTO shelf_items (shelf_id, entry_id, title) VALUES (?, ?, ?)",
+        [(1 + i % 2, ids[20 + i], f"Item {i}") for i in range(8)],
+    )
+    conn.execute("UPDATE shelf_items SET shelf_id = 2 WHERE id IN (1, 3)")
+    conn.execute("DELETE FROM shelf_items WHERE id = 2")
+    conn.execute("DELETE FROM shelves WHERE id = 1")
+    conn.execute("INSERT INTO hobbies (id, name, slug, is_active) VALUES (3, 'Chess', 'chess', 1)")
+    conn.execute("UPDATE hobbies SET is_active = 0 WHERE id = 2")
+    conn.commit()
@@ -0,0 +1,36 @@
+from services import bulk, props
+
+
+def create(title, tags=None):
+    return {"hobby_id": 1, "type_key": "book", "title": title, "tags": tags, "props": {"rating": 3}}
+
+
+def test_created_ids_are_the_inserted_rows(conn):
+    conn.execute("INSERT INTO entries (id, hobby_id, type_key, title) VALUES (500, 1, 'note', 'High id')")
+    # A write in between, like another trigger's, that the new ids mustn't pick up
+    conn.execute("""
+        CREATE TEMP TRIGGER shadow_entry AFTER INSERT ON entries WHEN new.type_key = 'book' BEGIN
+            INSERT INTO entries (hobby_id, type_key, title) VALUES (1, 'shadow', 'Shadow of ' || new.title);
+        END
+    """)
+    result = bulk.apply(conn, {"create": [create("First"), create("Second")]})
+
+    ids = [item["id"] for item in result["results"]]
+    titles = dict(conn.execute("SELECT id, title FROM entries"))
+    assert [titles[entry_id] for entry_id in ids] == ["First", "Second"]
+    assert props.load_props(conn, ids) == {ids[0]: {"rating": 3}, ids[1]: {"rating": 3}}
+
+
+def test_tag_changes_count_each_entry_once(conn):
+    result = bulk.apply(conn, {"create": [create("One", ["gitar", "akor"]), create("Two", ["kitap"])]})
+    one, two = [item["id"] for item in result["results"]]
+    conn.commit()
+
+    result = bulk.apply(conn, {
+        "update": [{"id": one, "tags": ["gitar"]}, {"id": one, "tags": ["gitar", "pena"]}, {"id": two, "tags": ["roman"]}],
+        "delete": [two],
+    })
+    assert sorted(result["changed"]["tag_changes"], key=str) == sorted([
+        ("gitar,akor", "gitar,pena"),
+        ("kitap", None),
+    ], key=str)
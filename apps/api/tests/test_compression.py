@@ -0,0 +1,73 @@
+from fastapi import FastAPI, Request, Response
+from fastapi.testclient import TestClient
+
+from middleware.compression import CompressionMiddleware
+from services import encoding, etag
+
+BODY = {"items": ["entry"] * 500}
+
+
+def make_client():
+    app = FastAPI()
+    app.add_middleware(CompressionMiddleware)
+    responses = etag.ConditionalResponses(etag.cache.write_generations)
+
+    @app.get("/items")
+    async def items(request: Request):
+        check = responses.check("items", request.headers.get("if-none-match"), ("entries",))
+        if check.not_modified:
+            return Response(status_code=304, headers=check.headers)
+        return Response(responses.body(check, BODY), media_type=encoding.JSON_MEDIA_TYPE, headers=check.headers)
+
+    return TestClient(app)
+
+
+def test_for_coding_keeps_strong_tags_strong():
+    assert etag.for_coding('"abc"', "gzip") == '"abc-gz"'
+    assert etag.for_coding('"abc"', "br") == '"abc-br"'
+    assert etag.for_coding('W/"abc"', "gzip") == 'W/"abc-gz"'
+    assert etag.for_coding('"abc-gz"', "gzip") == '"abc-gz"'
+    assert etag.for_coding('"abc"', None) == '"abc"'
+
+
+def test_strip_coding_only_strips_the_negotiated_coding():
+    assert etag.strip_coding('"abc-gz", W/"def-gz"', "gzip") == ('"abc", W/"def"', True)
+    assert etag.strip_coding('"abc-br"', "gzip") == ('"abc-br"', False)
+    assert etag.strip_coding(None, "gzip") == (None, False)
+
+
+def test_compressed_responses_get_a_strong_tag_per_coding():
+    client = make_client()
+    plain = client.get("/items", headers={"Accept-Encoding": "identity"})
+    gzipped = client.get("/items", headers={"Accept-Encoding": "gzip"})
+
+    assert "content-encoding" not in plain.headers
+    assert gzipped.headers["content-encoding"] == "gzip"
+    assert gzipped.headers["etag"] == plain.headers["etag"][:-1] + '-gz"'
+    assert not gzipped.headers["etag"].startswith("W/")
+
+
+def test_not_modified_matches_the_tag_of_the_negotiated_coding():
+    client = make_client()
+    tag = client.get("/items", headers={"Accept-Encoding": "gzip"}).headers["etag"]
+
+    again = client.get("/items", headers={"Accept-Encoding": "gzip", "If-None-Match": tag})
+    assert again.status_code == 304
+    assert again.headers["etag"] == tag
+
+    # The gzip representation isn't the one an identity request gets
+    plain = client.get("/items", headers={"Accept-Encoding": "identity", "If-None-Match": tag})
+    assert plain.status_code == 200
+
+
+def test_not_modified_for_an_uncompressed_tag_keeps_it():
+    client = make_client()
+    tag = client.get("/items", headers={"Accept-Encoding": "identity"}).headers["etag"]
+
+    again = client.get("/items", headers={"Accept-Encoding": "identity", "If-None-Match": tag})
+    assert again.status_code == 304
+    assert again.headers["etag"] == tag
+    # The identity body it has is still acceptable, the 304 says that's the one to use
+    gzip = client.get("/items", headers={"Accept-Encoding": "gzip", "If-None-Match": tag})
+    assert gzip.status_code == 304
+    assert gzip.headers["etag"] == tag
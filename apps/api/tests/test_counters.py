@@ -0,0 +1,34 @@
+from conftest import write_mixed
+from services import counters
+
+
+def nonzero(counts):
+    return {key: value for key, value in counts.items() if value}
+
+
+def test_triggers_keep_counters_equal_to_a_recount(conn):
+    write_mixed(conn)
+
+    assert counters.drift(conn) == []
+    assert nonzero(counters.stored(conn)) == nonzero(counters.recount(conn))
+    assert counters.totals(conn)["entries"] == conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+
+
+def test_a_rolled_back_write_leaves_the_counters_alone(conn):
+    write_mixed(conn)
+    before = counters.stored(conn)
+    conn.execute("DELETE FROM entries")
+    conn.execute("UPDATE hobbies SET is_active = 1")
+    conn.rollback()
+
+    assert counters.stored(conn) == before
+
+
+def test_repair_reports_and_fixes_drift(conn):
+    write_mixed(conn)
+    conn.execute("UPDATE counters SET value = value + 3 WHERE name = 'hobby.active' AND scope_id = 1")
+    conn.execute("DELETE FROM counters WHERE name = 'shelves'")
+
+    result = counters.repair(conn)
+    assert [(item["name"], item["scope_id"]) for item in result["drift"]] == [("hobby.active", 1), ("shelves", 0)]
+    assert counters.drift(conn) == []
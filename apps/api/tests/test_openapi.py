@@ -0,0 +1,10 @@
+from main import app
+
+
+def test_entry_list_schema_only_requires_id():
+    schema = app.openapi()
+    response = schema["paths"]["/api/entries/"]["get"]["responses"]["200"]["content"]["application/json"]["schema"]
+    item = schema["components"]["schemas"][response["items"]["$ref"].rsplit("/", 1)[1]]
+
+    assert item["required"] == ["id"]
+    assert "content_markdown" in item["properties"]
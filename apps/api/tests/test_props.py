@@ -0,0 +1,102 @@
+import pytest
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+
+from routers import entries
+from services import props
+
+
+def add_entries(conn, count):
+    conn.executemany(
+        "INSERT INTO entries (id, hobby_id, type_key, title) VALUES (?, 1, 'book', ?)",
+        [(i, f"Book {i}") for i in range(1, count + 1)],
+    )
+    props.write_props(conn, [
+        (i, {"author": f"Author {i % 7}", "rating": i % 5, "finished": i % 2 == 0})
+        for i in range(1, count + 1)
+    ])
+    conn.commit()
+
+
+def count_statements(conn, fn):
+    statements = []
+    conn.set_trace_callback(statements.append)
+    try:
+        result = fn()
+    finally:
+        conn.set_trace_callback(None)
+    return len(statements), result
+
+
+@pytest.mark.parametrize("mode", props.STORAGE_MODES)
+def test_load_props_statements_do_not_grow_with_page_size(conn, mode):
+    props.convert(conn, mode)
+    props.load_storage(conn)
+    add_entries(conn, 100)
+
+    one, page = count_statements(conn, lambda: props.load_props(conn, [1]))
+    hundred, pages = count_statements(conn, lambda: props.load_props(conn, list(range(1, 101))))
+
+    assert one == hundred == 1
+    assert page == {1: {"author": "Author 1", "rating": 1, "finished": False}}
+    assert len(pages) == 100 and pages[100] == {"author": "Author 2", "rating": 0, "finished": True}
+
+
+@pytest.mark.asyncio
+async def test_router_load_props_statements_do_not_grow_with_page_size(conn, db_path):
+    add_entries(conn, 100)
+    engine = create_async_engine(f"sqlite+aiosqlite:///{db_path}")
+    statements = []
+    event.listen(engine.sync_engine, "before_cursor_execute", lambda *args: statements.append(args[2]))
+    try:
+        async with AsyncSession(engine) as db:
+            await entries.load_props(db, [1])
+            one = len(statements)
+            statements.clear()
+            loaded = await entries.load_props(db, list(range(1, 101)))
+            hundred = len(statements)
+    finally:
+        await engine.dispose()
+
+    assert one == hundred == 1
+    assert len(loaded) == 100
+
+
+def test_load_props_returns_empty_props_for_entries_without_any(conn):
+    add_entries(conn, 3)
+    props.write_props(conn, [(2, {})])
+    assert props.load_props(conn, [1, 2, 3, 4])[2] == {}
+    assert props.load_props(conn, [4]) == {4: {}}
+    assert props.load_props(conn, []) == {}
+
+
+ROUND_TRIP_PROPS = {
+    1: {"author": "Sabahattin Ali", "rating": 5, "finished": True, "started": False, "translator": None},
+    2: {"price": 0.30000000000000004, "weight": 1e300, "isbn": 12345678901234567, "quote": "\"İçimizdeki Şeytan\""},
+    3: {"tags": ["roman", "klasik"], "edition": {"year": 1940, "publisher": "Remzi"}, "empty": "", "zero": 0},
+    4: {},
+}
+
+
+def test_props_survive_rows_to_json_to_rows(conn):
+    conn.executemany(
+        "INSERT INTO entries (id, hobby_id, type_key, title) VALUES (?, 1, 'book', ?)",
+        [(entry_id, f"Book {entry_id}") for entry_id in ROUND_TRIP_PROPS],
+    )
+    props.write_props(conn, ROUND_TRIP_PROPS.items())
+    conn.commit()
+    assert props.load_props(conn, list(ROUND_TRIP_PROPS)) == ROUND_TRIP_PROPS
+
+    assert props.convert(conn, "json") == 3
+    props.load_storage(conn)
+    assert conn.execute("SELECT COUNT(*) FROM entry_props").fetchone()[0] == 0
+    assert props.load_props(conn, list(ROUND_TRIP_PROPS)) == ROUND_TRIP_PROPS
+
+    assert props.convert(conn, "rows") == 3
+    props.load_storage(conn)
+    assert conn.execute(f"SELECT COUNT(*) FROM entries WHERE {props.PROPS_COLUMN} IS NOT NULL").fetchone()[0] == 0
+    assert props.load_props(conn, list(ROUND_TRIP_PROPS)) == ROUND_TRIP_PROPS
+    # Bools stay JSON true/false instead of turning into 1/0
+    assert conn.execute(
+        "SELECT value_json FROM entry_props WHERE entry_id = 1 AND key = 'finished'"
+    ).fetchone()[0] == "true"
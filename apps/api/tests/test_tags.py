@@ -0,0 +1,121 @@
+import pytest
+
+from conftest import write_mixed
+from services import tags
+
+
+def add_entry(conn, entry_id, tag_names, hobby_id=1):
+    conn.execute(
+        "INSERT INTO entries (id, hobby_id, type_key, title, tags) VALUES (?, ?, 'note', ?, ?)",
+        [entry_id, hobby_id, f"Entry {entry_id}", ",".join(tag_names)],
+    )
+    tags.sync(conn, [(entry_id, tag_names)])
+
+
+def tag_rows(conn):
+    return conn.execute("SELECT name, slug, usage_count FROM tags WHERE usage_count > 0 ORDER BY name").fetchall()
+
+
+def test_slugify_keeps_symbols_apart():
+    assert tags.slugify("C++") != tags.slugify("C#")
+    assert tags.slugify("C++") != tags.slugify("C")
+    assert tags.slugify("Gitar") == tags.slugify("gitar ")
+    assert tags.slugify("Street Photography") == tags.slugify("street-photography")
+
+
+def test_cpp_and_csharp_stay_separate_tags(conn):
+    add_entry(conn, 1, ["C++"])
+    add_entry(conn, 2, ["C#"])
+    add_entry(conn, 3, ["c++", "C#"])
+
+    assert tag_rows(conn) == [("C#", "c#", 2), ("C++", "c++", 2)]
+    cpp, = tags.resolve(conn, ["C++"])
+    sql, params = tags.build_filter([cpp])
+    assert [row[0] for row in conn.execute(f"SELECT e.id FROM entries e WHERE {sql} ORDER BY e.id", params)] == [1, 3]
+
+
+def test_upgrade_splits_tags_the_old_slugs_merged(conn):
+    add_entry(conn, 1, ["C++"])
+    add_entry(conn, 2, ["C#"])
+    add_entry(conn, 3, ["C"])
+    # As the [^\w]+ slugs left it: one tag "c" for all three, named as first written
+    conn.execute("DELETE FROM entry_tags")
+    conn.execute("DELETE FROM tags")
+    conn.execute("INSERT INTO tags (id, name, slug, usage_count) VALUES (1, 'C++', 'c', 0)")
+    conn.execute("INSERT INTO entry_tags (entry_id, tag_id) VALUES (1, 1), (2, 1), (3, 1)")
+    conn.execute("UPDATE app_settings SET value = '2' WHERE key = ?", [tags.SETTING_KEY])
+
+    assert tags.ensure_schema(conn)
+    assert tag_rows(conn) == [("C", "c", 1), ("C#", "c#", 1), ("C++", "c++", 1)]
+
+
+def test_complete_ranks_every_tag_of_the_prefix(conn):
+    conn.executemany(
+        "INSERT INTO tags (name, slug, usage_count) VALUES (?, ?, 1)",
+        [(f"a{i:04}", f"a{i:04}") for i in range(1000)],
+    )
+    conn.execute("INSERT INTO tags (name, slug, usage_count) VALUES ('azure', 'azure', 7)")
+    conn.execute("INSERT INTO hobby_tags (hobby_id, tag_id, usage_count) SELECT 2, id, usage_count FROM tags")
+
+    assert tags.complete(conn, "A", limit=2) == [("azure", 7), ("a0000", 1)]
+    assert tags.complete(conn, "a", hobby_id=2, limit=1) == [("azure", 7)]
+    assert tags.complete(conn, "a", hobby_id=1) == []
+    assert tags.complete(conn, "  ") == []
+
+
+def usage_counts(conn):
+    return dict(conn.execute("SELECT id, usage_count FROM tags WHERE usage_count != 0"))
+
+
+@pytest.mark.parametrize("foreign_keys", ["ON", "OFF"])
+def test_triggers_keep_usage_counts_equal_to_a_backfill(conn, foreign_keys):
+    conn.execute(f"PRAGMA foreign_keys = {foreign_keys}")
+    write_mixed(conn)
+    conn.execute("DELETE FROM entries WHERE id = (SELECT MIN(entry_id) FROM entry_tags)")
+    conn.commit()
+    kept = usage_counts(conn)
+    entry_tags = conn.execute("SELECT entry_id, tag_id FROM entry_tags ORDER BY 1, 2").fetchall()
+
+    tags.backfill(conn)
+    assert usage_counts(conn) == kept
+    assert conn.execute("SELECT entry_id, tag_id FROM entry_tags ORDER BY 1, 2").fetchall() == entry_tags
+    assert kept == dict(conn.execute("SELECT tag_id, COUNT(*) FROM entry_tags GROUP BY tag_id"))
+
+
+def hobby_usage(conn):
+    return conn.execute(
+        "SELECT hobby_id, tag_id, usage_count FROM hobby_tags WHERE usage_count != 0 ORDER BY 1, 2"
+    ).fetchall()
+
+
+def test_triggers_keep_hobby_usage_equal_to_a_backfill(conn):
+    write_mixed(conn)
+    kept = hobby_usage(conn)
+
+    tags.backfill(conn)
+    assert hobby_usage(conn) == kept
+    assert kept == conn.execute("""
+        SELECT e.hobby_id, et.tag_id, COUNT(*) FROM entry_tags et JOIN entries e ON e.id = et.entry_id
+        GROUP BY 1, 2 ORDER BY 1, 2
+    """).fetchall()
+    assert tags.top(conn, hobby_id=2)[0][1] == max(count for hobby_id, _, count in kept if hobby_id == 2)
+
+
+def test_deleting_an_entry_takes_its_tags_off_its_hobby(conn):
+    assert conn.execute("PRAGMA foreign_keys").fetchone()[0] == 1
+    add_entry(conn, 1, ["Gitar", "akor"])
+    add_entry(conn, 2, ["gitar"])
+    add_entry(conn, 3, ["Gitar"], hobby_id=2)
+    conn.commit()
+    assert tags.complete(conn, "gi", hobby_id=1) == [("Gitar", 2)]
+
+    conn.execute("DELETE FROM entries WHERE id = 1")
+    conn.commit()
+
+    assert tags.complete(conn, "gi", hobby_id=1) == [("Gitar", 1)]
+    assert tags.complete(conn, "a", hobby_id=1) == []
+    assert tags.top(conn, hobby_id=2) == [("Gitar", 1)]
+    assert tags.top(conn) == [("Gitar", 2)]
+    kept = hobby_usage(conn)
+    tags.backfill(conn)
+    assert hobby_usage(conn) == kept
@@ -0,0 +1,8 @@
+from services import views
+
+
+def test_write_views_counts_from_zero_when_view_count_is_null(conn):
+    conn.execute("INSERT INTO entries (id, hobby_id, type_key, title, view_count) VALUES (1, 1, 'note', 'Old', NULL)")
+    views.write_views(conn, {1: (3, "2026-01-01 10:00:00")})
+
+    assert conn.execute("SELECT view_count, last_viewed_at FROM entries WHERE id = 1").fetchone() == (3, "2026-01-01 10:00:00")
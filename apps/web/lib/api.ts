@@ -55,6 +55,29 @@ class ApiClient {
 
   // Entries
   async getEntries(params: GetEntriesParams = {}) {
+    const query = this.entriesQuery(params).toString()
+    const endpoint = `/api/entries/${query ? `?${query}` : ''}`
+    
+    return this.request<Entry[]>(endpoint)
+  }
+
+  // Cursor paging for infinite scroll, pass the returned next_cursor back as cursor
+  async getEntriesPage(params: GetEntriesParams = {}): Promise<EntriesPage> {
+    const query = this.entriesQuery(params).toString()
+    const response = await fetch(`${API_BASE_URL}/api/entries/${query ? `?${query}` : ''}`)
+    
+    if (!response.ok) {
+      const errorData = await response.json().catch(() => ({ message: 'Unknown error' }))
+      throw new Error(errorData.error?.message || errorData.message || errorData.detail || 'Request failed')
+    }
+    
+    return {
+      entries: await response.json(),
+      next_cursor: response.headers.get('X-Next-Cursor'),
+    }
+  }
+
+  private entriesQuery(params: GetEntriesParams) {
     const searchParams = new URLSearchParams()
     
     if (params.hobby_id) searchParams.append('hobby_id', params.hobby_id.toString())
@@ -63,15 +86,27 @@ class ApiClient {
     if (params.is_archived !== undefined) searchParams.append('is_archived', params.is_archived.toString())
     if (params.limit) searchParams.append('limit', params.limit.toString())
     if (params.offset) searchParams.append('offset', params.offset.toString())
+    if (params.cursor) searchParams.append('cursor', params.cursor)
+    if (params.fields?.length) searchParams.append('fields', params.fields.join(','))
+    if (params.sort) searchParams.append('sort', params.sort)
+    for (const tag of params.tags ?? []) searchParams.append('tag', tag)
+    if (params.tag_mode) searchParams.append('tag_mode', params.tag_mode)
+    for (const [key, value] of Object.entries(params.props ?? {})) {
+      searchParams.append(`props.${key}`, String(value))
+    }
     
-    const query = searchParams.toString()
-    const endpoint = `/api/entries/${query ? `?${query}` : ''}`
-    
-    return this.request<Entry[]>(endpoint)
+    return searchParams
   }
 
-  async getEntry(id: number) {
-    return this.request<Entry>(`/api/entries/${id}`)
+  // render: 'html' adds content_html, rendered and sanitized on the server
+  async getEntry(id: number, options: { render?: 'html' } = {}) {
+    const query = options.render ? `?render=${options.render}` : ''
+    return this.request<Entry>(`/api/entries/${id}${query}`)
+  }
+
+  async getRelatedEntries(id: number, limit?: number) {
+    const query = limit ? `?limit=${limit}` : ''
+    return this.request<RelatedEntry[]>(`/api/entries/${id}/related${query}`)
   }
 
   async createEntry(data: CreateEntryData) {
@@ -94,8 +129,68 @@ class ApiClient {
     })
   }
 
+  // All or nothing, a 422 lists the invalid items
+  async bulkEntries(data: BulkEntriesRequest) {
+    return this.request<BulkEntriesResponse>('/api/entries/bulk', {
+      method: 'POST',
+      body: JSON.stringify(data),
+    })
+  }
+
   // Search
   async search(params: SearchParams) {
+    return this.request<SearchResult[]>(`/api/search/?${this.searchQuery(params).toString()}`)
+  }
+
+  async searchWithFacets(params: SearchParams, facets: SearchFacet[] = ['hobby_id', 'type_key', 'tags'], facetLimit?: number) {
+    const searchParams = this.searchQuery(params)
+    searchParams.append('facets', facets.join(','))
+    if (facetLimit) searchParams.append('facet_limit', facetLimit.toString())
+    
+    return this.request<FacetedSearchResponse>(`/api/search/?${searchParams.toString()}`)
+  }
+
+  // Entries and shelf items in one list ranked together, or shelf items only
+  async searchAll(params: SearchParams, scope: 'all' | 'shelf_items' = 'all') {
+    const searchParams = this.searchQuery(params)
+    searchParams.append('scope', scope)
+    
+    return this.request<UnifiedSearchResult[]>(`/api/search/?${searchParams.toString()}`)
+  }
+
+  // Every match, unpaged, read line by line; abort the signal to stop early
+  async *streamSearch(params: SearchParams, scope: 'entries' | 'shelf_items' | 'all' = 'entries', signal?: AbortSignal) {
+    const searchParams = this.searchQuery(params)
+    searchParams.delete('limit')
+    searchParams.delete('offset')
+    searchParams.append('scope', scope)
+    
+    const response = await fetch(`${API_BASE_URL}/api/search/stream?${searchParams.toString()}`, { signal })
+    if (!response.ok || !response.body) {
+      throw new Error('Request failed')
+    }
+    
+    const reader = response.body.getReader()
+    const decoder = new TextDecoder()
+    let buffered = ''
+    try {
+      while (true) {
+        const { done, value } = await reader.read()
+        if (done) break
+        buffered += decoder.decode(value, { stream: true })
+        const lines = buffered.split('\n')
+        buffered = lines.pop() ?? ''
+        for (const line of lines) {
+          if (line) yield JSON.parse(line) as SearchResult | UnifiedSearchResult
+        }
+      }
+    } finally {
+      // Closes the connection if the caller stopped early, the server stops reading
+      await reader.cancel()
+    }
+  }
+
+  private searchQuery(params: SearchParams) {
     const searchParams = new URLSearchParams()
     searchParams.append('q', params.q)
     
@@ -103,8 +198,36 @@ class ApiClient {
     if (params.type_key) searchParams.append('type_key', params.type_key)
     if (params.limit) searchParams.append('limit', params.limit.toString())
     if (params.offset) searchParams.append('offset', params.offset.toString())
+    if (params.fuzzy) searchParams.append('fuzzy', 'true')
+    
+    return searchParams
+  }
+
+  async suggest(q: string, limit?: number) {
+    const searchParams = new URLSearchParams()
+    searchParams.append('q', q)
+    if (limit) searchParams.append('limit', limit.toString())
     
-    return this.request<SearchResult[]>(`/api/search/?${searchParams.toString()}`)
+    return this.request<SuggestResponse>(`/api/search/suggest?${searchParams.toString()}`)
+  }
+
+  // Tags
+  async getTopTags(params: { hobby_id?: number; limit?: number } = {}) {
+    const searchParams = new URLSearchParams()
+    if (params.hobby_id) searchParams.append('hobby_id', params.hobby_id.toString())
+    if (params.limit) searchParams.append('limit', params.limit.toString())
+    const query = searchParams.toString()
+    
+    return this.request<TagUsage[]>(`/api/tags/top${query ? `?${query}` : ''}`)
+  }
+
+  async autocompleteTags(q: string, params: { hobby_id?: number; limit?: number } = {}) {
+    const searchParams = new URLSearchParams()
+    searchParams.append('q', q)
+    if (params.hobby_id) searchParams.append('hobby_id', params.hobby_id.toString())
+    if (params.limit) searchParams.append('limit', params.limit.toString())
+    
+    return this.request<TagUsage[]>(`/api/tags/autocomplete?${searchParams.toString()}`)
   }
 
   // Admin
@@ -234,7 +357,8 @@ export interface Entry {
   type_key: string
   title: string
   description: string | null
-  content_markdown: string | null
+  // Left out of lists unless asked for with fields
+  content_markdown?: string | null
   tags: string | null
   is_favorite: boolean
   is_archived: boolean
@@ -243,6 +367,8 @@ export interface Entry {
   updated_at: string
   hobby_name?: string
   props: Record<string, any>
+  // Only with getEntry(id, { render: 'html' })
+  content_html?: string | null
 }
 
 export interface CreateEntryData {
@@ -265,6 +391,18 @@ export interface UpdateEntryData {
   props?: Record<string, any>
 }
 
+export interface BulkEntriesRequest {
+  create?: CreateEntryData[]
+  update?: (UpdateEntryData & { id: number })[]
+  archive?: number[]
+  delete?: number[]
+}
+
+export interface BulkEntriesResponse {
+  results: { op: 'create' | 'update' | 'archive' | 'delete'; index: number; id: number; ok: boolean }[]
+  summary: Record<'create' | 'update' | 'archive' | 'delete', number>
+}
+
 export interface GetEntriesParams {
   hobby_id?: number
   type_key?: string
@@ -272,6 +410,31 @@ export interface GetEntriesParams {
   is_archived?: boolean
   limit?: number
   offset?: number
+  cursor?: string
+  // Sparse fieldset, e.g. ['title', 'tags'], '*' for everything; id always comes back
+  fields?: string[]
+  // Filters on props a hobby type schema declares, e.g. { rating__gte: 4, year__lte: 2000 }
+  props?: Record<string, string | number | boolean>
+  // 'props.year' or '-props.year', use offset rather than cursor with it
+  sort?: string
+  // Entries with every one of these tags, or any of them with tag_mode 'any'
+  tags?: string[]
+  tag_mode?: 'all' | 'any'
+}
+
+export interface EntriesPage {
+  entries: Entry[]
+  next_cursor: string | null
+}
+
+export interface RelatedEntry {
+  id: number
+  title: string
+  hobby_id: number
+  hobby_name: string
+  type_key: string
+  created_at: string
+  score: number
 }
 
 export interface SearchParams {
@@ -280,12 +443,12 @@ export interface SearchParams {
   type_key?: string
   limit?: number
   offset?: number
+  fuzzy?: boolean
 }
 
 export interface SearchResult {
   id: number
   title: string
-  description: string | null
   hobby_id: number
   hobby_name: string
   type_key: string
@@ -294,6 +457,52 @@ export interface SearchResult {
   rank?: number
 }
 
+export interface UnifiedSearchResult {
+  kind: 'entry' | 'shelf_item'
+  id: number
+  title: string | null
+  subtitle: string | null
+  hobby_id: number
+  hobby_name: string
+  type_key: string | null
+  shelf_id: number | null
+  shelf_name: string | null
+  entry_id: number | null
+  created_at: string
+  snippet?: string
+  rank?: number
+}
+
+export interface Suggestion {
+  text: string
+  entry_id: number | null
+  score: number
+}
+
+export type SearchFacet = 'hobby_id' | 'type_key' | 'tags'
+
+export interface FacetValue {
+  value: number | string
+  label: string | null
+  count: number
+}
+
+export interface FacetedSearchResponse {
+  results: SearchResult[]
+  total: number
+  facets: Partial<Record<SearchFacet, FacetValue[]>>
+}
+
+export interface SuggestResponse {
+  titles: Suggestion[]
+  tags: Suggestion[]
+}
+
+export interface TagUsage {
+  name: string
+  count: number
+}
+
 export interface SystemStats {
   total_entries: number
   total_hobbies: number
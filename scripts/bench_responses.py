@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+Response encoding benchmark for Hobby Manager
+Compares building a page of entries through pydantic models, jsonable_encoder
+and json.dumps, as the routes used to, against plain dicts encoded with
+orjson, and the size of the page with gzip and brotli
+"""
+
+import argparse
+import json
+import random
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Any, Dict, Optional
+
+# Add the api directory to the path
+sys.path.append(str(Path(__file__).parent.parent / "apps" / "api"))
+
+from fastapi.encoders import jsonable_encoder
+from pydantic import BaseModel, ConfigDict
+
+from services import encoding
+
+WORDS = ["kitap", "gitar", "fotoğraf", "ışık", "şehir", "practice", "session", "notes",
+         "landscape", "sunset", "coffee", "mountain", "akor", "pena", "lens", "portre"]
+
+class EntryResponse(BaseModel):
+    """The entries router model as it was"""
+    model_config = ConfigDict(from_attributes=True)
+
+    id: int
+    hobby_id: int
+    type_key: str
+    title: str
+    description: Optional[str]
+    content_markdown: Optional[str]
+    tags: Optional[str]
+    is_favorite: bool
+    is_archived: bool
+    view_count: int
+    created_at: datetime
+    updated_at: datetime
+    hobby_name: Optional[str] = None
+    props: Dict[str, Any] = {}
+
+def text(words):
+    return " ".join(random.choice(WORDS) for _ in range(words))
+
+def make_rows(count, content_words):
+    now = datetime(2025, 1, 1)
+    return [
+        SimpleNamespace(
+            id=i, hobby_id=1, type_key="note", title=text(4), description=text(15),
+            content_markdown=text(content_words), tags="gitar,akor,pratik", is_favorite=False,
+            is_archived=False, view_count=i % 50, created_at=now - timedelta(minutes=i),
+            updated_at=now - timedelta(minutes=i),
+        )
+        for i in range(count)
+    ]
+
+def model_path(rows, props):
+    """Validate from attributes, dump, a second model, response_model validation, jsonable_encoder and json.dumps"""
+    entries = []
+    for row in rows:
+        entry_dict = EntryResponse.model_validate(row, from_attributes=True).model_dump()
+        entry_dict["hobby_name"] = "Müzik"
+        entry_dict["props"] = props
+        entries.append(EntryResponse(**entry_dict))
+    validated = [EntryResponse(**entry.model_dump()) for entry in entries]
+    return json.dumps(jsonable_encoder(validated), ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+def dict_path(rows, props):
+    """One dict per row, encoded by orjson"""
+    return encoding.dumps([
+        {
+            "id": row.id, "hobby_id": row.hobby_id, "type_key": row.type_key, "title": row.title,
+            "description": row.description, "content_markdown": row.content_markdown, "tags": row.tags,
+            "is_favorite": bool(row.is_favorite), "is_archived": bool(row.is_archived),
+            "view_count": row.view_count, "created_at": row.created_at, "updated_at": row.updated_at,
+            "hobby_name": "Müzik", "props": props,
+        }
+        for row in rows
+    ])
+
+def timed(fn, repeat):
+    latencies = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        latencies.append((time.perf_counter() - started) * 1000)
+    return statistics.median(latencies)
+
+def main():
+    parser = argparse.ArgumentParser(description="Hobby Manager Response Benchmark")
+    parser.add_argument('-n', '--entries', type=int, default=50, help='Entries per page')
+    parser.add_argument('-w', '--words', type=int, default=800, help='Words of content_markdown per entry')
+    parser.add_argument('-r', '--repeat', type=int, default=50, help='Timed runs per path')
+    parser.add_argument('--seed', type=int, default=42, help='Random seed')
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    rows = make_rows(args.entries, args.words)
+    props = {"rating": 4, "year": 2021, "author": "Orhan Pamuk"}
+
+    if json.loads(model_path(rows, props)) != json.loads(dict_path(rows, props)):
+        print("❌ The two paths don't produce the same JSON")
+        sys.exit(1)
+
+    print(f"📦 {args.entries} entries, {args.words} words of content each")
+    print(f"\n{'path':<36} {'p50 ms':>8}")
+    for label, fn in [("models + jsonable_encoder + json", model_path), ("dicts + orjson", dict_path)]:
+        print(f"{label:<36} {timed(lambda: fn(rows, props), args.repeat):>8.2f}")
+
+    body = dict_path(rows, props)
+    print(f"\n{'coding':<10} {'bytes':>10} {'ratio':>7} {'p50 ms':>8}")
+    print(f"{'identity':<10} {len(body):>10} {1:>7.2f} {0:>8.2f}")
+    for coding in encoding.available():
+        compressed = encoding.compress(body, coding)
+        ms = timed(lambda: encoding.compress(body, coding), args.repeat)
+        print(f"{coding:<10} {len(compressed):>10} {len(compressed) / len(body):>7.2f} {ms:>8.2f}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+"""
+Search benchmark for Hobby Manager
+Compares recall and latency of the LIKE scan against the FTS index for
+each text analysis profile, on a generated Turkish/English dataset
+"""
+
+import argparse
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+# Add the api directory to the path
+sys.path.append(str(Path(__file__).parent.parent / "apps" / "api"))
+
+from services import analysis, fts
+
+WORDS = [
+    "ışık", "gölge", "şehir", "çiçek", "öğretmen", "ağaç", "güneş", "kitap",
+    "kitaplar", "kitaplardan", "müzik", "gitar", "fotoğraf", "İstanbul", "Işıklar",
+    "deniz", "yağmur", "kış", "yaz", "sokak", "kahve", "dağ", "gece", "sabah",
+    "camera", "guitar", "practice", "session", "notes", "landscape", "sunset",
+    "bridge", "music", "lens", "portrait", "street", "coffee", "mountain",
+]
+
+QUERIES = ["isik", "IŞIK", "ışık", "golge", "sehir", "cicek", "kitap", "kitaplar",
+           "istanbul", "İSTANBUL", "muzik", "fotograf", "yagmur", "guitar", "sunset",
+           # No hits at all, the worst case for a LIKE scan
+           "bulunmayan"]
+
+SCHEMA = """
+    CREATE TABLE app_settings (key TEXT PRIMARY KEY, value TEXT NOT NULL, updated_at TIMESTAMP);
+    CREATE TABLE hobbies (id INTEGER PRIMARY KEY, name TEXT NOT NULL);
+    CREATE TABLE entries (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        hobby_id INTEGER NOT NULL,
+        type_key TEXT NOT NULL,
+        title TEXT NOT NULL,
+        description TEXT,
+        content_markdown TEXT,
+        tags TEXT,
+        is_archived BOOLEAN DEFAULT 0,
+        view_count INTEGER DEFAULT 0,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    );
+    CREATE TABLE entry_props (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        entry_id INTEGER NOT NULL,
+        key TEXT NOT NULL,
+        value_json TEXT NOT NULL,
+        FOREIGN KEY (entry_id) REFERENCES entries(id) ON DELETE CASCADE
+    );
+    CREATE TABLE shelf_items (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        shelf_id INTEGER NOT NULL,
+        entry_id INTEGER,
+        title TEXT,
+        subtitle TEXT,
+        metadata_json TEXT
+    );
+    CREATE INDEX idx_entries_created ON entries(created_at DESC);
+"""
+
+SYLLABLES = ["ka", "ra", "me", "lo", "ti", "su", "de", "ne", "zo", "pa", "vi", "ro", "ba", "le", "mu", "to"]
+
+# Filler vocabulary, the benchmark words only show up now and then like real search targets
+FILLER = sorted({"".join(random.Random(i).choices(SYLLABLES, k=3)) for i in range(4000)})
+
+def vary(word):
+    """Write a word the way people do: any case, sometimes without diacritics"""
+    if random.random() < 0.3:
+        word = word.upper()
+    elif random.random() < 0.3:
+        word = word.capitalize()
+    if random.random() < 0.2:
+        word = analysis.strip_diacritics(word.replace("ı", "i").replace("İ", "I"))
+    return word
+
+def sentence(length, density=0.02):
+    return " ".join(
+        vary(random.choice(WORDS)) if random.random() < density else random.choice(FILLER)
+        for _ in range(length)
+    )
+
+def seed(conn, count):
+    conn.executescript(SCHEMA)
+    conn.execute("INSERT INTO hobbies (id, name) VALUES (1, 'Fotoğrafçılık')")
+    conn.executemany(
+        "INSERT INTO entries (hobby_id, type_key, title, description, content_markdown, tags) "
+        "VALUES (1, 'note', ?, ?, ?, ?)",
+        ((sentence(4), sentence(12), sentence(60), ",".join(sentence(3, density=0.1).split()))
+         for _ in range(count)),
+    )
+    conn.commit()
+
+def expected(conn, query):
+    """Entries a Turkish reader expects for query: any word starting with it, ignoring case and diacritics"""
+    profile = analysis.build_profile("turkish")
+    needle = profile.normalize(query)
+    ids = set()
+    for row in conn.execute("SELECT id, title, description, content_markdown, tags FROM entries"):
+        text = profile.normalize(" ".join(value or "" for value in row[1:]).replace(",", " "))
+        if any(word.startswith(needle) for word in text.split()):
+            ids.add(row[0])
+    return ids
+
+def like_search(conn, query, limit=None):
+    term = f"%{query}%"
+    sql = """
+        SELECT e.id FROM entries e
+        WHERE (e.title LIKE ? OR e.description LIKE ? OR e.content_markdown LIKE ? OR e.tags LIKE ?)
+        AND e.is_archived = 0
+        ORDER BY e.created_at DESC
+    """
+    params = [term] * 4
+    if limit:
+        sql += " LIMIT ?"
+        params.append(limit)
+    return {row[0] for row in conn.execute(sql, params)}
+
+def fts_search(conn, query, limit=None):
+    sql, params = fts.build_search_query(query, limit=limit or -1)
+    return {row[0] for row in conn.execute(sql, params)}
+
+def measure(conn, search, truths, repeat):
+    latencies = []
+    recalls = []
+    for query, truth in truths.items():
+        for _ in range(repeat):
+            started = time.perf_counter()
+            search(conn, query, limit=50)
+            latencies.append((time.perf_counter() - started) * 1000)
+        if truth:
+            recalls.append(len(search(conn, query) & truth) / len(truth))
+    latencies.sort()
+    return {
+        "p50": statistics.median(latencies),
+        "p95": latencies[int(len(latencies) * 0.95) - 1],
+        "recall": statistics.mean(recalls) if recalls else 0.0,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Hobby Manager Search Benchmark")
+    parser.add_argument('-n', '--entries', type=int, default=20000, help='Entries to generate')
+    parser.add_argument('-r', '--repeat', type=int, default=5, help='Timed runs per query')
+    parser.add_argument('--seed', type=int, default=42, help='Random seed')
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        conn = sqlite3.connect(str(Path(tmp) / "bench.db"))
+        print(f"📦 Generating {args.entries} entries...")
+        seed(conn, args.entries)
+        truths = {query: expected(conn, query) for query in QUERIES}
+
+        print(f"\n{'path':<28} {'p50 ms':>8} {'p95 ms':>8} {'recall':>8}")
+        results = {"LIKE scan": measure(conn, like_search, truths, args.repeat)}
+
+        for name, stemmer in [("english", None), ("simple", None), ("turkish", None), ("turkish", "turkish")]:
+            analysis.set_profile(name, stemmer)
+            fts.ensure_fts_schema(conn, force=True)
+            conn.commit()
+            label = f"FTS {name}" + (f" + {stemmer} stemmer" if stemmer else "")
+            results[label] = measure(conn, fts_search, truths, args.repeat)
+
+        for label, result in results.items():
+            print(f"{label:<28} {result['p50']:>8.2f} {result['p95']:>8.2f} {result['recall']:>8.1%}")
+        conn.close()
+
+if __name__ == '__main__':
+    main()
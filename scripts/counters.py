@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+Counter cache tool for Hobby Manager
+Checks the counters table against the tables it counts and recomputes it
+from scratch, reporting any drift
+"""
+
+import argparse
+import json
+import sqlite3
+import sys
+import time
+from pathlib import Path
+
+# Add the api directory to the path
+sys.path.append(str(Path(__file__).parent.parent / "apps" / "api"))
+
+from services import counters
+
+DB_PATH = Path(__file__).parent.parent / "data" / "app.db"
+
+def connect(db_path):
+    db_path = Path(db_path)
+    if not db_path.exists():
+        print(f"❌ Database not found: {db_path}")
+        sys.exit(1)
+    conn = sqlite3.connect(str(db_path))
+    counters.ensure_schema(conn)
+    conn.commit()
+    return conn
+
+def print_drift(found):
+    for item in found:
+        print(f"   {item['name']}[{item['scope_id']}]: stored {item['stored']}, actual {item['actual']}")
+
+def check(db_path):
+    """Compare every counter with a recount"""
+    print(f"🩺 Checking {db_path}...")
+    conn = connect(db_path)
+    found = counters.drift(conn)
+    conn.close()
+
+    if not found:
+        print("✅ Counters match the tables")
+        return
+    print(f"❌ {len(found)} counters drifted:")
+    print_drift(found)
+    print("   Run 'counters.py repair' to fix them")
+    sys.exit(1)
+
+def repair(db_path):
+    """Recompute every counter from scratch"""
+    print(f"🔧 Recounting {db_path}...")
+    conn = connect(db_path)
+    started = time.perf_counter()
+    result = counters.repair(conn)
+    conn.commit()
+    conn.close()
+
+    if result["drift"]:
+        print(f"⚠️  Corrected {len(result['drift'])} drifted counters:")
+        print_drift(result["drift"])
+    print(f"✅ Recounted {result['counters']} counters in {time.perf_counter() - started:.2f}s")
+
+def show(db_path):
+    conn = connect(db_path)
+    print(json.dumps({"totals": counters.totals(conn), "hobbies": counters.hobby_counts(conn)}, indent=2))
+    conn.close()
+
+def main():
+    parser = argparse.ArgumentParser(description="Hobby Manager Counter Cache Tool")
+    parser.add_argument('--db', default=str(DB_PATH), help='Database path')
+    subparsers = parser.add_subparsers(dest='command', help='Available commands')
+
+    subparsers.add_parser('check', help='Report counters that drifted from the tables')
+    subparsers.add_parser('repair', help='Recompute every counter and report the drift')
+    subparsers.add_parser('show', help='Show totals and per-hobby counts')
+
+    args = parser.parse_args()
+
+    if args.command == 'check':
+        check(args.db)
+    elif args.command == 'repair':
+        repair(args.db)
+    elif args.command == 'show':
+        show(args.db)
+    else:
+        parser.print_help()
+
+if __name__ == '__main__':
+    main()
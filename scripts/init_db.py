@@ -97,6 +97,8 @@ def init_database():
             description TEXT,
             content_markdown TEXT,
             tags TEXT,
+            props_text TEXT,
+            props_json TEXT,
             is_favorite BOOLEAN DEFAULT 0,
             is_archived BOOLEAN DEFAULT 0,
             view_count INTEGER DEFAULT 0,
@@ -254,40 +256,10 @@ def create_indexes(cursor):
 
 def setup_fts(cursor):
     """Setup FTS5 with triggers"""
+    from services import fts
     
-    # Create FTS5 virtual table
-    cursor.execute("""
-        CREATE VIRTUAL TABLE entry_fts USING fts5(
-            title, 
-            description, 
-            content_markdown, 
-            tags,
-            content=entries,
-            content_rowid=id,
-            tokenize='porter unicode61'
-        );
-    """)
-    
-    # Create triggers to keep FTS in sync
-    cursor.executescript("""
-        CREATE TRIGGER entry_fts_insert AFTER INSERT ON entries BEGIN
-            INSERT INTO entry_fts(rowid, title, description, content_markdown, tags)
-            VALUES (new.id, new.title, new.description, new.content_markdown, new.tags);
-        END;
-        
-        CREATE TRIGGER entry_fts_update AFTER UPDATE ON entries BEGIN
-            UPDATE entry_fts 
-            SET title = new.title, 
-                description = new.description,
-                content_markdown = new.content_markdown,
-                tags = new.tags
-            WHERE rowid = new.id;
-        END;
-        
-        CREATE TRIGGER entry_fts_delete AFTER DELETE ON entries BEGIN
-            DELETE FROM entry_fts WHERE rowid = old.id;
-        END;
-    """)
+    # Shared with the API so both create the same index and triggers
+    fts.ensure_fts_schema(cursor.connection, force=True)
 
 if __name__ == "__main__":
     init_database()
\ No newline at end of file
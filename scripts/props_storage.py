@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+"""
+Props storage tool for Hobby Manager
+Moves entry props between entry_props rows and one props_json document per
+entry, and benchmarks the two on a generated database
+"""
+
+import argparse
+import json
+import os
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+# Add the api directory to the path
+sys.path.append(str(Path(__file__).parent.parent / "apps" / "api"))
+
+from services import fts, prop_filters, props
+
+DB_PATH = Path(__file__).parent.parent / "data" / "app.db"
+
+BENCH_SCHEMA = """
+CREATE TABLE hobby_types (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    key TEXT UNIQUE NOT NULL,
+    schema_json TEXT NOT NULL,
+    is_active BOOLEAN DEFAULT 1
+);
+CREATE TABLE entries (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    hobby_id INTEGER NOT NULL,
+    type_key TEXT NOT NULL,
+    title TEXT NOT NULL,
+    props_json TEXT,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+CREATE TABLE entry_props (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    entry_id INTEGER NOT NULL,
+    key TEXT NOT NULL,
+    value_json TEXT NOT NULL,
+    FOREIGN KEY (entry_id) REFERENCES entries(id) ON DELETE CASCADE
+);
+CREATE TABLE app_settings (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+CREATE INDEX idx_entry_props_entry ON entry_props(entry_id);
+CREATE INDEX idx_entry_props_key ON entry_props(key);
+"""
+BENCH_TYPE = {
+    "properties": {
+        "author": {"type": "string"},
+        "rating": {"type": "integer"},
+        "year": {"type": "integer"},
+        "finished": {"type": "boolean"},
+    }
+}
+AUTHORS = ["Orhan Pamuk", "Elif Şafak", "Sabahattin Ali", "Yaşar Kemal", "Ursula K. Le Guin", "Italo Calvino"]
+
+def connect(db_path):
+    db_path = Path(db_path)
+    if not db_path.exists():
+        print(f"❌ Database not found: {db_path}")
+        sys.exit(1)
+    conn = sqlite3.connect(str(db_path))
+    props.load_storage(conn)
+    conn.commit()
+    return conn
+
+def status(db_path):
+    conn = connect(db_path)
+    rows = conn.execute("SELECT COUNT(*) FROM entry_props").fetchone()[0]
+    documents = conn.execute(f"SELECT COUNT(*) FROM entries WHERE {props.PROPS_COLUMN} IS NOT NULL").fetchone()[0]
+    conn.close()
+    print(f"📊 Props stored as {props.storage}: {rows} entry_props rows, {documents} props_json documents")
+
+def convert(db_path, mode):
+    """Move every entry's props to mode, with the prop indexes and search text to match"""
+    conn = connect(db_path)
+    if props.storage == mode:
+        print(f"✅ Props are already stored as {mode}")
+        conn.close()
+        return
+    print(f"🔄 Moving props from {props.storage} to {mode} in {db_path}...")
+    started = time.perf_counter()
+    converted = props.convert(conn, mode)
+    props.load_storage(conn)
+    indexes = prop_filters.ensure_indexes(conn)
+    # props_text is kept by triggers on both, rebuild it from where the props are now
+    conn.execute(f"UPDATE entries SET props_text = ({fts.props_text_sql('entries.id')})")
+    conn.commit()
+    conn.close()
+    print(f"✅ Converted {converted} entries in {time.perf_counter() - started:.2f}s, "
+          f"{len(indexes['created'])} prop indexes created, {len(indexes['dropped'])} dropped")
+    print("⚠️  Restart the API so it picks up the new storage")
+
+def make_props(rng):
+    return {
+        "author": rng.choice(AUTHORS),
+        "rating": rng.randint(1, 5),
+        "year": rng.randint(1950, 2025),
+        "finished": rng.random() < 0.5,
+    }
+
+def seed(path, mode, count, seed_value):
+    """A database of count entries with props stored as mode"""
+    rng = random.Random(seed_value)
+    conn = sqlite3.connect(str(path))
+    conn.executescript(BENCH_SCHEMA)
+    conn.execute("INSERT INTO hobby_types (key, schema_json) VALUES ('book', ?)", [json.dumps(BENCH_TYPE)])
+    conn.execute("INSERT INTO app_settings (key, value) VALUES (?, ?)", [props.SETTING_KEY, mode])
+    conn.executemany(
+        "INSERT INTO entries (id, hobby_id, type_key, title) VALUES (?, 1, 'book', ?)",
+        [(i, f"Book {i}") for i in range(1, count + 1)],
+    )
+    props.load_storage(conn)
+    props.write_props(conn, [(i, make_props(rng)) for i in range(1, count + 1)])
+    prop_filters.ensure_indexes(conn)
+    conn.commit()
+    conn.execute("VACUUM")
+    return conn
+
+def timed(fn, repeat):
+    latencies = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        latencies.append((time.perf_counter() - started) * 1000)
+    return statistics.median(latencies), sorted(latencies)[int(len(latencies) * 0.95) - 1]
+
+def bench(count, page_size, repeat, seed_value):
+    """Page reads, single entry writes, a filter and the file size, for each mode"""
+    print(f"📦 {count} entries, 4 props each, pages of {page_size}")
+    print(f"\n{'storage':<8} {'size MB':>8} {'read p50':>9} {'read p95':>9} {'write p50':>10} "
+          f"{'write p95':>10} {'filter p50':>11}")
+    rng = random.Random(seed_value)
+    with tempfile.TemporaryDirectory() as directory:
+        for mode in props.STORAGE_MODES:
+            path = Path(directory) / f"{mode}.db"
+            conn = seed(path, mode, count, seed_value)
+            size = os.path.getsize(path) / 1024 / 1024
+
+            def read():
+                start = rng.randint(1, count - page_size)
+                props.load_props(conn, list(range(start, start + page_size)))
+
+            def write():
+                props.write_props(conn, [(rng.randint(1, count), make_props(rng))])
+                conn.commit()
+
+            kinds = {"rating": "number", "year": "number"}
+            conditions, params = prop_filters.build_filters([("rating", "gte", "4"), ("year", "lt", "1980")], kinds)
+            filter_sql = f"SELECT COUNT(*) FROM entries e WHERE {' AND '.join(conditions)}"
+
+            read_p50, read_p95 = timed(read, repeat)
+            write_p50, write_p95 = timed(write, repeat)
+            filter_p50, _ = timed(lambda: conn.execute(filter_sql, params).fetchone(), max(repeat // 10, 5))
+            conn.close()
+            print(f"{mode:<8} {size:>8.1f} {read_p50:>8.2f}ms {read_p95:>8.2f}ms {write_p50:>9.2f}ms "
+                  f"{write_p95:>9.2f}ms {filter_p50:>10.2f}ms")
+
+def main():
+    parser = argparse.ArgumentParser(description="Hobby Manager Props Storage Tool")
+    parser.add_argument('--db', default=str(DB_PATH), help='Database path')
+    subparsers = parser.add_subparsers(dest='command', help='Available commands')
+
+    subparsers.add_parser('status', help='Show how props are stored')
+    subparsers.add_parser('to-json', help='Store props as one props_json document per entry')
+    subparsers.add_parser('to-rows', help='Store props as entry_props rows')
+
+    bench_parser = subparsers.add_parser('bench', help='Compare both storages on a generated database')
+    bench_parser.add_argument('-n', '--entries', type=int, default=100000, help='Entries to generate')
+    bench_parser.add_argument('-p', '--page-size', type=int, default=50, help='Entries per page read')
+    bench_parser.add_argument('-r', '--repeat', type=int, default=200, help='Timed runs per measurement')
+    bench_parser.add_argument('--seed', type=int, default=42, help='Random seed')
+
+    args = parser.parse_args()
+
+    if args.command == 'status':
+        status(args.db)
+    elif args.command == 'to-json':
+        convert(args.db, "json")
+    elif args.command == 'to-rows':
+        convert(args.db, "rows")
+    elif args.command == 'bench':
+        bench(args.entries, args.page_size, args.repeat, args.seed)
+    else:
+        parser.print_help()
+
+if __name__ == '__main__':
+    main()
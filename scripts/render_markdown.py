@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+Rendered markdown tool for Hobby Manager
+Pre-renders entry content to sanitized HTML, so the first ?render=html view
+of an existing entry doesn't pay for rendering it
+"""
+
+import argparse
+import sqlite3
+import sys
+import time
+from pathlib import Path
+
+# Add the api directory to the path
+sys.path.append(str(Path(__file__).parent.parent / "apps" / "api"))
+
+from services import render
+
+DB_PATH = Path(__file__).parent.parent / "data" / "app.db"
+
+def connect(db_path):
+    db_path = Path(db_path)
+    if not db_path.exists():
+        print(f"❌ Database not found: {db_path}")
+        sys.exit(1)
+    conn = sqlite3.connect(str(db_path))
+    render.ensure_schema(conn)
+    conn.commit()
+    return conn
+
+def prerender(db_path, batch_size, force=False):
+    """Render every entry whose HTML is missing or stale"""
+    conn = connect(db_path)
+    if force:
+        conn.execute(f"DELETE FROM {render.HTML_TABLE}")
+        conn.commit()
+    stale = render.stale_count(conn)
+    print(f"🖋️  Rendering {stale} entries in {db_path}...")
+    started = time.perf_counter()
+    rendered = render.prerender(conn, batch_size, commit=conn.commit)
+    conn.close()
+    print(f"✅ Rendered {rendered} entries in {time.perf_counter() - started:.2f}s")
+
+def status(db_path):
+    conn = connect(db_path)
+    cached = conn.execute(f"SELECT COUNT(*) FROM {render.HTML_TABLE}").fetchone()[0]
+    stale = render.stale_count(conn)
+    conn.close()
+    print(f"📊 {cached} entries cached, {stale} missing or stale (renderer {render.RENDERER})")
+
+def main():
+    parser = argparse.ArgumentParser(description="Hobby Manager Rendered Markdown Tool")
+    parser.add_argument('--db', default=str(DB_PATH), help='Database path')
+    subparsers = parser.add_subparsers(dest='command', help='Available commands')
+
+    prerender_parser = subparsers.add_parser('prerender', help='Render entries whose HTML is missing or stale')
+    prerender_parser.add_argument('--batch-size', type=int, default=render.BATCH_SIZE, help='Entries per transaction')
+    prerender_parser.add_argument('--force', action='store_true', help='Render every entry again')
+
+    subparsers.add_parser('status', help='Show how many entries are rendered')
+
+    args = parser.parse_args()
+
+    if args.command == 'prerender':
+        prerender(args.db, args.batch_size, args.force)
+    elif args.command == 'status':
+        status(args.db)
+    else:
+        parser.print_help()
+
+if __name__ == '__main__':
+    main()
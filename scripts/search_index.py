@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+Search index tool for Hobby Manager
+Rebuilds, checks and optimizes entry_fts without touching the rest of the
+database, unlike init_db.py
+"""
+
+import argparse
+import json
+import os
+import sqlite3
+import sys
+import time
+from pathlib import Path
+
+# Add the api directory to the path
+sys.path.append(str(Path(__file__).parent.parent / "apps" / "api"))
+
+from services import analysis, fts, maintenance
+
+DB_PATH = Path(__file__).parent.parent / "data" / "app.db"
+
+def connect(db_path):
+    db_path = Path(db_path)
+    if not db_path.exists():
+        print(f"❌ Database not found: {db_path}")
+        sys.exit(1)
+    return sqlite3.connect(str(db_path))
+
+def rebuild(db_path, profile=None, stemmer=None):
+    """Recreate the FTS indexes and repopulate them from entries and shelf items"""
+    if profile or stemmer:
+        analysis.set_profile(profile or os.getenv("SEARCH_PROFILE"), stemmer or os.getenv("SEARCH_STEMMER"))
+    current = analysis.get_profile()
+
+    print(f"🔎 Rebuilding {db_path} with the '{current.name}' profile ({current.tokenizer})...")
+    conn = connect(db_path)
+    started = time.perf_counter()
+    result = maintenance.rebuild(conn)
+    conn.commit()
+
+    terms = conn.execute(f"SELECT COUNT(*) FROM {fts.TERMS_TABLE}").fetchone()[0]
+    conn.close()
+
+    print(f"✅ Indexed {result['entries']} entries, {result['shelf_items']} shelf items, {terms} terms "
+          f"in {time.perf_counter() - started:.2f}s")
+    if profile and profile != os.getenv("SEARCH_PROFILE", "english"):
+        print(f"   Run the API with SEARCH_PROFILE={profile} or it will reindex again on startup")
+
+def integrity_check(db_path):
+    """Check the index structure and that it matches entries"""
+    print(f"🩺 Checking {db_path}...")
+    conn = connect(db_path)
+    result = maintenance.integrity_check(conn)
+    conn.close()
+
+    if result["ok"]:
+        print("✅ Search index is consistent")
+        return
+    for error in result["errors"]:
+        print(f"❌ {error}")
+    print("   Run 'search_index.py rebuild' to repair it")
+    sys.exit(1)
+
+def optimize(db_path):
+    """Merge every segment into one"""
+    conn = connect(db_path)
+    before = maintenance.segment_stats(conn)["segments"]
+    started = time.perf_counter()
+    after = maintenance.optimize(conn)["segments"]
+    conn.commit()
+    conn.close()
+    print(f"✅ Optimized {before} segments into {after} in {time.perf_counter() - started:.2f}s")
+
+def stats(db_path):
+    conn = connect(db_path)
+    print(json.dumps(maintenance.segment_stats(conn), indent=2))
+    conn.close()
+
+def main():
+    parser = argparse.ArgumentParser(description="Hobby Manager Search Index Tool")
+    parser.add_argument('--db', default=str(DB_PATH), help='Database path')
+    subparsers = parser.add_subparsers(dest='command', help='Available commands')
+
+    # Rebuild command
+    rebuild_parser = subparsers.add_parser('rebuild', aliases=['reindex'], help='Rebuild the search index')
+    rebuild_parser.add_argument('--profile', choices=sorted(analysis.PROFILES), help='Text analysis profile')
+    rebuild_parser.add_argument('--stemmer', choices=sorted(analysis.STEMMERS), help='Query stemmer')
+
+    subparsers.add_parser('integrity-check', help='Check the search index against entries')
+    subparsers.add_parser('optimize', help='Merge the search index into one segment')
+    subparsers.add_parser('stats', help='Show search index segment stats')
+
+    args = parser.parse_args()
+
+    if args.command in ('rebuild', 'reindex'):
+        rebuild(args.db, args.profile, args.stemmer)
+    elif args.command == 'integrity-check':
+        integrity_check(args.db)
+    elif args.command == 'optimize':
+        optimize(args.db)
+    elif args.command == 'stats':
+        stats(args.db)
+    else:
+        parser.print_help()
+
+if __name__ == '__main__':
+    main()
@@ -75,7 +75,7 @@ if [[ $NEED_SETUP == true ]]; then
         
         # Try our working requirements
         log_info "Installing Python dependencies..."
-        pip install fastapi==0.104.1 uvicorn==0.24.0 requests==2.31.0 --quiet
+        pip install fastapi==0.104.1 uvicorn==0.24.0 requests==2.31.0 numpy==1.26.2 orjson==3.9.10 markdown==3.5.1 bleach==6.1.0 --quiet
         
         cd ../..
         log_success "Python backend setup complete!"
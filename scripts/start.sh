@@ -120,7 +120,7 @@ setup_backend() {
     
     # Install dependencies
     log_info "Installing Python dependencies (minimal version)..."
-    pip install fastapi==0.104.1 uvicorn==0.24.0 requests==2.31.0 --quiet
+    pip install fastapi==0.104.1 uvicorn==0.24.0 requests==2.31.0 numpy==1.26.2 orjson==3.9.10 markdown==3.5.1 bleach==6.1.0 --quiet
     
     # Create .env from template if it doesn't exist
     if [[ ! -f ".env" ]]; then